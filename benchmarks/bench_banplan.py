@@ -0,0 +1,59 @@
+"""
+Ban planning for massban/synclocal: the old per-entry loop (str -> int
+conversion and a membership check per global entry) vs. the set operations
+in utils/banplan.py.
+
+    python -m benchmarks.bench_banplan [global_entries] [local_bans]
+"""
+import random
+import sys
+import time
+
+from utils.banplan import split_ids
+
+
+def make_ids(count, seed):
+    rng = random.Random(seed)
+    return {rng.randrange(10 ** 17, 10 ** 19) for _ in range(count)}
+
+
+def old_plan(global_ban_list, current_bans, bot_id, owner_id):
+    to_ban, already = [], 0
+    for user_id_str in global_ban_list:
+        user_id = int(user_id_str)
+        if user_id in current_bans:
+            already += 1
+            continue
+        if user_id == bot_id or user_id == owner_id:
+            continue
+        to_ban.append(user_id)
+    return to_ban
+
+
+def timed(label, func, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<28} {best * 1000:8.2f}ms  ({len(result)} to ban)")
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    local = int(sys.argv[2]) if len(sys.argv) > 2 else entries // 2
+    global_ids = make_ids(entries, 1)
+    # Half the local bans overlap the global list, like a guild that synced once before
+    local_ids = set(random.Random(2).sample(sorted(global_ids), local // 2)) | make_ids(local - local // 2, 3)
+    # A ban snapshot's ids() is a dict keys view
+    current_bans = dict.fromkeys(local_ids).keys()
+    global_ban_list = {str(user_id): {"reason": "vorth"} for user_id in global_ids}
+    bot_id, owner_id = 1, next(iter(global_ids))
+    print(f"{entries} global entries, {len(current_bans)} local bans")
+
+    timed("per-entry loop (old)", lambda: old_plan(global_ban_list, current_bans, bot_id, owner_id))
+    timed("set operations", lambda: split_ids(global_ids, current_bans, {bot_id: "bot", owner_id: "owner"})[0])
+
+
+if __name__ == "__main__":
+    main()
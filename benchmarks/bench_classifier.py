@@ -0,0 +1,65 @@
+"""
+Reason classification over the real global ban list reasons: one re.search
+per ban (the old path) vs. the combined, memoized classifier used now.
+
+    python -m benchmarks.bench_classifier [path/to/global_ban_list.json] [copies]
+"""
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+from utils.classifier import ReasonClassifier
+
+OLD_PATTERN = r'\b(vorth|racc)\b'
+
+
+def load_reasons(source, copies):
+    """Every entry's reason, repeated `copies` times, like bans fetched across many guilds"""
+    with open(source) as f:
+        bans = json.load(f)["bans"]
+    reasons = [entry.get("reason") for entry in bans.values()]
+    # Copies are distinct string objects with equal values, as discord.py hands them to us
+    return [None if reason is None else "".join(reason) for _ in range(copies) for reason in reasons]
+
+
+def timed(label, func, reasons, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        started = time.perf_counter()
+        hits = func(reasons)
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<34} {best * 1000:8.2f}ms  {best / len(reasons) * 1e9:7.0f}ns/reason  ({hits} matches)")
+
+
+def old_search(reasons):
+    return sum(1 for reason in reasons if reason and re.search(OLD_PATTERN, reason, re.IGNORECASE))
+
+
+def main():
+    source = Path(sys.argv[1] if len(sys.argv) > 1 else "data/global_ban_list.json")
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    reasons = load_reasons(source, copies)
+    print(f"{len(reasons)} reasons ({len(set(reasons))} distinct), {source}")
+
+    timed("re.search per ban (old)", old_search, reasons)
+
+    def combined_uncached(reasons):
+        classifier = ReasonClassifier(cache_size=0)
+        return sum(1 for reason in reasons if classifier.matches(reason))
+
+    timed("combined regex, no memo", combined_uncached, reasons)
+
+    def combined_cold(reasons):
+        classifier = ReasonClassifier()
+        return sum(1 for reason in reasons if classifier.matches(reason))
+
+    timed("combined regex, memo (cold)", combined_cold, reasons)
+
+    warm = ReasonClassifier()
+    timed("combined regex, memo (warm)", lambda reasons: sum(1 for reason in reasons if warm.matches(reason)), reasons)
+
+
+if __name__ == "__main__":
+    main()
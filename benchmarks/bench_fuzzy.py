@@ -0,0 +1,79 @@
+"""
+Fuzzy name screening: the old scan (SequenceMatcher against every banned
+name) vs. the bitset-filtered FuzzyNameIndex, at 1k/10k/100k banned names.
+Also checks that both return the same answers.
+
+    python -m benchmarks.bench_fuzzy [queries]
+"""
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+
+from utils.fuzzy import FuzzyNameIndex
+
+CONSONANTS = "bcdfghjklmnpqrstvwxyz"
+VOWELS = "aeiou"
+
+
+def make_word(rng):
+    return "".join(rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.randint(1, 4)))
+
+
+def make_names(count, seed):
+    """Usernames shaped like real ones: a word or two, maybe a separator and digits"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        name = make_word(rng)
+        if rng.random() < 0.4:
+            name += rng.choice(["", "_", "."]) + make_word(rng)
+        if rng.random() < 0.5:
+            name += str(rng.randint(0, 9999))
+        names.add(name)
+    return list(names)
+
+
+def mutate(name, rng):
+    """Something a raider would join with: a banned name with a character or two changed"""
+    chars = list(name)
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(chars))
+        chars[i] = rng.choice("abcdefghijklmnopqrstuvwxyz0123456789_")
+    return "".join(chars)
+
+
+def old_scan(banned_names, name):
+    return any(SequenceMatcher(None, name, banned).ratio() > 0.7 for banned in banned_names)
+
+
+def main():
+    query_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(7)
+    for size in (1_000, 10_000, 100_000):
+        names = make_names(size, size)
+        # Half near-misses of banned names, half unrelated joins
+        queries = [mutate(rng.choice(names), rng) for _ in range(query_count // 2)]
+        queries += make_names(query_count - len(queries), size + 1)
+
+        started = time.perf_counter()
+        index = FuzzyNameIndex(names)
+        build = time.perf_counter() - started
+
+        started = time.perf_counter()
+        fast = [index.first_match(query) is not None for query in queries]
+        per_query = (time.perf_counter() - started) / len(queries)
+
+        # The full scan is slow at 100k; time (and cross-check) a sample
+        sample = queries[:max(4, query_count // (size // 1000))]
+        started = time.perf_counter()
+        slow = [old_scan(names, query) for query in sample]
+        old_per_query = (time.perf_counter() - started) / len(sample)
+        assert slow == fast[:len(sample)], "index and full scan disagree"
+
+        print(f"{size:>7} names: build {build * 1000:7.1f}ms | index {per_query * 1000:7.3f}ms/join | "
+              f"full scan {old_per_query * 1000:9.2f}ms/join | {sum(fast)}/{len(queries)} flagged")
+
+
+if __name__ == "__main__":
+    main()
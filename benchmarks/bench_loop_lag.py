@@ -0,0 +1,73 @@
+"""
+Event loop lag while saving the global ban list: blocking json.dump on the loop
+(the old save path) vs. the journaled write-behind path used now.
+
+    python -m benchmarks.bench_loop_lag [path/to/global_ban_list.json] [copies]
+"""
+import asyncio
+import json
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+from utils.aio import LoopLagMonitor, io_executor
+from utils.storage import JSONStorage
+
+
+def scaled_bans(source, copies):
+    """The real list, repeated with shifted IDs to approximate a bigger one"""
+    with open(source) as f:
+        bans = json.load(f)["bans"]
+    scaled = {}
+    for i in range(copies):
+        for user_id, entry in bans.items():
+            scaled[str(int(user_id) + i)] = dict(entry)
+    return scaled
+
+
+async def measure(label, mutate, bans, rounds=50):
+    monitor = LoopLagMonitor(interval=0.005, samples=10_000, warn_threshold=float("inf"))
+    monitor.start()
+    await asyncio.sleep(0.05)
+    for i in range(rounds):
+        mutate(bans, i)
+        await asyncio.sleep(0.005)
+    await asyncio.get_running_loop().run_in_executor(io_executor, lambda: None)
+    monitor.stop()
+    avg, p95, worst, _ = monitor.stats()
+    print(f"{label:<28} avg {avg:7.2f}ms   p95 {p95:7.2f}ms   max {worst:7.2f}ms")
+
+
+async def main():
+    source = Path(sys.argv[1] if len(sys.argv) > 1 else "data/global_ban_list.json")
+    copies = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    bans = scaled_bans(source, copies)
+    print(f"{len(bans)} entries, {source}")
+
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        blocking_file = workdir / "blocking.json"
+
+        def blocking_save(bans, i):
+            bans[str(i)] = {"name": f"user{i}", "reason": "vorth", "servers": []}
+            with open(blocking_file, "w") as f:
+                json.dump({"bans": bans}, f, indent=4)
+
+        storage = JSONStorage(workdir)
+        storage.save_bans(dict(bans))
+        await asyncio.get_running_loop().run_in_executor(io_executor, lambda: None)
+
+        def journaled_save(bans, i):
+            user_id = str(i)
+            bans[user_id] = {"name": f"user{i}", "reason": "vorth", "servers": []}
+            storage.save_bans(bans, [user_id], [])
+
+        await measure("blocking json.dump on loop", blocking_save, dict(bans))
+        await measure("journaled write-behind", journaled_save, dict(bans))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
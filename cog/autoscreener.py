@@ -1,8 +1,13 @@
+import asyncio
 import json
-import os
-from difflib import SequenceMatcher
 import discord
 from discord.ext import commands
+from utils.ahocorasick import Automaton
+from utils.banplan import audit_reason
+from utils.banstore import ban_store
+from utils.fuzzy import FuzzyNameIndex
+from utils.guildsettings import guild_settings
+from utils.storage import get_storage
 
 # File paths
 CONFIG_FILE = "data/asd.json"
@@ -13,56 +18,104 @@ def load_config():
 
 auditors = load_config()["auditors"]
 
+# Let a burst of ban list changes (a sync, a ban job's events) settle before re-indexing names
+REBUILD_DELAY = 2.0
+
+
+def build_name_data(bans, previous=None):
+    """
+    Everything name screening needs from a ban list: (name -> banned user IDs,
+    fuzzy index, fragment automaton). Touches no shared state, so it runs in
+    a worker thread while joins keep using the previous data. If the names
+    and their accounts are the same as in `previous` (most changes only touch
+    servers or reasons), its index and automaton are reused as they are.
+    """
+    name_sources = {}  # lowercased name -> banned user IDs
+
+    # Ensure 'name' key exists in each banned account before accessing
+    for user_id, account in bans.items():
+        name = account.get('name')
+        if name:
+            name_sources.setdefault(name.lower(), set()).add(user_id)
+
+    if previous is not None and previous[0] == name_sources:
+        return name_sources, previous[1], previous[2]
+
+    # Indexed once per ban list generation; queried on every join
+    name_index = FuzzyNameIndex(name_sources)
+
+    # All fragments in one automaton, so a join scans its name once however many there are
+    fragments = Automaton()
+    for name, sources in name_sources.items():
+        parts = []
+        for sep in ['_', '.', '-', ' ']:
+            if sep in name:
+                parts.extend(name.split(sep))
+
+        if not parts:
+            parts = [name]
+
+        for part in parts:
+            if len(part) >= 3:
+                for user_id in sources:
+                    fragments.add(part, user_id)
+    return name_sources, name_index, fragments.build()
+
 class AutoScreener(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._patterns_generation = None
+        self._rebuild_task = None
         self.load_data()
 
-    def load_data(self):
-        """Load banned accounts, server settings, and verified servers"""
-        try:
-            with open('data/global_ban_list.json') as f:
-                self.banned_accounts = json.load(f)['bans']
-
-            with open('data/servers.json') as f:
-                self.servers = json.load(f)
+    @property
+    def banned_accounts(self):
+        """Shared global ban list, kept in memory by the ban store"""
+        return ban_store.bans()
+
+    def _refresh_patterns(self):
+        """
+        Re-index banned names in the background when the ban list has changed.
+        Joins keep being screened against the previous data until it's ready.
+        """
+        bans = ban_store.bans()
+        if self._patterns_generation != ban_store.generation and (self._rebuild_task is None or self._rebuild_task.done()):
+            self._rebuild_task = asyncio.get_running_loop().create_task(self._rebuild_patterns())
+        return bans
+
+    async def _rebuild_patterns(self, delay=REBUILD_DELAY):
+        while self._patterns_generation != ban_store.generation:
+            await asyncio.sleep(delay)
+            bans = ban_store.bans()
+            generation = ban_store.generation
+            try:
+                previous = (self._name_sources, self.name_index, self.banned_name_patterns)
+                # Not on the IO executor: its single worker keeps disk writes in order
+                data = await asyncio.get_running_loop().run_in_executor(None, build_name_data, bans, previous)
+                self._set_name_data(data)
+            except Exception as e:
+                print(f"Error indexing banned names: {e}")
+                return
+            self._patterns_generation = generation
 
-            with open('data/verified_servers.json') as f:
-                self.verified_servers = set(json.load(f)['servers'])
+    def _set_name_data(self, data):
+        self._name_sources, self.name_index, self.banned_name_patterns = data
+        self.banned_names = list(self._name_sources)
 
-            self._extract_name_patterns()
-            self.validate_servers()  # Ensure all servers have required fields
+    def load_data(self):
+        """Load banned accounts and verified servers (server settings live in guild_settings)"""
+        try:
+            if self._patterns_generation is None:
+                # First load, before any joins arrive: build in place
+                bans = ban_store.bans()
+                self._patterns_generation = ban_store.generation
+                self._set_name_data(build_name_data(bans))
+            self.verified_servers = set(get_storage().load_verified_servers())
             print("Loaded ban list with", len(self.banned_accounts), "entries")
 
         except FileNotFoundError as e:
             print(f"Error loading data files: {e}")
-            self.banned_accounts = {}
-            self.servers = {}
             self.verified_servers = set()
-            self.banned_name_patterns = set()
-
-    def validate_servers(self):
-        """Ensure all servers have valid default fields"""
-        updated = False
-
-        for guild_id, settings in self.servers.items():
-            # If a key is missing, add it
-            if 'whitelist' not in settings:
-                settings['whitelist'] = []  # Default: no users are whitelisted
-                updated = True
-            if 'screening' not in settings:
-                settings['screening'] = False
-                updated = True
-            if 'do' not in settings:
-                settings['do'] = 'log'  # Default action: log only
-                updated = True
-            if 'logs_channel' not in settings:
-                settings['logs_channel'] = None
-                updated = True
-
-        if updated:
-            self.save_servers()
-            print("✅ Fixed missing fields in servers.json")
 
     def _is_valid_action(self, action):
         """Check if an action string is valid"""
@@ -91,58 +144,51 @@ class AutoScreener(commands.Cog):
 
         return False
 
-    def _extract_name_patterns(self):
-        """Extract patterns from banned names"""
-        banned_names = []
-
-        # Ensure 'name' key exists in each banned account before accessing
-        for account in self.banned_accounts.values():
-            name = account.get('name')
-            if name:
-                banned_names.append(name.lower())
-            else:
-                name = False
-                continue
-
-        if name:
-            self.banned_name_patterns = set()
-
-            for name in banned_names:
-                parts = []
-                for sep in ['_', '.', '-', ' ']:
-                    if sep in name:
-                        parts.extend(name.split(sep))
-
-                if not parts:
-                    parts = [name]
-
-                for part in parts:
-                    if len(part) >= 3:
-                        self.banned_name_patterns.add(part)
-
-    def is_similar_name(self, name, guild_id):
-        """Check if name matches any banned patterns, excluding whitelisted users"""
-        # Check if the user is whitelisted
-        if guild_id in self.servers and self.servers[guild_id].get('whitelist'):
-            whitelisted_ids = self.servers[guild_id]['whitelist']
-            if str(name) in whitelisted_ids:
-                return False  # User is whitelisted, no need to check for banned patterns
-
+    def match_name(self, name):
+        """
+        Why a name matches the banned names, or None if it doesn't:
+        (kind, {matched text: banned user IDs}) with kind "exact", "fragment" or "similar"
+        """
+        self._refresh_patterns()
         name_lower = name.lower()
-        banned_names = [acc['name'].lower() for acc in self.banned_accounts.values()]
-
-        if name_lower in banned_names:
-            return True
-
-        for pattern in self.banned_name_patterns:
-            if pattern in name_lower:
-                return True
-
-        for banned_name in banned_names:
-            if SequenceMatcher(None, name_lower, banned_name).ratio() > 0.7:
-                return True
 
-        return False
+        sources = self._name_sources.get(name_lower)
+        if sources:
+            return "exact", {name_lower: sources}
+
+        fragments = self.banned_name_patterns.findall(name_lower)
+        if fragments:
+            return "fragment", fragments
+
+        similar = self.name_index.first_match(name_lower)
+        if similar is not None:
+            return "similar", {similar: self._name_sources[similar]}
+
+        return None
+
+    def is_similar_name(self, name):
+        """Check if name matches any banned patterns (whitelisting is checked by the caller)"""
+        return self.match_name(name) is not None
+
+    def _explain_match(self, match, limit=3):
+        """Log lines naming what matched and which banned accounts it came from"""
+        kind, hits = match
+        bans = ban_store.bans()
+        lines = []
+        for text, user_ids in list(hits.items())[:limit]:
+            accounts = ", ".join(f"{bans.get(user_id, {}).get('name') or 'Unknown User'} (`{user_id}`)"
+                                 for user_id in sorted(user_ids)[:limit])
+            if len(user_ids) > limit:
+                accounts += f" and {len(user_ids) - limit} more"
+            if kind == "exact":
+                lines.append(f"-# Same name as banned {accounts}")
+            elif kind == "fragment":
+                lines.append(f"-# Contains `{text}` from banned {accounts}")
+            else:
+                lines.append(f"-# Similar to banned {accounts}")
+        if len(hits) > limit:
+            lines.append(f"-# ...and {len(hits) - limit} more fragments")
+        return "\n".join(lines)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
@@ -150,34 +196,40 @@ class AutoScreener(commands.Cog):
         if member.bot:
             return
 
-        guild_id = str(member.guild.id)
-
-        # Auto-add missing server to servers.json
-        if guild_id not in self.servers:
-            self.servers[guild_id] = {
-                "screening": False,
-                "do": "log",  # Default action is to log
-                "logs_channel": None,
-                "whitelist": []  # Default: no users whitelisted
-            }
-            self.save_servers()
-            print(f"Auto-added server {guild_id} to servers.json")
+        # Plain in-memory lookup; only a guild we've never seen touches the lock
+        server_settings = guild_settings.get(member.guild.id)
+        if server_settings is None:
+            server_settings, created = await guild_settings.ensure(member.guild.id)
+            if created:
+                print(f"Auto-added server {member.guild.id} to servers.json")
 
         # Skip screening if the user is whitelisted
-        if member.id in self.servers[guild_id].get('whitelist', []):
+        if member.id in server_settings.whitelist:
             print(f"✅ {member.mention} is whitelisted, no screening.")
             return
 
-        server_settings = self.servers.get(guild_id, {})
+        # Confirmed global bans first: one set lookup, before any name work
+        if member.id in ban_store:
+            print(f"⛔ {member} ({member.id}) is on the global ban list")
+            global_reason = audit_reason(member.id)
+            await self._respond(member, server_settings, f"Confirmed global ban: {global_reason}"[:512],
+                                "global ban list member", "⛔", f"-# On the global ban list: {global_reason}")
+            return
 
-        if not self.is_similar_name(member.name, guild_id):
+        match = self.match_name(member.name)
+        if match is None:
             return
 
-        screening_enabled = server_settings.get('screening', False)
-        action = server_settings.get('do', 'log') if screening_enabled else 'log'
-        logs_channel = member.guild.get_channel(server_settings.get('logs_channel'))
+        await self._respond(member, server_settings, "Potential banned user pattern match",
+                            "potential banned user", "🚨", self._explain_match(match))
+
+    async def _respond(self, member, server_settings, reason, subject, icon, detail):
+        """Act on a screened member per the server's settings and post to its logs channel"""
+        action = server_settings.action if server_settings.screening else 'log'
+        logs_channel = member.guild.get_channel(server_settings.logs_channel) if server_settings.logs_channel else None
 
-        message = await self._take_action(member, action)
+        message = await self._take_action(member, action, reason, subject, icon)
+        message += "\n" + detail
 
         if logs_channel:
             try:
@@ -185,9 +237,9 @@ class AutoScreener(commands.Cog):
             except discord.Forbidden:
                 print(f"Missing permissions in logs channel {logs_channel.id}")
 
-    async def _take_action(self, member, action):
+    async def _take_action(self, member, action, reason="Potential banned user pattern match",
+                           subject="potential banned user", icon="🚨"):
         """Execute the appropriate moderation action"""
-        reason = "Potential banned user pattern match"
         actions_taken = []
 
         # Ensure action is properly normalized (just in case)
@@ -210,15 +262,10 @@ class AutoScreener(commands.Cog):
                 actions_taken.append(f"error during {action} ({str(e)})")
 
         if not actions_taken:
-            return f"⚠️ **Potential banned user detected**: {member.mention} (`{member.name}`)"
+            return f"⚠️ **{subject.capitalize()} detected**: {member.mention} (`{member.name}`)"
 
         actions_str = ", ".join(actions_taken)
-        return f"🚨 **{actions_str.capitalize()} potential banned user**: {member.mention} (`{member.name}`)"
-
-    def save_servers(self):
-        """Save server settings to file"""
-        with open('data/servers.json', 'w') as f:
-            json.dump(self.servers, f, indent=2)
+        return f"{icon} **{actions_str.capitalize()} {subject}**: {member.mention} (`{member.name}`)"
 
     def is_verified_server(self, ctx):
         """Check if the command is run in a verified server"""
@@ -267,17 +314,8 @@ class AutoScreener(commands.Cog):
                            "- `kick,log` or `log,kick` (kick and log)")
             return
 
-        guild_id = str(ctx.guild.id)
-        if guild_id not in self.servers:
-            self.servers[guild_id] = {
-                "screening": False,
-                "do": "log",
-                "logs_channel": None
-            }
-
         # Store the normalized action
-        self.servers[guild_id]['do'] = normalized_action
-        self.save_servers()
+        await guild_settings.update(ctx.guild.id, action=normalized_action)
         await ctx.send(f"✅ Action set to: `{normalized_action}`")
 
     def _is_valid_action(self, action):
@@ -308,21 +346,11 @@ class AutoScreener(commands.Cog):
     @vsettings.command()
     async def screening(self, ctx, state: str):
         """Enable or disable screening (on/off)"""
-        guild_id = str(ctx.guild.id)
-        if guild_id not in self.servers:
-            self.servers[guild_id] = {
-                "screening": False,
-                "do": "log",
-                "logs_channel": None
-            }
-
         if state.lower() in ['on', 'enable', 'true']:
-            self.servers[guild_id]['screening'] = True
-            self.save_servers()
+            await guild_settings.update(ctx.guild.id, screening=True)
             await ctx.send("✅ Screening enabled")
         elif state.lower() in ['off', 'disable', 'false']:
-            self.servers[guild_id]['screening'] = False
-            self.save_servers()
+            await guild_settings.update(ctx.guild.id, screening=False)
             await ctx.send("✅ Screening disabled")
         else:
             await ctx.send("Invalid state. Use [on/off]")
@@ -330,21 +358,11 @@ class AutoScreener(commands.Cog):
     @vsettings.command()
     async def logchannel(self, ctx, channel: discord.TextChannel = None):
         """Set the log channel for screening notifications"""
-        guild_id = str(ctx.guild.id)
-        if guild_id not in self.servers:
-            self.servers[guild_id] = {
-                "screening": False,
-                "do": "log",
-                "logs_channel": None
-            }
-
         if channel is None:
-            self.servers[guild_id]['logs_channel'] = None
-            self.save_servers()
+            await guild_settings.update(ctx.guild.id, logs_channel=None)
             await ctx.send("✅ Log channel cleared")
         else:
-            self.servers[guild_id]['logs_channel'] = channel.id
-            self.save_servers()
+            await guild_settings.update(ctx.guild.id, logs_channel=channel.id)
             await ctx.send(f"✅ Log channel set to {channel.mention}")
 
     @commands.command()
@@ -352,6 +370,8 @@ class AutoScreener(commands.Cog):
     @verified_only()
     async def reloadbans(self, ctx):
         """Reload the ban list and patterns"""
+        self._patterns_generation = None
+        await self._rebuild_patterns(delay=0)
         self.load_data()
         await ctx.send("✅ Reloaded ban list with "
                        f"{len(self.banned_accounts)} entries and "
@@ -362,8 +382,9 @@ class AutoScreener(commands.Cog):
     @verified_only()
     async def checkname(self, ctx, *, name):
         """Check if a name matches banned patterns"""
-        if self.is_similar_name(name):
-            await ctx.send(f"⚠️ `{name}` matches banned patterns!")
+        match = self.match_name(name)
+        if match is not None:
+            await ctx.send(f"⚠️ `{name}` matches banned patterns!\n{self._explain_match(match)}")
         else:
             await ctx.send(f"✅ `{name}` appears clean")
 
@@ -373,13 +394,10 @@ class AutoScreener(commands.Cog):
     async def reloadservers(self, ctx):
         """Reload server settings and verified servers"""
         try:
-            with open('data/servers.json') as f:
-                self.servers = json.load(f)
-
-            with open('data/verified_servers.json') as f:
-                self.verified_servers = set(json.load(f)['servers'])
+            servers = guild_settings.reload()
+            self.verified_servers = set(get_storage().load_verified_servers())
 
-            await ctx.send(f"✅ Reloaded server settings for {len(self.servers)} servers "
+            await ctx.send(f"✅ Reloaded server settings for {len(servers)} servers "
                            f"and {len(self.verified_servers)} verified servers.")
         except FileNotFoundError as e:
             await ctx.send(f"❌ Error loading server data: {e}")
@@ -389,16 +407,17 @@ class AutoScreener(commands.Cog):
     @verified_only()
     async def listservers(self, ctx):
         """List all servers configured with AutoScreener"""
-        if not self.servers:
+        servers = guild_settings.snapshot()
+        if not servers:
             await ctx.send("❌ No servers found in configuration.")
             return
 
         description = ""
 
-        for guild_id, settings in self.servers.items():
-            screening_status = "✅ Screening" if settings.get('screening', False) else "❌ No Screening"
-            action = settings.get('do', 'N/A')
-            logs_channel = settings.get('logs_channel')
+        for guild_id, settings in servers.items():
+            screening_status = "✅ Screening" if settings.screening else "❌ No Screening"
+            action = settings.action
+            logs_channel = settings.logs_channel
 
             logging_status = "Logging disabled" if action == "kick" else f"Logs Channel: {logs_channel if logs_channel else 'None'}"
 
@@ -424,18 +443,7 @@ class AutoScreener(commands.Cog):
     @vsettings.command()
     async def addwhitelist(self, ctx, user: discord.User):
         """Add a user to the whitelist for the server"""
-        guild_id = str(ctx.guild.id)
-        if guild_id not in self.servers:
-            self.servers[guild_id] = {
-                "whitelist": [],  # Default: no users whitelisted
-                "screening": False,
-                "do": "log",
-                "logs_channel": None
-            }
-
-        if user.id not in self.servers[guild_id]['whitelist']:
-            self.servers[guild_id]['whitelist'].append(user.id)
-            self.save_servers()
+        if await guild_settings.add_to_whitelist(ctx.guild.id, user.id):
             await ctx.send(f"✅ {user.mention} has been added to the whitelist.")
         else:
             await ctx.send(f"⚠️ {user.mention} is already whitelisted.")
@@ -443,13 +451,10 @@ class AutoScreener(commands.Cog):
     @vsettings.command()
     async def removewhitelist(self, ctx, user: discord.User):
         """Remove a user from the whitelist for the server"""
-        guild_id = str(ctx.guild.id)
-        if guild_id not in self.servers or user.id not in self.servers[guild_id].get('whitelist', []):
+        if not await guild_settings.remove_from_whitelist(ctx.guild.id, user.id):
             await ctx.send(f"⚠️ {user.mention} is not whitelisted.")
             return
 
-        self.servers[guild_id]['whitelist'].remove(user.id)
-        self.save_servers()
         await ctx.send(f"✅ {user.mention} has been removed from the whitelist.")
 
 
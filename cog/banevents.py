@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import discord
+from discord.ext import commands
+from utils.banexec import issued_bans
+from utils.banstore import ban_store
+from utils.bansnapshot import ban_snapshots
+from utils.coverage import coverage_index
+from utils.globalsync import apply_ban, apply_unban, record_own_bans
+from utils.propagation import ban_propagator
+from utils.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# The bot's own bans are recorded on the global list this long after their events, in one write per server
+OWN_BAN_BATCH_DELAY = 5.0
+
+
+class BanEvents(commands.Cog):
+    """
+    Keeps the global ban list current from ban/unban events in verified
+    servers, and patches any cached per-guild ban snapshot (utils/bansnapshot.py)
+    and the coverage index (utils/coverage.py).
+    Missed events are caught by the scheduled full sync (utils/globalsync.py).
+
+    Bans the bot issued itself (utils/banexec.py) need no fetch_ban, and are
+    recorded in batches so a 10k user massban is a few writes, not 10k.
+    """
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._own_bans = {}  # server_id -> {user_id: reason}
+        self._flush_task = None
+
+    def is_verified(self, guild):
+        return str(guild.id) in get_storage().load_verified_servers()
+
+    @commands.Cog.listener()
+    async def on_member_ban(self, guild, user):
+        coverage_index.note_ban(guild.id, user.id)
+        server_id = str(guild.id)
+
+        own_reason = issued_bans.claim(guild.id, user.id)
+        if own_reason is not None:
+            ban_snapshots.note_ban(guild.id, user.id, str(user), own_reason)
+            if self.is_verified(guild):
+                self._own_bans.setdefault(server_id, {})[user.id] = own_reason
+                if self._flush_task is None or self._flush_task.done():
+                    self._flush_task = asyncio.get_running_loop().create_task(self._flush_own_bans())
+            return
+
+        snapshot = ban_snapshots.cached(guild.id)
+        needs_snapshot = snapshot is not None and user.id not in snapshot
+
+        needs_global = False
+        entry = None
+        if self.is_verified(guild):
+            entry = ban_store.get(user.id)
+            # Already recorded for this server
+            needs_global = entry is None or not entry.in_server(server_id)
+
+        if not needs_snapshot and not needs_global:
+            return
+
+        # The event doesn't carry the reason, so look the ban up once
+        try:
+            ban = await guild.fetch_ban(user)
+        except discord.NotFound:
+            return  # Unbanned again before we got here
+        except discord.HTTPException as e:
+            logger.error(f"Could not fetch ban for {user.id} in {guild.name} ({guild.id}): {e}")
+            if needs_snapshot:
+                ban_snapshots.invalidate(guild.id)
+            return
+
+        if needs_snapshot:
+            ban_snapshots.note_ban(guild.id, ban.user.id, str(ban.user), ban.reason)
+        if needs_global and await apply_ban(server_id, ban.user, ban.reason):
+            logger.info(f"Global list: added {ban.user} ({ban.user.id}) from {guild.name} ({guild.id})")
+            if entry is None:
+                ban_propagator.enqueue([ban.user.id], source_guild_id=guild.id)
+
+    async def _flush_own_bans(self):
+        while self._own_bans:
+            await asyncio.sleep(OWN_BAN_BATCH_DELAY)
+            pending, self._own_bans = self._own_bans, {}
+            for server_id, reasons in pending.items():
+                try:
+                    recorded = await record_own_bans(server_id, reasons)
+                except Exception as e:
+                    logger.exception(f"Could not record {len(reasons)} own bans in {server_id}: {e}")
+                    continue
+                if recorded:
+                    logger.info(f"Global list: recorded {len(recorded)} of our own bans in {server_id}")
+
+    @commands.Cog.listener()
+    async def on_member_unban(self, guild, user):
+        coverage_index.note_unban(guild.id, user.id)
+        ban_snapshots.note_unban(guild.id, user.id)
+        if not self.is_verified(guild):
+            return
+
+        if await apply_unban(str(guild.id), user):
+            logger.info(f"Global list: {user} ({user.id}) unbanned in {guild.name} ({guild.id})")
+
+
+async def setup(bot):
+    await bot.add_cog(BanEvents(bot))
@@ -1,36 +1,32 @@
+import discord
 from discord.ext import commands
+import io
 import json
+from datetime import datetime
+from utils.aio import run_io
+from utils.banstore import ban_store
+from utils.generations import generation_log
+from utils.propagation import ban_propagator
+from utils.storage import get_storage
 
 # File paths
 CONFIG_FILE = "data/asd.json"
-VERIFIED_SERVERS_FILE = "data/verified_servers.json"
-GLOBAL_BAN_LIST_FILE = "data/global_ban_list.json"
 
 def load_config():
     with open(CONFIG_FILE, "r") as f:
         return json.load(f)
 
 def load_verified_servers():
-    try:
-        with open(VERIFIED_SERVERS_FILE, "r") as f:
-            return json.load(f).get("servers", [])
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+    return get_storage().load_verified_servers()
 
 def save_verified_servers(servers):
-    with open(VERIFIED_SERVERS_FILE, "w") as f:
-        json.dump({"servers": servers}, f, indent=4)
+    get_storage().save_verified_servers(servers)
 
 def load_global_ban_list():
-    try:
-        with open(GLOBAL_BAN_LIST_FILE, "r") as f:
-            return json.load(f).get("bans", {})
-    except (FileNotFoundError, json.JSONDecodeError):
-        return {}
+    return ban_store.bans()
 
 def save_global_ban_list(ban_list):
-    with open(GLOBAL_BAN_LIST_FILE, "w") as f:
-        json.dump({"bans": ban_list}, f, indent=4)
+    ban_store.replace(ban_list)
 
 # Load auditors from config file
 auditors = load_config()["auditors"]
@@ -44,23 +40,18 @@ def is_auditor():
 class BanManagement(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.load_data()
-
-    def load_data(self):
-        """Load global ban list from file"""
-        self.banned_accounts = load_global_ban_list()
-        print("Loaded global ban list with", len(self.banned_accounts), "entries")
-
-    def save_data(self):
-        """Save global ban list to file"""
-        save_global_ban_list(self.banned_accounts)
+        print("Loaded global ban list with", len(ban_store), "entries")
 
     @commands.command(aliases=['banadd', 'addban'])
     @is_auditor()  # Only auditors can use this command
     async def add_to_banlist(self, ctx, user_id: int, *, reason: str = "No reason provided"):
         """Add a user to the global ban list"""
-        self.banned_accounts[user_id] = {"reason": reason}
-        self.save_data()
+        entry = ban_store.get(user_id)
+        # Keep the servers and name of an existing entry, only the reason changes
+        updated = entry.replace(reason=reason) if entry is not None else {"reason": reason}
+        ban_store.set(user_id, updated, source=f"banadd by {ctx.author.id}")
+        if entry is None:
+            ban_propagator.enqueue([user_id])
         await ctx.send(f"✅ User with ID {user_id} added to the global ban list for the reason: {reason}")
 
     @commands.command(aliases=['suggestremove', 'removesuggest'])
@@ -69,7 +60,7 @@ class BanManagement(commands.Cog):
         # Send to the auditor channel
         auditor_channel = self.bot.get_channel(1365903180730335315)
         if auditor_channel:
-            user = self.banned_accounts.get(user_id, None)
+            user = ban_store.get(user_id)
             if user:
                 reason = user["reason"]
                 await auditor_channel.send(
@@ -89,12 +80,55 @@ class BanManagement(commands.Cog):
     @is_auditor()  # Only auditors can use this command
     async def remove_from_banlist(self, ctx, user_id: int):
         """Remove a user from the global ban list (if they exist)"""
-        if user_id in self.banned_accounts:
-            del self.banned_accounts[user_id]
-            self.save_data()
+        if ban_store.remove(user_id, source=f"remove by {ctx.author.id}"):
             await ctx.send(f"✅ User ID {user_id} has been removed from the global ban list.")
         else:
             await ctx.send(f"❌ User ID {user_id} not found in the global ban list.")
 
+    @commands.command(aliases=['gdiff', 'generationdiff'])
+    @is_auditor()
+    async def globaldiff(self, ctx, start: int = None, end: int = None):
+        """Show what changed in the global ban list between two generations (default: the latest change)"""
+        available = await run_io(generation_log.available)
+        if not available:
+            await ctx.send("ℹ️ No generations of the global ban list have been recorded yet.")
+            return
+
+        end = available[-1] if end is None else end
+        start = end - 1 if start is None else start
+        try:
+            added, changed, removed = await run_io(generation_log.diff, start, end)
+            header = await run_io(generation_log.load, max(start, end)) if max(start, end) else None
+        except FileNotFoundError:
+            await ctx.send(f"❌ Generations between {start} and {end} are not all available. "
+                           f"Kept: {available[0]}–{available[-1]}.")
+            return
+
+        lines = []
+        for user_id, entry in added.items():
+            lines.append(f"+ {entry.get('name') or 'Unknown User'} ({user_id}) - {entry.get('reason')}")
+        for user_id, (old, new) in changed.items():
+            servers = f"servers {len(old.get('servers', []))} -> {len(new.get('servers', []))}"
+            reason = f", reason '{old.get('reason')}' -> '{new.get('reason')}'" if old.get('reason') != new.get('reason') else ""
+            lines.append(f"~ {new.get('name') or 'Unknown User'} ({user_id}) {servers}{reason}")
+        for user_id, entry in removed.items():
+            lines.append(f"- {entry.get('name') or 'Unknown User'} ({user_id}) - {entry.get('reason')}")
+
+        summary = f"📜 **Global ban list diff {start} → {end}**: +{len(added)} / ~{len(changed)} / -{len(removed)}"
+        if header:
+            when = datetime.fromtimestamp(header['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+            summary += (f"\n-# Generation {header['generation']} ({header.get('source') or 'unknown source'}, {when}) · "
+                        f"{header['count']} entries · hash `{header['hash'][:12]}`")
+        if not lines:
+            await ctx.send(summary + "\nNo net changes.")
+            return
+
+        body = "\n".join(lines)
+        if len(summary) + len(body) + 10 <= 2000:
+            await ctx.send(f"{summary}\n```diff\n{body}\n```")
+        else:
+            diff_file = discord.File(io.BytesIO(body.encode()), filename=f"globaldiff_{start}_{end}.diff")
+            await ctx.send(summary, file=diff_file)
+
 async def setup(bot):
     await bot.add_cog(BanManagement(bot))
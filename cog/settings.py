@@ -1,22 +1,11 @@
 import discord
 from discord.ext import commands
-import json
+from utils.guildsettings import guild_settings
 
 
 class Settings(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        # Load server settings
-        try:
-            with open('data/servers.json') as f:
-                self.servers = json.load(f)
-        except FileNotFoundError:
-            self.servers = {}
-
-    def save_settings(self):
-        """Save server settings to the file"""
-        with open('data/servers.json', 'w') as f:
-            json.dump(self.servers, f, indent=4)
 
     @commands.group(name='settings', invoke_without_command=True)
     @commands.has_permissions(manage_guild=True)
@@ -29,16 +18,16 @@ class Settings(commands.Cog):
         )
 
         # Get current settings
-        guild_id = str(ctx.guild.id)
-        settings = self.servers.get(guild_id, {})
-        logs = settings.get("logs_channel", "Not set")
+        settings = guild_settings.get_or_default(ctx.guild.id)
+        logs = settings.logs_channel
 
         embed.add_field(
             name="Current Settings",
             value=(
-                f"**Screening Enabled:** {settings.get('screening', False)}\n"
-                f"**Action:** {settings.get('do', 'log').title()}\n"
-                f"**Logs Channel:** {f'<#{logs}>' if logs != 'Not set' else 'Not set'}"
+                f"**Screening Enabled:** {settings.screening}\n"
+                f"**Action:** {settings.action.title()}\n"
+                f"**Logs Channel:** {f'<#{logs}>' if logs else 'Not set'}\n"
+                f"**Auto-Enforce:** {settings.auto_enforce}"
             ),
             inline=False
         )
@@ -49,6 +38,7 @@ class Settings(commands.Cog):
                 "`v!settings screening <on/off>` - Enable/disable automatic screening\n"
                 "`v!settings action <ban/kick/log>` - Set action for matches\n"
                 "`v!settings logchannel <#channel>` - Set logging channel\n"
+                "`v!settings autoenforce <on/off>` - Ban new global list entries automatically\n"
                 "`v!settings view` - View current settings\n"
                 "`v!settings reset` - Reset all settings to default"
             ),
@@ -61,20 +51,16 @@ class Settings(commands.Cog):
     @commands.has_permissions(manage_guild=True)
     async def screening_setting(self, ctx, state: str):
         """Enable or disable automatic screening of new members"""
-        guild_id = str(ctx.guild.id)
-
         if state.lower() in ('on', 'enable', 'true'):
-            self.servers.setdefault(guild_id, {})['screening'] = True
+            await guild_settings.update(ctx.guild.id, screening=True)
             action = "enabled"
         elif state.lower() in ('off', 'disable', 'false'):
-            self.servers.setdefault(guild_id, {})['screening'] = False
+            await guild_settings.update(ctx.guild.id, screening=False)
             action = "disabled"
         else:
             await ctx.send("❌ Invalid state. Use `on` or `off`")
             return
 
-        self.save_settings()
-
         # Send confirmation message
         embed = discord.Embed(
             title="✅ Setting Changed",
@@ -87,7 +73,6 @@ class Settings(commands.Cog):
     @commands.has_permissions(manage_guild=True)
     async def action_setting(self, ctx, *, action: str):
         """Set what action to take when a potential bad actor is detected (ban/kick/log or combinations)"""
-        guild_id = str(ctx.guild.id)
 
         # Get the AutoScreener cog to use its validation
         screener = self.bot.get_cog('AutoScreener')
@@ -107,8 +92,7 @@ class Settings(commands.Cog):
                            "- `kick,log` or `log,kick` (kick and log)")
             return
 
-        self.servers.setdefault(guild_id, {})['do'] = normalized_action
-        self.save_settings()
+        await guild_settings.update(ctx.guild.id, action=normalized_action)
 
         # Send confirmation message
         embed = discord.Embed(
@@ -122,10 +106,7 @@ class Settings(commands.Cog):
     @commands.has_permissions(manage_guild=True)
     async def logchannel_setting(self, ctx, channel: discord.TextChannel):
         """Set the channel where detection logs will be sent"""
-        guild_id = str(ctx.guild.id)
-
-        self.servers.setdefault(guild_id, {})['logs_channel'] = str(channel.id)
-        self.save_settings()
+        await guild_settings.update(ctx.guild.id, logs_channel=channel.id)
 
         # Send confirmation message
         embed = discord.Embed(
@@ -135,12 +116,34 @@ class Settings(commands.Cog):
         )
         await ctx.send(embed=embed)
 
+    @settings_group.command(name='autoenforce')
+    @commands.has_permissions(ban_members=True, manage_guild=True)
+    async def autoenforce_setting(self, ctx, state: str):
+        """Automatically ban users as soon as they're added to the global ban list"""
+        if state.lower() in ('on', 'enable', 'true'):
+            await guild_settings.update(ctx.guild.id, auto_enforce=True)
+            action = "enabled"
+        elif state.lower() in ('off', 'disable', 'false'):
+            await guild_settings.update(ctx.guild.id, auto_enforce=False)
+            action = "disabled"
+        else:
+            await ctx.send("❌ Invalid state. Use `on` or `off`")
+            return
+
+        # Send confirmation message
+        embed = discord.Embed(
+            title="✅ Setting Changed",
+            description=f"Auto-enforcement of new global bans has been **{action}** for your server."
+                        + (" Run `v!synclocal` once to catch up on existing entries." if action == "enabled" else ""),
+            color=discord.Color.green()
+        )
+        await ctx.send(embed=embed)
+
     @settings_group.command(name='view')
     @commands.has_permissions(manage_guild=True)
     async def view_settings(self, ctx):
         """View current server settings"""
-        guild_id = str(ctx.guild.id)
-        settings = self.servers.get(guild_id, {})
+        settings = guild_settings.get_or_default(ctx.guild.id)
 
         embed = discord.Embed(
             title="⚙️ Current Server Settings",
@@ -149,35 +152,36 @@ class Settings(commands.Cog):
 
         embed.add_field(
             name="Screening",
-            value="Enabled" if settings.get('screening', False) else "Disabled",
+            value="Enabled" if settings.screening else "Disabled",
             inline=True
         )
 
         embed.add_field(
             name="Action",
-            value=settings.get('do', 'log').title(),
+            value=settings.action.title(),
             inline=True
         )
 
-        logs_channel = settings.get('logs_channel')
+        logs_channel = settings.logs_channel
         embed.add_field(
             name="Logs Channel",
             value=f"<#{logs_channel}>" if logs_channel else "Not set",
             inline=False
         )
 
+        embed.add_field(
+            name="Auto-Enforce",
+            value="Enabled" if settings.auto_enforce else "Disabled",
+            inline=True
+        )
+
         await ctx.send(embed=embed)
 
     @settings_group.command(name='reset')
     @commands.has_permissions(administrator=True)
     async def reset_settings(self, ctx):
         """Reset all settings to default"""
-        guild_id = str(ctx.guild.id)
-
-        if guild_id in self.servers:
-            del self.servers[guild_id]
-            self.save_settings()
-
+        if await guild_settings.delete(ctx.guild.id):
             # Send confirmation message
             embed = discord.Embed(
                 title="✅ Settings Reset",
@@ -191,21 +195,13 @@ class Settings(commands.Cog):
     @commands.Cog.listener()
     async def on_guild_join(self, guild):
         """Auto-initialize settings for new servers that join"""
-        guild_id = str(guild.id)
-
         # Ensure server has default settings
-        if guild_id not in self.servers:
-            self.servers[guild_id] = {
-                'screening': False,
-                'do': 'log',
-                'logs_channel': None
-            }
-            self.save_settings()
+        settings, _ = await guild_settings.ensure(guild.id)
 
         # Optionally send welcome message to server admin or log channel
-        logs_channel_id = self.servers[guild_id].get('logs_channel', None)
+        logs_channel_id = settings.logs_channel
         if logs_channel_id:
-            logs_channel = guild.get_channel(int(logs_channel_id))
+            logs_channel = guild.get_channel(logs_channel_id)
             if logs_channel:
                 await logs_channel.send(f"👋 **New server joined:** {guild.name} - Default detection settings applied.")
 
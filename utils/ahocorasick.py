@@ -0,0 +1,98 @@
+from collections import deque
+
+
+class Automaton:
+    """
+    Aho-Corasick multi-pattern matcher: finds every pattern occurring in a
+    text in one pass, O(len(text) + matches) no matter how many patterns
+    there are. Each pattern carries the set of sources it came from (for
+    name fragments, the banned accounts), so a hit can say why it matched.
+
+    Add patterns with `add()`, then call `build()` once; the automaton is
+    read-only after that. Rebuild a new one when the patterns change.
+    """
+
+    def __init__(self, patterns=None):
+        self._goto = [{}]  # node -> {char: node}
+        self._fail = [0]
+        self._out = [()]  # node -> indexes of the patterns ending here, including via fail links
+        self.patterns = []
+        self.sources = []  # pattern index -> set of sources
+        self._index = {}  # pattern -> index
+        self._built = False
+        if patterns:
+            for pattern, source in patterns:
+                self.add(pattern, source)
+            self.build()
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __contains__(self, pattern):
+        return pattern in self._index
+
+    def add(self, pattern, source=None):
+        if self._built:
+            raise RuntimeError("Automaton is already built")
+        if not pattern:
+            return
+        index = self._index.get(pattern)
+        if index is None:
+            index = self._index[pattern] = len(self.patterns)
+            self.patterns.append(pattern)
+            self.sources.append(set())
+            node = 0
+            for char in pattern:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = self._goto[node][char] = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                node = next_node
+            self._out[node] = (index,)
+        if source is not None:
+            self.sources[index].add(source)
+
+    def build(self):
+        """Compute failure links breadth-first and merge each node's matches with its fail node's"""
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                if out[fail[child]]:
+                    out[child] = out[child] + out[fail[child]]
+                queue.append(child)
+        self._built = True
+        return self
+
+    def iter(self, text):
+        """(end index, pattern index) for every occurrence of every pattern in `text`"""
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            for index in out[node]:
+                yield position, index
+
+    def first(self, text):
+        """The first pattern found in `text`, or None"""
+        for _, index in self.iter(text):
+            return self.patterns[index]
+        return None
+
+    def findall(self, text):
+        """{pattern: sources} for every distinct pattern in `text`"""
+        found = {}
+        for _, index in self.iter(text):
+            pattern = self.patterns[index]
+            if pattern not in found:
+                found[pattern] = self.sources[index]
+        return found
@@ -0,0 +1,122 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# One worker keeps every disk write in submission order
+io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vtracker-io")
+
+
+async def run_io(func, *args, **kwargs):
+    """Run a blocking call on the IO executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, functools.partial(func, *args, **kwargs))
+
+
+def _log_failure(future, name):
+    exc = future.exception()
+    if exc is not None:
+        logger.error(f"Background write '{name}' failed: {exc}")
+
+
+def submit_io(func, *args, **kwargs):
+    """Fire-and-forget a blocking call on the IO executor. Errors are logged."""
+    future = io_executor.submit(func, *args, **kwargs)
+    future.add_done_callback(functools.partial(_log_failure, name=getattr(func, "__name__", repr(func))))
+    return future
+
+
+class CoalescingWriter:
+    """
+    Runs `func` on the IO executor, coalescing requests that arrive while a
+    run is already queued: only the latest arguments are written. Safe to call
+    from the event loop or from executor threads.
+    """
+
+    def __init__(self, func, name=None):
+        self.func = func
+        self.name = name or getattr(func, "__name__", "writer")
+        self._lock = threading.Lock()
+        self._queued = None  # (args, kwargs) waiting for the next run
+        self._future = None  # Future of the queued (not yet started) run
+        self._running = False
+        self.coalesced = 0
+
+    def request(self, *args, **kwargs):
+        with self._lock:
+            if self._future is not None:
+                self._queued = (args, kwargs)
+                self.coalesced += 1
+                return self._future
+            self._queued = (args, kwargs)
+            self._future = io_executor.submit(self._run)
+            self._future.add_done_callback(functools.partial(_log_failure, name=self.name))
+            return self._future
+
+    def _run(self):
+        with self._lock:
+            args, kwargs = self._queued
+            self._queued = None
+            self._future = None
+            self._running = True
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            self._running = False
+
+    @property
+    def busy(self):
+        return self._running or self._future is not None
+
+    async def flush(self):
+        """Wait until anything requested so far has been written"""
+        await run_io(lambda: None)
+
+
+class LoopLagMonitor:
+    """
+    Measures event loop lag: how late a sleep(interval) wakes up. Blocking
+    calls on the loop (disk I/O, big json.dump) show up directly as lag.
+    """
+
+    def __init__(self, interval=0.5, samples=240, warn_threshold=0.25):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.samples = deque(maxlen=samples)
+        self.worst = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - started - self.interval)
+            self.samples.append(lag)
+            self.worst = max(self.worst, lag)
+            if lag >= self.warn_threshold:
+                logger.warning(f"Event loop was blocked for {lag * 1000:.0f}ms")
+
+    def stats(self):
+        """(average, p95, max over the window, worst ever) in milliseconds"""
+        if not self.samples:
+            return 0.0, 0.0, 0.0, self.worst * 1000
+        ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        avg = sum(ordered) / len(ordered)
+        return avg * 1000, p95 * 1000, ordered[-1] * 1000, self.worst * 1000
+
+
+loop_lag = LoopLagMonitor()
@@ -0,0 +1,195 @@
+import logging
+import time
+
+import discord
+
+from utils.scheduler import AdaptiveScheduler, backoff_from
+
+logger = logging.getLogger(__name__)
+
+# Discord's limit for one bulk ban request
+BULK_BAN_LIMIT = 200
+# Ban requests in flight at once per job; the scheduler adapts below this
+MAX_BAN_CONCURRENCY = 4
+
+
+class BanOutcome:
+    """Which users a ban run banned and which failed (user_id -> short error)"""
+
+    __slots__ = ("banned", "failed", "bulk", "stats")
+
+    def __init__(self):
+        self.banned = []
+        self.failed = {}
+        self.bulk = True  # False once we fell back to one request per user
+        self.stats = []  # SchedulerStats per phase (bulk, then per-user fallback)
+
+    @property
+    def done(self):
+        return len(self.banned) + len(self.failed)
+
+    @property
+    def requests(self):
+        return sum(stats.requests for stats in self.stats)
+
+    @property
+    def seconds(self):
+        return sum(stats.seconds for stats in self.stats)
+
+    def throughput(self):
+        """Summary line for the end of a job"""
+        throttled = sum(stats.throttled for stats in self.stats)
+        peak = max((stats.peak_concurrency for stats in self.stats), default=0)
+        rate = self.done / self.seconds if self.seconds > 0 else 0.0
+        return (f"{self.done} users in {self.seconds:.1f}s ({rate:.1f} users/s) using {self.requests} requests"
+                f"{'' if self.bulk else ' (per-user fallback)'}; throttled {throttled}x, "
+                f"peak concurrency {peak}")
+
+
+class IssuedBans:
+    """
+    Bans this bot is about to issue, so the ban events they trigger can be
+    told apart from a moderator's: the reason is already known (no
+    fetch_ban per event) and cog/banevents.py records them in batches.
+    Claims expire after `ttl` seconds in case a ban fails or its event
+    never arrives.
+    """
+
+    def __init__(self, ttl=600.0):
+        self.ttl = ttl
+        self._reasons = {}  # (guild_id, user_id) -> (reason, expires_at)
+        self._next_prune = 0.0
+
+    def expect(self, guild_id, user_ids, reason):
+        now = time.monotonic()
+        if now >= self._next_prune:
+            self._reasons = {key: value for key, value in self._reasons.items() if value[1] > now}
+            self._next_prune = now + self.ttl
+        expires_at = now + self.ttl
+        for user_id in user_ids:
+            self._reasons[(int(guild_id), int(user_id))] = (reason, expires_at)
+
+    def claim(self, guild_id, user_id):
+        """The reason we banned with if this ban is ours, else None"""
+        claimed = self._reasons.pop((int(guild_id), int(user_id)), None)
+        if claimed is None or claimed[1] < time.monotonic():
+            return None
+        return claimed[0]
+
+
+# Filled by ban_users, claimed by the on_member_ban listener
+issued_bans = IssuedBans()
+
+
+def _group_by_reason(user_ids, reason_for):
+    groups = {}
+    for user_id in user_ids:
+        groups.setdefault(reason_for(user_id), []).append(user_id)
+    return groups
+
+
+async def ban_users(guild, user_ids, reason_for, on_progress=None, log_prefix="Ban",
+                    max_concurrency=MAX_BAN_CONCURRENCY):
+    """
+    Ban `user_ids` in `guild`, 200 per request with Guild.bulk_ban (one
+    request per distinct reason and chunk), falling back to one request per
+    user if bulk banning is forbidden or unavailable. Requests are paced by an
+    AdaptiveScheduler (utils/scheduler.py) instead of fixed sleeps.
+    `reason_for(user_id)` gives each user's audit log reason;
+    `on_progress(outcome)` is awaited after every chunk and every 10 users.
+    """
+    outcome = BanOutcome()
+    fallback = []  # (user_id, reason) left for the per-user route
+
+    bulk_ban = getattr(guild, "bulk_ban", None)  # discord.py 2.4+
+    if bulk_ban is None:
+        outcome.bulk = False
+
+    chunks = []
+    for reason, group in _group_by_reason(user_ids, reason_for).items():
+        if not outcome.bulk:
+            fallback.extend((user_id, reason) for user_id in group)
+            continue
+        chunks.extend((reason, group[start:start + BULK_BAN_LIMIT]) for start in range(0, len(group), BULK_BAN_LIMIT))
+
+    async def bulk_job(job):
+        reason, chunk = job
+        if not outcome.bulk:
+            fallback.extend((user_id, reason) for user_id in chunk)
+            return
+        issued_bans.expect(guild.id, chunk, reason)
+        try:
+            result = await bulk_ban([discord.Object(id=user_id) for user_id in chunk],
+                                    reason=reason, delete_message_seconds=0)
+        except discord.Forbidden:
+            # Bulk ban needs Manage Server on top of Ban Members; the per-user route doesn't
+            if outcome.bulk:
+                logger.warning(f"{log_prefix}: Bulk ban forbidden in {guild.id}; falling back to one request per user.")
+            outcome.bulk = False
+            fallback.extend((user_id, reason) for user_id in chunk)
+            return
+        except discord.HTTPException as e:
+            if backoff_from(e) is not None:
+                raise
+            logger.error(f"{log_prefix}: Bulk ban of {len(chunk)} users failed in {guild.id} - HTTP Error {e.status}: {e.text}. "
+                         f"Retrying them one by one.")
+            fallback.extend((user_id, reason) for user_id in chunk)
+            return
+
+        banned = {user.id for user in result.banned}
+        for user_id in chunk:
+            if user_id in banned:
+                outcome.banned.append(user_id)
+            else:
+                outcome.failed[user_id] = "rejected by bulk ban"
+        logger.info(f"{log_prefix}: Bulk banned {len(banned)}/{len(chunk)} users in {guild.id}. Reason: {reason}")
+        if on_progress is not None:
+            await on_progress(outcome)
+
+    async def single_job(job):
+        user_id, reason = job
+        issued_bans.expect(guild.id, (user_id,), reason)
+        try:
+            await guild.ban(discord.Object(id=user_id), reason=reason, delete_message_seconds=0)
+            outcome.banned.append(user_id)
+            logger.info(f"{log_prefix}: Successfully banned {user_id} in {guild.id}. Reason: {reason}")
+        except discord.NotFound:
+            outcome.failed[user_id] = "user not found"
+            logger.warning(f"{log_prefix}: Failed to ban {user_id} in {guild.id} - User not found.")
+        except discord.Forbidden:
+            outcome.failed[user_id] = "missing permissions"
+            logger.error(f"{log_prefix}: Failed to ban {user_id} in {guild.id} - Bot lacks permissions (likely role hierarchy).")
+        except Exception as e:
+            if backoff_from(e) is not None:
+                raise  # The scheduler backs off and retries
+            outcome.failed[user_id] = f"HTTP {e.status}" if isinstance(e, discord.HTTPException) else type(e).__name__
+            logger.error(f"{log_prefix}: Failed to ban {user_id} in {guild.id}: {e}")
+        if on_progress is not None and outcome.done % 10 == 0:
+            await on_progress(outcome)
+
+    def give_up(job, error):
+        # Rate limited on every retry; record the users instead of dropping them silently
+        users = job[1] if isinstance(job[1], list) else [job[0]]
+        for user_id in users:
+            outcome.failed[user_id] = "rate limited"
+
+    def bulk_error(job, error):
+        # e.g. a timeout: some of the chunk may be banned already, which the per-user route tolerates
+        reason, chunk = job
+        fallback.extend((user_id, reason) for user_id in chunk)
+
+    def single_error(job, error):
+        outcome.failed[job[0]] = type(error).__name__
+
+    if chunks:
+        # A bulk ban's duration scales with the chunk, so it says nothing about the bucket
+        scheduler = AdaptiveScheduler(max_concurrency, slow_after=None)
+        outcome.stats.append(await scheduler.run(chunks, bulk_job, on_give_up=give_up, on_error=bulk_error))
+    if fallback:
+        scheduler = AdaptiveScheduler(max_concurrency)
+        outcome.stats.append(await scheduler.run(fallback, single_job, on_give_up=give_up, on_error=single_error))
+        if on_progress is not None:
+            await on_progress(outcome)
+
+    logger.info(f"{log_prefix} in {guild.id}: {outcome.throughput()}")
+    return outcome
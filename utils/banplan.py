@@ -0,0 +1,131 @@
+import io
+import time
+
+import discord
+
+from utils.banstore import ban_store
+from utils.guildsettings import guild_settings
+
+DEFAULT_REASON = "Reason not specified in global list."
+
+
+def audit_reason(user_id):
+    """The audit log reason for banning a global list entry (Discord caps reasons at 512 characters)"""
+    entry = ban_store.get(user_id)
+    reason = entry.get("reason") if entry is not None else None
+    return f"{reason or DEFAULT_REASON}"[:512]
+
+
+class BanPlan:
+    """
+    What a massban/synclocal would do in one guild: the global list split
+    into users to ban, users already banned there, and users skipped (with
+    why). Built before confirmation and kept in `plan_previews`, so
+    `confirm` executes the plan that was shown.
+    """
+
+    __slots__ = ("guild_id", "total", "to_ban", "already_banned", "skipped", "checked_local", "seconds")
+
+    def __init__(self, guild_id, total, to_ban, already_banned, skipped, checked_local, seconds=0.0):
+        self.guild_id = guild_id
+        self.total = total  # global list entries considered
+        self.to_ban = to_ban  # user IDs
+        self.already_banned = already_banned  # user IDs
+        self.skipped = skipped  # user_id -> why
+        self.checked_local = checked_local  # False if the local bans couldn't be fetched
+        self.seconds = seconds
+
+    def targets(self):
+        """(user_id, audit reason) for every user to ban, as BanJob takes them"""
+        return [(user_id, audit_reason(user_id)) for user_id in self.to_ban]
+
+    def summary(self):
+        lines = [f"Will ban: **{len(self.to_ban)}**",
+                 f"Already banned: **{len(self.already_banned)}**"
+                 + ("" if self.checked_local else " (local bans could not be checked)"),
+                 f"Skipped: **{len(self.skipped)}**"]
+        lines.extend(f"-# Skipping {user_id}: {why}" for user_id, why in list(self.skipped.items())[:5])
+        return "\n".join(lines)
+
+    def to_text(self):
+        """The whole plan, one user per line, for the confirmation attachment"""
+        bans = ban_store.bans()
+        lines = [f"# Ban plan for guild {self.guild_id}: {len(self.to_ban)} to ban, "
+                 f"{len(self.already_banned)} already banned, {len(self.skipped)} skipped "
+                 f"(of {self.total} global entries)"]
+        if not self.checked_local:
+            lines.append("# Local bans could not be fetched; already banned users will be banned again")
+        for user_id in self.to_ban:
+            entry = bans.get(str(user_id))
+            name = (entry.get("name") if entry is not None else None) or "Unknown User"
+            lines.append(f"BAN\t{user_id}\t{name}\t{audit_reason(user_id)}")
+        for user_id, why in self.skipped.items():
+            lines.append(f"SKIP\t{user_id}\t{why}")
+        lines.extend(f"ALREADY\t{user_id}" for user_id in self.already_banned)
+        return "\n".join(lines) + "\n"
+
+    def as_file(self):
+        return discord.File(io.BytesIO(self.to_text().encode()), filename=f"banplan_{self.guild_id}.tsv")
+
+
+def split_ids(global_ids, local_ids, exclusions):
+    """
+    (to_ban, already_banned, skipped) for a set of global IDs: three set
+    operations on ints, nothing checked per user. `local_ids` may be None
+    (unknown); `exclusions` maps user IDs that must not be banned to why.
+    """
+    if local_ids is None:
+        pending, already = set(global_ids), ()
+    else:
+        pending = global_ids.difference(local_ids)
+        already = global_ids.intersection(local_ids)
+    skipped = {user_id: exclusions[user_id] for user_id in pending.intersection(exclusions)}
+    pending.difference_update(skipped)
+    # Left unsorted: sorting 100k IDs costs several times the set operations
+    return list(pending), list(already), skipped
+
+
+def plan_bans(guild, bot_user_id, local_ids=None):
+    """
+    Plan banning the global list in `guild`. `local_ids` are the user IDs
+    already banned there (a snapshot's ids()), or None if unknown.
+    """
+    started = time.perf_counter()
+    global_ids = ban_store.ids()
+    exclusions = {bot_user_id: "this bot", guild.owner_id: "server owner"}
+    for user_id in guild_settings.get_or_default(guild.id).whitelist:
+        exclusions.setdefault(user_id, "whitelisted in this server")
+    to_ban, already, skipped = split_ids(global_ids, local_ids, exclusions)
+    return BanPlan(guild.id, len(global_ids), to_ban, already, skipped,
+                   local_ids is not None, time.perf_counter() - started)
+
+
+class PlanPreviews:
+    """
+    Plans shown for confirmation, per guild and command, so `confirm`
+    executes what the user reviewed instead of re-planning against a list
+    that may have changed. A preview is good for one confirmation within
+    `ttl` seconds. Users taken off the global list or whitelisted since are
+    dropped from it; nobody is ever added.
+    """
+
+    def __init__(self, ttl=600.0):
+        self.ttl = ttl
+        self._plans = {}  # (guild_id, kind) -> (BanPlan, expires_at)
+
+    def store(self, guild_id, kind, plan):
+        self._plans[(int(guild_id), kind)] = (plan, time.monotonic() + self.ttl)
+
+    def take(self, guild_id, kind):
+        """The previewed plan, or None if there's no fresh one"""
+        stored = self._plans.pop((int(guild_id), kind), None)
+        if stored is None or stored[1] < time.monotonic():
+            return None
+        plan = stored[0]
+        whitelist = set(guild_settings.get_or_default(guild_id).whitelist)
+        plan.to_ban = [user_id for user_id in plan.to_ban if user_id in ban_store and user_id not in whitelist]
+        return plan
+
+
+# Filled when massban/synclocal show a plan, taken by their `confirm`
+plan_previews = PlanPreviews()
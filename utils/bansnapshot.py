@@ -0,0 +1,177 @@
+import asyncio
+import json
+import logging
+import time
+from pathlib import Path
+
+import discord
+
+from utils.aio import run_io, submit_io
+from utils.coverage import coverage_index
+from utils.journal import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = Path("data/ban_snapshots")
+
+
+class GuildBanSnapshot:
+    """
+    One guild's ban list as last fetched: {user_id: (name, reason)} plus the
+    pagination checkpoint. Discord pages bans in ascending user ID order, so
+    `checkpoint` (the last ID stored) is exactly the `after=` to resume from.
+    """
+
+    __slots__ = ("guild_id", "bans", "checkpoint", "complete", "fetched_at")
+
+    def __init__(self, guild_id, bans=None, checkpoint=None, complete=False, fetched_at=None):
+        self.guild_id = int(guild_id)
+        self.bans = bans if bans is not None else {}
+        self.checkpoint = checkpoint
+        self.complete = complete
+        self.fetched_at = time.time() if fetched_at is None else fetched_at  # when this fetch started
+
+    @property
+    def age(self):
+        return time.time() - self.fetched_at
+
+    def ids(self):
+        return self.bans.keys()
+
+    def __contains__(self, user_id):
+        return int(user_id) in self.bans
+
+    def __len__(self):
+        return len(self.bans)
+
+    @classmethod
+    def from_dict(cls, data):
+        bans = {int(user_id): tuple(value) for user_id, value in data.get("bans", {}).items()}
+        return cls(data["guild_id"], bans, data.get("checkpoint"), data.get("complete", False), data.get("fetched_at", 0))
+
+    def to_dict(self):
+        return {
+            "guild_id": self.guild_id,
+            "complete": self.complete,
+            "checkpoint": self.checkpoint,
+            "fetched_at": self.fetched_at,
+            "bans": {str(user_id): list(value) for user_id, value in self.bans.items()},
+        }
+
+
+class BanSnapshotCache:
+    """
+    Per-guild ban snapshots shared by massban, synclocal, banlist and the
+    global sync, so each guild's bans are paged through once per freshness
+    window instead of once per command.
+
+    Fetches save a checkpoint every `checkpoint_every` bans; if one fails
+    halfway, the next call picks up from the checkpoint instead of starting
+    over (as long as the partial fetch is younger than `resume_window`).
+    Snapshots are kept in memory and mirrored to `directory` off the loop.
+    """
+
+    def __init__(self, directory=SNAPSHOT_DIR, max_age=600, resume_window=3600, checkpoint_every=5000):
+        self.directory = Path(directory)
+        self.max_age = max_age
+        self.resume_window = resume_window
+        self.checkpoint_every = checkpoint_every
+        self._snapshots = {}
+        self._locks = {}
+
+    def _path(self, guild_id):
+        return self.directory / f"{guild_id}.json"
+
+    def _read(self, guild_id):
+        try:
+            with open(self._path(guild_id), "r") as f:
+                return GuildBanSnapshot.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable ban snapshot for guild {guild_id}: {e}")
+            return None
+
+    def _save(self, snapshot):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # Serialize the layout on the loop (a consistent copy), write it off the loop
+        submit_io(atomic_write_json, self._path(snapshot.guild_id), snapshot.to_dict(), None)
+
+    def cached(self, guild_id):
+        """The in-memory snapshot for a guild (complete or not), without fetching anything"""
+        return self._snapshots.get(int(guild_id))
+
+    async def get(self, guild, max_age=None):
+        """
+        Return a complete snapshot of `guild`'s bans no older than `max_age`
+        seconds, fetching (or resuming) only if needed. Discord errors are
+        raised after the progress so far has been saved.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        lock = self._locks.setdefault(guild.id, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(guild.id)
+            if snapshot is None:
+                snapshot = await run_io(self._read, guild.id)
+                if snapshot is not None:
+                    self._snapshots[guild.id] = snapshot
+
+            if snapshot is not None and snapshot.complete and snapshot.age <= max_age:
+                return snapshot
+
+            if snapshot is None or snapshot.complete or snapshot.age > self.resume_window:
+                snapshot = GuildBanSnapshot(guild.id)
+                self._snapshots[guild.id] = snapshot
+            else:
+                logger.info(f"Resuming ban fetch for {guild.name} ({guild.id}) after {snapshot.checkpoint} "
+                            f"({len(snapshot)} already fetched)")
+
+            await self._fetch(guild, snapshot)
+            return snapshot
+
+    async def _fetch(self, guild, snapshot):
+        started = time.perf_counter()
+        after = discord.Object(id=snapshot.checkpoint) if snapshot.checkpoint else None
+        since_checkpoint = 0
+        try:
+            async for ban_entry in guild.bans(limit=None, after=after):
+                user_id = ban_entry.user.id
+                snapshot.bans[user_id] = (str(ban_entry.user), ban_entry.reason)
+                if snapshot.checkpoint is None or user_id > snapshot.checkpoint:
+                    snapshot.checkpoint = user_id
+                since_checkpoint += 1
+                if since_checkpoint >= self.checkpoint_every:
+                    since_checkpoint = 0
+                    self._save(snapshot)
+        except Exception:
+            self._save(snapshot)
+            logger.warning(f"Ban fetch for {guild.name} ({guild.id}) interrupted at {snapshot.checkpoint} "
+                           f"with {len(snapshot)} bans saved")
+            raise
+        snapshot.complete = True
+        self._save(snapshot)
+        coverage_index.observe(guild.id, snapshot.bans.keys())
+        logger.info(f"Fetched {len(snapshot)} bans for {guild.name} ({guild.id}) "
+                    f"in {time.perf_counter() - started:.2f}s")
+
+    # --- Keeping cached snapshots current between fetches ---
+
+    def note_ban(self, guild_id, user_id, name=None, reason=None):
+        snapshot = self._snapshots.get(int(guild_id))
+        if snapshot is not None:
+            snapshot.bans[int(user_id)] = (name, reason)
+
+    def note_unban(self, guild_id, user_id):
+        snapshot = self._snapshots.get(int(guild_id))
+        if snapshot is not None:
+            snapshot.bans.pop(int(user_id), None)
+
+    def invalidate(self, guild_id):
+        snapshot = self._snapshots.get(int(guild_id))
+        if snapshot is not None:
+            snapshot.fetched_at = 0
+
+
+# Shared by v.py's massban/synclocal/pending/banlist commands, the global sync,
+# ban jobs, auto-enforce and the ban event listeners (cog/banevents.py)
+ban_snapshots = BanSnapshotCache()
@@ -0,0 +1,195 @@
+import logging
+import os
+import threading
+import time
+
+from utils.aio import submit_io
+from utils.generations import generation_log
+from utils.records import BanEntry
+from utils.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Written by the sorted ID index of older versions; nothing reads it any more
+STALE_INDEX_FILE = "data/global_ban_list.ids"
+
+
+def _remove_stale_index():
+    try:
+        os.remove(STALE_INDEX_FILE)
+        logger.info(f"Removed the unused {STALE_INDEX_FILE}")
+    except FileNotFoundError:
+        pass
+
+
+class BanStore:
+    """
+    Process-wide in-memory copy of the global ban list, held as compact
+    BanEntry records (utils/records.py) that still read like the old dicts.
+
+    The list is loaded once from the storage backend and only re-read when the
+    backend reports an outside change (file mtime/size, SQLite data_version).
+    Every mutation bumps `generation`, so consumers that derive data from the
+    list (name patterns, indexes...) know when to rebuild. Mutations swap in a
+    new dict instead of editing in place, so callers iterating over `bans()`
+    across an `await` never see it change under them. Persistence happens on
+    the IO executor; the in-memory copy is authoritative while writes are queued.
+    """
+
+    def __init__(self, check_interval=1.0):
+        self.generation = 0
+        self.check_interval = check_interval
+        self._bans = {}
+        self._ids = set()
+        self._stamp = None
+        self._checked_at = 0.0
+        self._pending_writes = 0
+        self._lock = threading.RLock()
+
+    # --- Loading ---
+
+    def _backend_stamp(self):
+        storage = get_storage()
+        return (id(storage), storage.bans_version())
+
+    def _refresh(self):
+        """Reload from the backend if the data changed since we last read or wrote it"""
+        now = time.monotonic()
+        if self._stamp is not None and (self._pending_writes or now - self._checked_at < self.check_interval):
+            return
+        self._checked_at = now
+        stamp = self._backend_stamp()
+        if stamp[1] is not None and stamp == self._stamp:
+            return
+        with self._lock:
+            stamp = self._backend_stamp()
+            if stamp[1] is not None and stamp == self._stamp:
+                return
+            if self._stamp is None:
+                submit_io(_remove_stale_index)
+            bans = get_storage().load_bans()
+            previous = self._bans
+            self._set(bans)
+            recorded = generation_log.reset(previous, self._bans)
+            if recorded is not None:
+                submit_io(generation_log.write, *recorded)
+            self._stamp = self._backend_stamp()
+            logger.debug(f"Loaded {len(bans)} global bans")
+
+    def _set(self, bans):
+        self._bans = {str(user_id): BanEntry.from_dict(entry) for user_id, entry in bans.items()}
+        self._ids = set()
+        for user_id in self._bans:
+            try:
+                self._ids.add(int(user_id))
+            except ValueError:
+                logger.warning(f"Invalid user ID in global ban list: '{user_id}'")
+        self.generation += 1
+
+    def _write(self, previous, upserts, deletes, source=None):
+        storage = get_storage()
+        # Never mutated in place, so safe to hand to the executor
+        bans = self._bans
+        recorded = generation_log.record(previous, bans, upserts, deletes, source)
+
+        def write():
+            try:
+                storage.save_bans(bans, upserts, deletes)
+                if recorded is not None:
+                    generation_log.write(*recorded)
+            finally:
+                with self._lock:
+                    self._pending_writes -= 1
+                    self._stamp = self._backend_stamp()
+
+        with self._lock:
+            self._pending_writes += 1
+        submit_io(write)
+
+    # --- Reads ---
+
+    def bans(self):
+        """Return the shared {user_id_str: BanEntry} mapping. Treat it as read-only."""
+        self._refresh()
+        return self._bans
+
+    def ids(self):
+        """Return the set of banned user IDs as ints"""
+        self._refresh()
+        return self._ids
+
+    def get(self, user_id, default=None):
+        self._refresh()
+        return self._bans.get(str(user_id), default)
+
+    def __contains__(self, user_id):
+        self._refresh()
+        if isinstance(user_id, int):
+            return user_id in self._ids
+        return str(user_id) in self._bans
+
+    def __len__(self):
+        self._refresh()
+        return len(self._bans)
+
+    # --- Writes ---
+
+    def replace(self, bans, source=None):
+        """
+        Swap in a whole new ban list and persist it. `source` labels the
+        resulting generation (see utils/generations.py), e.g. "sync".
+        """
+        if not isinstance(bans, dict):
+            logger.error("Attempted to save non-dictionary data to global ban list. Aborting save.")
+            return
+        self._refresh()
+        with self._lock:
+            old = self._bans
+            self._set(bans)
+            upserts = [u for u, entry in self._bans.items() if old.get(u) != entry]
+            deletes = [u for u in old if u not in self._bans]
+            self._write(old, upserts, deletes, source)
+
+    def set(self, user_id, entry, source=None):
+        """Add or overwrite a single entry and persist"""
+        self.update({user_id: entry}, source=source)
+
+    def update(self, entries, source=None):
+        """
+        Add or overwrite several entries as one change (one write, one
+        generation). Only the given keys are converted, diffed and persisted;
+        the dict itself is still copied so readers never see it change.
+        """
+        if not entries:
+            return
+        self._refresh()
+        with self._lock:
+            changed = {str(user_id): BanEntry.from_dict(entry) for user_id, entry in entries.items()}
+            old = self._bans
+            bans = dict(old)
+            bans.update(changed)
+            self._bans = bans
+            self._ids = self._ids | {int(user_id) for user_id in changed}
+            self.generation += 1
+            self._write(old, list(changed), [], source)
+
+    def remove(self, user_id, source=None):
+        """Remove a single entry. Returns False if it wasn't on the list."""
+        self._refresh()
+        with self._lock:
+            user_id = str(user_id)
+            if user_id not in self._bans:
+                return False
+            old = self._bans
+            bans = dict(old)
+            del bans[user_id]
+            self._bans = bans
+            self._ids = self._ids - {int(user_id)}
+            self.generation += 1
+            self._write(old, [], [user_id], source)
+            return True
+
+
+# Shared by v.py, the autoscreener, ban management and ban event cogs, and the
+# sync, job, propagation, coverage and ban plan helpers
+ban_store = BanStore()
@@ -0,0 +1,57 @@
+import logging
+
+from utils.journal import JournaledFile
+
+logger = logging.getLogger(__name__)
+
+
+class BlockList:
+    """
+    Users blocked from making verification requests.
+
+    Membership is a hash lookup on memory loaded once at startup; changes are
+    journaled one record at a time (see utils/journal.py), so blocking a user
+    never rewrites the whole file. The on-disk layout is still a plain JSON
+    list of IDs.
+    """
+
+    def __init__(self, path):
+        self.file = JournaledFile(path, default=list)
+        self.reload()
+
+    def reload(self):
+        # A dict rather than a set so listing keeps the on-disk order
+        self._ids = {}
+        for user_id in self.file.data:
+            try:
+                self._ids[int(user_id)] = None
+            except (TypeError, ValueError):
+                logger.warning(f"Ignoring malformed blocked user ID {user_id!r} in {self.file.path}")
+        return len(self._ids)
+
+    def __contains__(self, user_id):
+        return user_id in self._ids
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, user_id):
+        """Returns False if the user was already blocked"""
+        user_id = int(user_id)
+        if user_id in self._ids:
+            return False
+        self._ids[user_id] = None
+        self.file.add(user_id)
+        return True
+
+    def discard(self, user_id):
+        """Returns False if the user wasn't blocked"""
+        user_id = int(user_id)
+        if user_id not in self._ids:
+            return False
+        del self._ids[user_id]
+        self.file.discard(user_id)
+        return True
@@ -0,0 +1,113 @@
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = Path("data/config.json")
+DEFAULT_TAGS = ("vorth", "racc")
+
+
+class ReasonClassifier:
+    """
+    Classifies ban reasons by the tags they mention ("vorth", "racc", ...).
+
+    All tags are compiled once into a single alternation with one named group
+    per tag, so a reason is scanned once no matter how many tags there are.
+    The result is a bitmask (bit i = tags[i]) and is memoized per reason:
+    synced bans repeat the same handful of reasons thousands of times.
+    """
+
+    def __init__(self, tags=DEFAULT_TAGS, cache_size=65536):
+        self.tags = tuple(tag.lower() for tag in tags)
+        self.cache_size = cache_size
+        self._cache = {}
+        if self.tags:
+            alternation = "|".join(f"(?P<t{i}>{re.escape(tag)})" for i, tag in enumerate(self.tags))
+            self._pattern = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+        else:
+            self._pattern = None
+
+    def classify(self, reason):
+        """Bitmask of the tags found in `reason` (0 for none or no reason)"""
+        if not reason:
+            return 0
+        mask = self._cache.get(reason)
+        if mask is not None:
+            return mask
+        mask = 0
+        if self._pattern is not None:
+            for match in self._pattern.finditer(reason):
+                mask |= 1 << (match.lastindex - 1)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[sys.intern(reason)] = mask
+        return mask
+
+    def matches(self, reason):
+        return self.classify(reason) != 0
+
+    def names(self, mask):
+        return [tag for i, tag in enumerate(self.tags) if mask >> i & 1]
+
+
+class ConfiguredClassifier:
+    """
+    The classifier for the tags in config.json ("reason_tags"), rebuilt when
+    the file changes. The file is stat'ed at most every `check_interval`
+    seconds, so hot reload costs nothing on the classify path.
+    """
+
+    def __init__(self, path=CONFIG_FILE, check_interval=5.0):
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._classifier = ReasonClassifier()
+        self._stamp = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load_tags(self):
+        try:
+            with open(self.path, "r") as f:
+                tags = json.load(f).get("reason_tags", DEFAULT_TAGS)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.debug(f"Using default reason tags: {e}")
+            return DEFAULT_TAGS
+        if not isinstance(tags, list) or not all(isinstance(tag, str) and tag for tag in tags):
+            logger.error(f"Invalid reason_tags in {self.path}; keeping the current tags")
+            return None
+        return tags
+
+    def get(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self._classifier
+        with self._lock:
+            self._checked_at = now
+            try:
+                st = os.stat(self.path)
+                stamp = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                stamp = None
+            if stamp != self._stamp:
+                self._stamp = stamp
+                tags = self._load_tags()
+                if tags is not None and tuple(tag.lower() for tag in tags) != self._classifier.tags:
+                    self._classifier = ReasonClassifier(tags)
+                    logger.info(f"Reason tags now: {', '.join(self._classifier.tags)}")
+        return self._classifier
+
+    def classify(self, reason):
+        return self.get().classify(reason)
+
+    def matches(self, reason):
+        return self.get().matches(reason)
+
+
+# Shared by the global sync, ban events and the ban list display
+reason_classifier = ConfiguredClassifier()
@@ -0,0 +1,101 @@
+import logging
+import time
+
+from utils.banstore import ban_store
+
+logger = logging.getLogger(__name__)
+
+
+class CoverageIndex:
+    """
+    Which users each guild has banned, and which global list entries that
+    covers, kept current from complete ban fetches and ban/unban events so
+    "what's still pending here" never needs the Discord API.
+
+    A guild becomes known once its bans have been fetched in full (every
+    complete ban snapshot fetch reports here, including the global sync's).
+    From then on gateway events keep it exact. Events missed while the bot was
+    disconnected can't be replayed, so everything is forgotten on reconnect
+    (`reset()` from on_ready) and relearned on the next fetch.
+
+    The covered set (local bans that are on the global list) is computed with
+    one set intersection and cached until the global list changes generation;
+    events adjust the cached set in place.
+    """
+
+    def __init__(self):
+        self._banned = {}  # guild_id -> set of banned user IDs
+        self._observed_at = {}  # guild_id -> when the full list was last fetched
+        self._covered = {}  # guild_id -> (ban_store generation, set of covered global IDs)
+
+    def reset(self):
+        self._banned.clear()
+        self._observed_at.clear()
+        self._covered.clear()
+
+    def observe(self, guild_id, banned_ids):
+        """Record a guild's complete ban list (a finished ban fetch)"""
+        guild_id = int(guild_id)
+        self._banned[guild_id] = set(banned_ids)
+        self._observed_at[guild_id] = time.time()
+        self._covered.pop(guild_id, None)
+
+    def forget(self, guild_id):
+        guild_id = int(guild_id)
+        self._banned.pop(guild_id, None)
+        self._observed_at.pop(guild_id, None)
+        self._covered.pop(guild_id, None)
+
+    def note_ban(self, guild_id, user_id):
+        banned = self._banned.get(int(guild_id))
+        if banned is None:
+            return
+        user_id = int(user_id)
+        banned.add(user_id)
+        cached = self._covered.get(int(guild_id))
+        if cached is not None and user_id in ban_store:
+            cached[1].add(user_id)
+
+    def note_unban(self, guild_id, user_id):
+        banned = self._banned.get(int(guild_id))
+        if banned is None:
+            return
+        banned.discard(int(user_id))
+        cached = self._covered.get(int(guild_id))
+        if cached is not None:
+            cached[1].discard(int(user_id))
+
+    # --- Queries (None means "not known; fetch the bans") ---
+
+    def known(self, guild_id):
+        return int(guild_id) in self._banned
+
+    def local_ids(self, guild_id):
+        """Every user banned in the guild. Treat as read-only."""
+        return self._banned.get(int(guild_id))
+
+    def covered(self, guild_id):
+        """Global list entries (int IDs) already banned in the guild. Treat as read-only."""
+        guild_id = int(guild_id)
+        banned = self._banned.get(guild_id)
+        if banned is None:
+            return None
+        global_ids = ban_store.ids()  # Refreshes the store first, so the generation below is current
+        generation = ban_store.generation
+        cached = self._covered.get(guild_id)
+        if cached is None or cached[0] != generation:
+            cached = self._covered[guild_id] = (generation, global_ids.intersection(banned))
+        return cached[1]
+
+    def pending_count(self, guild_id):
+        """How many global list entries aren't banned in the guild yet"""
+        covered = self.covered(guild_id)
+        return None if covered is None else len(ban_store) - len(covered)
+
+    def age(self, guild_id):
+        observed_at = self._observed_at.get(int(guild_id))
+        return None if observed_at is None else time.time() - observed_at
+
+
+# Fed by ban snapshot fetches and ban events; read by massban/synclocal and the ban lists
+coverage_index = CoverageIndex()
@@ -0,0 +1,143 @@
+from collections import Counter
+from difflib import SequenceMatcher
+
+DEFAULT_CUTOFF = 0.7
+
+
+def _tokens(name):
+    """
+    A name as a set of (char, occurrence) tokens, so the overlap of two token
+    sets is the number of characters they share, counting repeats.
+    """
+    seen = Counter()
+    tokens = []
+    for char in name:
+        seen[char] += 1
+        tokens.append((char, seen[char]))
+    return tokens
+
+
+def _add(slices, bits):
+    """Add one to the bit-sliced counters of every name set in `bits`"""
+    for i, counter in enumerate(slices):
+        slices[i] = counter ^ bits
+        bits &= counter
+        if not bits:
+            return
+    slices.append(bits)
+
+
+def _at_least(slices, k, everyone):
+    """Names whose bit-sliced counter is >= k"""
+    if k <= 0:
+        return everyone
+    if k >= 1 << len(slices):
+        return 0
+    greater, equal = 0, everyone
+    for i in range(len(slices) - 1, -1, -1):
+        if k >> i & 1:
+            equal &= slices[i]
+        else:
+            greater |= equal & slices[i]
+            equal &= ~slices[i]
+    return greater | equal
+
+
+def _bits(mask):
+    """Positions of the set bits in `mask`"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class FuzzyNameIndex:
+    """
+    Answers "is any indexed name similar to this one", with similar meaning
+    SequenceMatcher(None, name, indexed).ratio() > cutoff as before, without
+    running SequenceMatcher against every name.
+
+    ratio() is 2*M/T where M counts matched characters, so M can't exceed
+    the characters two names share (counting repeats). That overlap is
+    counted for every indexed name at once: each (char, occurrence) token
+    keeps a bitset (a Python int) of the names containing it, and adding the
+    query's token bitsets into bit-sliced counters gives every name's overlap
+    in a few dozen big-int operations. Only names whose overlap and length
+    could still beat the cutoff are compared with SequenceMatcher, so the
+    answers are the same as the full scan.
+    """
+
+    def __init__(self, names=(), cutoff=DEFAULT_CUTOFF):
+        self.cutoff = cutoff
+        # Sorted by length so each length is one contiguous run of bits
+        self.names = sorted(dict.fromkeys(name for name in names if name), key=len)
+        self._everyone = (1 << len(self.names)) - 1
+
+        positions = {}
+        self._length_masks = {}
+        start = 0
+        for index, name in enumerate(self.names):
+            for token in _tokens(name):
+                positions.setdefault(token, []).append(index)
+            if index + 1 == len(self.names) or len(self.names[index + 1]) != len(name):
+                self._length_masks[len(name)] = ((1 << (index + 1)) - 1) ^ ((1 << start) - 1)
+                start = index + 1
+
+        # Build each bitset once from a byte buffer instead of OR-ing bits into a growing int
+        size = (len(self.names) + 7) // 8
+        self._bitsets = {}
+        for token, indexes in positions.items():
+            buffer = bytearray(size)
+            for index in indexes:
+                buffer[index >> 3] |= 1 << (index & 7)
+            self._bitsets[token] = int.from_bytes(buffer, "little")
+        self._needed = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def _overlap_needed(self, length, other_length):
+        """Fewest shared characters for which 2*M/T could exceed the cutoff, or None if none can"""
+        key = (length, other_length)
+        needed = self._needed.get(key)
+        if needed is None:
+            total = length + other_length
+            needed = next((shared for shared in range(min(length, other_length) + 1)
+                           if 2.0 * shared / total > self.cutoff), -1)
+            self._needed[key] = needed
+        return None if needed < 0 else needed
+
+    def candidates(self, name):
+        """Indexed names that could be similar to `name` (a superset of the real matches)"""
+        if not name or not self.names:
+            return
+        slices = []
+        for token in _tokens(name):
+            bits = self._bitsets.get(token)
+            if bits:
+                _add(slices, bits)
+
+        mask = 0
+        for other_length, length_mask in self._length_masks.items():
+            needed = self._overlap_needed(len(name), other_length)
+            if needed is not None:
+                mask |= _at_least(slices, needed, self._everyone) & length_mask
+        for index in _bits(mask):
+            yield self.names[index]
+
+    def _similar(self, name, other):
+        matcher = SequenceMatcher(None, name, other)
+        # Cheap upper bounds first, as difflib.get_close_matches does
+        return (matcher.real_quick_ratio() > self.cutoff and matcher.quick_ratio() > self.cutoff
+                and matcher.ratio() > self.cutoff)
+
+    def matches(self, name):
+        """Every indexed name similar to `name`"""
+        return [other for other in self.candidates(name) if self._similar(name, other)]
+
+    def first_match(self, name):
+        """Some indexed name similar to `name`, or None"""
+        for other in self.candidates(name):
+            if self._similar(name, other):
+                return other
+        return None
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+from utils.journal import atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+GENERATIONS_DIR = Path("data/ban_generations")
+_HASH_MOD = 1 << 256
+
+
+def entry_hash(user_id, entry):
+    """Hash of one entry in its on-disk layout; the list hash is the sum of these"""
+    canonical = json.dumps(entry.to_dict() if hasattr(entry, "to_dict") else dict(entry),
+                           sort_keys=True, separators=(",", ":"))
+    return int.from_bytes(hashlib.sha256(f"{user_id}\0{canonical}".encode()).digest(), "big")
+
+
+def list_hash(bans):
+    return sum(entry_hash(user_id, entry) for user_id, entry in bans.items()) % _HASH_MOD
+
+
+def _dump(entry):
+    return entry.to_dict() if hasattr(entry, "to_dict") else dict(entry)
+
+
+class GenerationLog:
+    """
+    Numbered generations of the global ban list. Every change to the list
+    becomes one generation file holding only the delta against the previous
+    one (added entries, [old, new] for updated ones, old values of removed
+    ones) plus a content hash of the resulting list.
+
+    The hash is order independent (a sum of per-entry SHA-256s), so it's
+    updated from the delta alone instead of rehashing the whole list.
+
+    Generations are pruned by age, not count, since one can be a single
+    ban event: anything younger than `max_age` seconds is kept, never fewer
+    than the newest `keep`, and never more than `max_keep`.
+    """
+
+    def __init__(self, directory=GENERATIONS_DIR, keep=100, max_age=7 * 86400, max_keep=10000):
+        self.directory = Path(directory)
+        self.keep = keep
+        self.max_age = max_age
+        self.max_keep = max_keep
+        self.number = None
+        self._hash = None
+
+    def _numbers(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name.endswith(".json") and name[:-5].isdigit())
+
+    def _path(self, number):
+        return self.directory / f"{number:08d}.json"
+
+    def _ensure_loaded(self, bans):
+        if self.number is None:
+            numbers = self._numbers()
+            self.number = numbers[-1] if numbers else 0
+        if self._hash is None:
+            self._hash = list_hash(bans)
+
+    def reset(self, previous, bans):
+        """
+        Account for the list being (re)loaded from the backend. The first load
+        just hashes it; after that, a change made outside this process (another
+        process or a manual edit) becomes a "reload" generation so the hash
+        chain stays unbroken. Returns (number, payload) for `write()`, or None.
+        """
+        if self._hash is None:
+            self._ensure_loaded(bans)
+            return None
+        upserts = [user_id for user_id, entry in bans.items() if previous.get(user_id) != entry]
+        deletes = [user_id for user_id in previous if user_id not in bans]
+        return self.record(previous, bans, upserts, deletes, source="reload")
+
+    @property
+    def current_hash(self):
+        return None if self._hash is None else f"{self._hash:064x}"
+
+    def record(self, previous, current, upserts, deletes, source=None):
+        """
+        Build the delta between two versions of the list (only looking at the
+        touched IDs) and return (number, payload) to be written with `write()`,
+        or None if nothing actually changed.
+        """
+        self._ensure_loaded(previous)
+        added, updated, removed = {}, {}, {}
+        new_hash = self._hash
+        for user_id in upserts:
+            old, new = previous.get(user_id), current[user_id]
+            if old is None:
+                added[user_id] = _dump(new)
+            elif old != new:
+                updated[user_id] = [_dump(old), _dump(new)]
+                new_hash -= entry_hash(user_id, old)
+            else:
+                continue
+            new_hash += entry_hash(user_id, new)
+        for user_id in deletes:
+            old = previous.get(user_id)
+            if old is not None:
+                removed[user_id] = _dump(old)
+                new_hash -= entry_hash(user_id, old)
+        if not (added or updated or removed):
+            return None
+
+        new_hash %= _HASH_MOD
+        self.number += 1
+        payload = {
+            "generation": self.number,
+            "timestamp": time.time(),
+            "source": source,
+            "count": len(current),
+            "parent_hash": f"{self._hash:064x}",
+            "hash": f"{new_hash:064x}",
+            "added": added,
+            "updated": updated,
+            "removed": removed,
+        }
+        self._hash = new_hash
+        return self.number, payload
+
+    def write(self, number, payload):
+        """Write one generation and prune old ones (run on the IO executor)"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        atomic_write_json(self._path(number), payload, indent=None)
+        numbers = self._numbers()
+        if len(numbers) <= self.keep:
+            return
+        cutoff = time.time() - self.max_age
+        excess = len(numbers) - self.max_keep
+        for index, old in enumerate(numbers[:-self.keep]):
+            path = self._path(old)
+            try:
+                if index >= excess and os.path.getmtime(path) >= cutoff:
+                    break  # Oldest first, so everything after this is younger
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # --- Reading history ---
+
+    def load(self, number):
+        with open(self._path(number), "r") as f:
+            return json.load(f)
+
+    def available(self):
+        """Generation numbers still on disk, oldest first"""
+        return self._numbers()
+
+    def diff(self, start, end):
+        """
+        Net change from generation `start` to generation `end` (either order)
+        as (added, changed, removed): {id: entry}, {id: [old, new]}, {id: entry}.
+        Raises FileNotFoundError if a generation in between has been pruned.
+        """
+        if start > end:
+            added, changed, removed = self.diff(end, start)
+            return removed, {user_id: [new, old] for user_id, (old, new) in changed.items()}, added
+
+        state = {}  # user_id -> [value before `start`, value at `end`]
+        for number in range(start + 1, end + 1):
+            generation = self.load(number)
+            for user_id, new in generation["added"].items():
+                state.setdefault(user_id, [None, None])[1] = new
+            for user_id, (old, new) in generation["updated"].items():
+                state.setdefault(user_id, [old, None])[1] = new
+            for user_id, old in generation["removed"].items():
+                state.setdefault(user_id, [old, None])[1] = None
+
+        added, changed, removed = {}, {}, {}
+        for user_id, (before, after) in state.items():
+            if before == after:
+                continue
+            if before is None:
+                added[user_id] = after
+            elif after is None:
+                removed[user_id] = before
+            else:
+                changed[user_id] = [before, after]
+        return added, changed, removed
+
+
+# Shared by the ban store and the v!globaldiff command
+generation_log = GenerationLog()
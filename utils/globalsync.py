@@ -0,0 +1,413 @@
+import asyncio
+import logging
+import random
+import time
+
+import discord
+
+from utils.banstore import ban_store
+from utils.bansnapshot import ban_snapshots
+from utils.classifier import reason_classifier
+from utils.progress import DEFAULT_INTERVAL, ProgressReporter
+from utils.propagation import ban_propagator
+from utils.records import BanEntry
+from utils.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Each guild's ban list is its own rate limit bucket (the route is keyed on the
+# guild ID), so fetching a few at once only competes for the global limit.
+DEFAULT_CONCURRENCY = 4
+
+# Held by a full rebuild and by every incremental update, so a ban event that
+# arrives mid-rebuild is applied after the rebuilt list is swapped in
+sync_lock = asyncio.Lock()
+
+
+def is_global_ban_reason(reason):
+    """Bans whose reason carries one of the configured tags are shared through the global list"""
+    return reason_classifier.matches(reason)
+
+
+class GuildFetch:
+    """Outcome of fetching one verified server's bans"""
+
+    __slots__ = ("server_id", "name", "scanned", "bans", "seconds", "error")
+
+    def __init__(self, server_id, name=None):
+        self.server_id = server_id
+        self.name = name
+        self.scanned = 0
+        self.bans = []  # (user_id, name, reason) for bans with a global ban tag
+        self.seconds = 0.0
+        self.error = None
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def describe(self):
+        label = f"{self.name} ({self.server_id})" if self.name else self.server_id
+        if self.error:
+            return f"{label}: {self.error} after {self.seconds:.2f}s"
+        return f"{label}: {len(self.bans)}/{self.scanned} bans in {self.seconds:.2f}s"
+
+
+async def fetch_guild_bans(bot, server_id_str):
+    """One server's bans that belong on the global list"""
+    result = GuildFetch(server_id_str)
+    started = time.perf_counter()
+    try:
+        guild = bot.get_guild(int(server_id_str))
+        if guild is None:
+            result.error = "guild not found"
+            logger.warning(f"Could not find guild with ID: {server_id_str}. Skipping.")
+            return result
+        result.name = guild.name
+        # Shared snapshot: reused if fresh, resumed from its checkpoint if a previous fetch failed
+        snapshot = await ban_snapshots.get(guild)
+        result.scanned = len(snapshot)
+        for user_id, (name, reason) in snapshot.bans.items():
+            if is_global_ban_reason(reason):
+                result.bans.append((str(user_id), name, reason))
+    except discord.Forbidden:
+        result.error = "missing permissions"
+        logger.error(f"Bot lacks permissions (View Audit Log or Ban Members) in server {server_id_str}. Skipping.")
+    except discord.HTTPException as e:
+        result.error = f"HTTP {e.status}"
+        logger.error(f"HTTP error fetching bans for server {server_id_str}: {e}. Skipping.")
+    except ValueError:
+        result.error = "invalid server ID"
+        logger.error(f"Invalid server ID format in verified list: '{server_id_str}'. Skipping.")
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+        logger.error(f"Unexpected error processing bans for server {server_id_str}: {e}")
+    finally:
+        result.seconds = time.perf_counter() - started
+    return result
+
+
+async def fetch_verified_bans(bot, server_ids, concurrency=DEFAULT_CONCURRENCY, on_result=None):
+    """
+    Fetch several servers' bans at once, at most `concurrency` in flight.
+    Results keep `server_ids` order; `on_result(result)` is called as each finishes.
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def bounded(server_id_str):
+        async with semaphore:
+            result = await fetch_guild_bans(bot, server_id_str)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    return await asyncio.gather(*(bounded(server_id_str) for server_id_str in server_ids))
+
+
+def merge_bans(results):
+    """
+    Combine per-server results into the global list layout. Servers are merged
+    in order, so a later server's name/reason wins, as in the sequential sync.
+    """
+    merged = {}
+    for result in results:
+        for user_id, name, reason in result.bans:
+            entry = merged.get(user_id)
+            if entry is None:
+                merged[user_id] = {"name": name, "reason": reason, "servers": [result.server_id]}
+            elif result.server_id not in entry["servers"]:
+                entry["servers"].append(result.server_id)
+                entry["name"] = name
+                entry["reason"] = reason
+    return merged
+
+
+class SyncReport:
+    """What a full rebuild changed"""
+
+    __slots__ = ("bans", "results", "added", "removed", "seconds")
+
+    def __init__(self, bans, results, added, removed, seconds):
+        self.bans = bans
+        self.results = results
+        self.added = added  # user IDs (str) now on the list that weren't before
+        self.removed = removed  # user IDs (str) that dropped off, with their old entries
+        self.seconds = seconds
+
+    @property
+    def changed(self):
+        return bool(self.added or self.removed)
+
+    def slowest(self, count=3):
+        return sorted(self.results, key=lambda r: r.seconds, reverse=True)[:count]
+
+
+async def rebuild_global_ban_list(bot, concurrency=DEFAULT_CONCURRENCY, on_result=None):
+    """
+    Rebuild the global list from every verified server's current bans and
+    swap it in. `on_result(result, total)` is called after each server.
+    """
+    started = time.perf_counter()
+    async with sync_lock:
+        old = ban_store.bans()
+        verified_servers = get_storage().load_verified_servers()
+        if not verified_servers:
+            logger.warning("No verified servers found. Global ban list will be empty.")
+            results = []
+        else:
+            def report(result):
+                if on_result is not None:
+                    on_result(result, len(verified_servers))
+
+            results = await fetch_verified_bans(bot, verified_servers, concurrency, report)
+
+        for result in results:
+            if not result.ok:
+                # Don't let one failed fetch drop that server's entries; keep what we had
+                result.bans = [(user_id, entry.name, entry.reason)
+                               for user_id, entry in old.items() if entry.in_server(result.server_id)]
+        new_global_ban_list = merge_bans(results)
+        # Entries added by hand with v!banadd have no server, so no fetch returns them; keep them
+        for user_id, entry in old.items():
+            if not entry.servers_mask and user_id not in new_global_ban_list:
+                new_global_ban_list[user_id] = entry
+
+        for result in sorted(results, key=lambda r: r.seconds, reverse=True):
+            logger.info(f"Sync timing: {result.describe()}")
+        processed_servers = sum(1 for result in results if result.ok)
+        logger.info(f"Global ban list update complete. Processed {processed_servers}/{len(verified_servers)} verified servers.")
+        logger.info(f"Final global ban list contains {len(new_global_ban_list)} entries.")
+        ban_store.replace(new_global_ban_list, source="sync")
+
+    added = [user_id for user_id in new_global_ban_list if user_id not in old]
+    removed = {user_id: entry for user_id, entry in old.items() if user_id not in new_global_ban_list}
+    return SyncReport(new_global_ban_list, results, added, removed, time.perf_counter() - started)
+
+
+class SyncScheduler:
+    """
+    Runs the full rebuild in the background every `interval` seconds, give or
+    take `jitter` (a fraction of the interval), and whenever a run is
+    requested. Requests that arrive while a run is queued or in flight fold
+    into it, so at most one rebuild is ever running. Added/removed entries are
+    announced in the audit channel; runs that change nothing stay quiet.
+
+    Ban events keep the list current between runs, so a timed run is skipped
+    (no fetches at all) when it couldn't find anything new: the last rebuild
+    fetched every server, and since then the verified servers and reason
+    tags are unchanged and the gateway hasn't started a new session (which
+    would mean missed events). At most `max_skipped` timed runs in a row are
+    skipped. Requested runs always rebuild.
+    """
+
+    def __init__(self, interval=6 * 3600, jitter=0.1, progress_interval=DEFAULT_INTERVAL, max_skipped=3):
+        self.interval = interval
+        self.max_skipped = max_skipped
+        self.jitter = jitter
+        self.progress_interval = progress_interval
+        self.bot = None
+        self.concurrency = DEFAULT_CONCURRENCY
+        self.audit_channel_id = None
+        self.last_report = None
+        self.running = False
+        self._requested = asyncio.Event()
+        self._reply_channels = []  # Waiting for the next run
+        self._active_channels = []  # Waiting for the run in progress
+        self._task = None
+        self._last_state = None  # (verified servers, reason tags) after the last complete rebuild
+        self._missed_events = True
+        self._skipped = 0
+
+    def start(self, bot, concurrency=DEFAULT_CONCURRENCY, audit_channel_id=None, interval=None, jitter=None,
+              progress_interval=None):
+        self.bot = bot
+        if progress_interval is not None:
+            self.progress_interval = progress_interval
+        self.concurrency = concurrency
+        self.audit_channel_id = audit_channel_id
+        if interval is not None:
+            self.interval = interval
+        if jitter is not None:
+            self.jitter = jitter
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def request(self, reply_channel=None):
+        """Queue a run. Returns False if one was already queued or running (the request joins it)."""
+        if self.running:
+            # Joins the run in progress; its result is posted here too
+            if reply_channel is not None and reply_channel not in self._active_channels:
+                self._active_channels.append(reply_channel)
+            return False
+        if reply_channel is not None and reply_channel not in self._reply_channels:
+            self._reply_channels.append(reply_channel)
+        if self._requested.is_set():
+            return False
+        self._requested.set()
+        return True
+
+    def note_new_session(self):
+        """The gateway started a new session (on_ready): ban events may have been missed"""
+        self._missed_events = True
+
+    def _state(self):
+        return frozenset(get_storage().load_verified_servers()), reason_classifier.get().tags
+
+    def _can_skip(self):
+        return (not self._missed_events and self._skipped < self.max_skipped
+                and self._last_state is not None and self._last_state == self._state())
+
+    def _next_delay(self):
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._requested.wait(), timeout=self._next_delay())
+            except asyncio.TimeoutError:
+                if self._can_skip():
+                    self._skipped += 1
+                    logger.info("Global sync skipped: nothing can have changed since the last run")
+                    continue
+            self._requested.clear()
+            self._skipped = 0
+            # Events missed from here on belong to the next run
+            self._missed_events = False
+            state = self._state()
+            reply_channels, self._reply_channels = self._reply_channels, []
+            self._active_channels = reply_channels
+            self.running = True
+            reporters = await self._progress_reporters(reply_channels)
+
+            def on_result(result, total):
+                for reporter in reporters:
+                    reporter.total = total
+                    reporter.update(reporter.done + 1, failed=reporter.counters["failed"] + (not result.ok))
+
+            try:
+                report = await rebuild_global_ban_list(self.bot, self.concurrency, on_result)
+            except Exception as e:
+                logger.exception(f"Global sync failed: {e}")
+                self._last_state = None
+                await self._send(reply_channels, f"❌ An error occurred during the global sync: `{e}`. Please check the bot logs.")
+                continue
+            finally:
+                self.running = False
+                for reporter in reporters:
+                    await reporter.close()
+            self.last_report = report
+            # Only a rebuild that saw every server lets later timed runs be skipped
+            self._last_state = state if all(result.ok for result in report.results) else None
+            # Auto-enforce guilds get the new entries right away
+            ban_propagator.enqueue(report.added)
+            await self._publish(report, reply_channels)
+
+    async def _progress_reporters(self, channels):
+        """One throttled progress message per channel that asked for this run"""
+        total = len(get_storage().load_verified_servers())
+        reporters = []
+        for channel in channels:
+            try:
+                message = await channel.send(f"Fetching bans: 0/{total} verified servers")
+            except discord.HTTPException as e:
+                logger.warning(f"Could not send global sync progress to {getattr(channel, 'id', channel)}: {e}")
+                continue
+            reporter = ProgressReporter(message, total, label="Fetching bans", interval=self.progress_interval)
+            reporter.counters["failed"] = 0
+            reporters.append(reporter)
+        return reporters
+
+    async def _send(self, channels, content):
+        for channel in channels:
+            try:
+                await channel.send(content)
+            except discord.HTTPException as e:
+                logger.warning(f"Could not send global sync result to {getattr(channel, 'id', channel)}: {e}")
+
+    async def _publish(self, report, reply_channels):
+        timings = "\n".join(f"-# {result.describe()}" for result in report.slowest())
+        summary = (f"✅ Global ban list updated successfully! It now contains **{len(report.bans)}** entries "
+                   f"(**+{len(report.added)}** / **-{len(report.removed)}**).\n"
+                   f"*Sync took {report.seconds:.2f} seconds.*\n{timings}")
+        await self._send(reply_channels, summary)
+
+        if not report.changed:
+            logger.info("Global sync finished with no changes")
+            return
+        channel = self.bot.get_channel(self.audit_channel_id) if self.audit_channel_id else None
+        if channel is None:
+            logger.warning(f"Audit channel {self.audit_channel_id} not found; not announcing global sync changes")
+            return
+        lines = [f"🔄 **Global ban list sync**: +{len(report.added)} / -{len(report.removed)}"]
+        for user_id in report.added[:15]:
+            entry = report.bans[user_id]
+            lines.append(f"➕ {entry.get('name') or 'Unknown User'} (`{user_id}`) - {entry.get('reason')}")
+        if len(report.added) > 15:
+            lines.append(f"…and {len(report.added) - 15} more added")
+        for user_id, entry in list(report.removed.items())[:15]:
+            lines.append(f"➖ {entry.get('name') or 'Unknown User'} (`{user_id}`)")
+        if len(report.removed) > 15:
+            lines.append(f"…and {len(report.removed) - 15} more removed")
+        await self._send([channel], "\n".join(lines)[:2000])
+
+
+async def apply_ban(server_id_str, user, reason):
+    """Record one matching ban in a verified server. Returns the updated entry, or None if the reason doesn't match."""
+    if not is_global_ban_reason(reason):
+        return None
+    async with sync_lock:
+        user_id = str(user.id)
+        entry = ban_store.get(user_id)
+        if entry is None:
+            entry = BanEntry(str(user), reason).replace(add_server=server_id_str)
+        else:
+            entry = entry.replace(name=str(user), reason=reason, add_server=server_id_str)
+        ban_store.update({user_id: entry}, source=f"ban in {server_id_str}")
+        return entry
+
+
+async def record_own_bans(server_id_str, reasons):
+    """
+    Add a verified server to the entries of users the bot itself banned there
+    (massban, synclocal, auto-enforce), in one write and one generation.
+    `reasons` maps user IDs to the reason banned with. Entries that left the
+    list meanwhile aren't re-added. Returns the user IDs recorded.
+    """
+    async with sync_lock:
+        updated = {}
+        for user_id, reason in reasons.items():
+            user_id = str(user_id)
+            entry = ban_store.get(user_id)
+            if entry is None or entry.in_server(server_id_str) or not is_global_ban_reason(reason):
+                continue
+            updated[user_id] = entry.replace(add_server=server_id_str)
+        ban_store.update(updated, source=f"{len(updated)} own bans in {server_id_str}")
+        return list(updated)
+
+
+async def apply_unban(server_id_str, user):
+    """
+    Drop a server from a user's entry after an unban there. The entry goes
+    away once no verified server bans them any more; entries that never had a
+    server (added by hand with v!banadd) are left alone. Returns True if the
+    list changed.
+    """
+    async with sync_lock:
+        user_id = str(user.id)
+        entry = ban_store.get(user_id)
+        if entry is None or not entry.in_server(server_id_str):
+            return False
+        entry = entry.replace(remove_server=server_id_str)
+        if entry.servers_mask:
+            ban_store.set(user_id, entry, source=f"unban in {server_id_str}")
+        else:
+            ban_store.remove(user_id, source=f"unban in {server_id_str}")
+        return True
+
+
+# Started from v.py's on_ready; v!syncglobal asks it for an early run
+sync_scheduler = SyncScheduler()
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+from types import MappingProxyType
+
+from utils.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+
+class GuildConfig:
+    """
+    Typed, immutable per-guild settings record. On disk it keeps the old
+    servers.json keys ("screening", "do", "logs_channel", "whitelist", "invite",
+    "auto_enforce");
+    unknown keys are carried along untouched in `extra`.
+    """
+
+    __slots__ = ("screening", "action", "logs_channel", "whitelist", "invite", "auto_enforce", "extra")
+
+    def __init__(self, screening=False, action="log", logs_channel=None, whitelist=(), invite=None,
+                 auto_enforce=False, extra=None):
+        self.screening = bool(screening)
+        self.action = action or "log"
+        # Older code stored the channel as a string; get_channel() needs an int
+        self.logs_channel = int(logs_channel) if logs_channel else None
+        self.whitelist = tuple(int(user_id) for user_id in whitelist)
+        self.invite = invite
+        # Opted in to having new global list entries banned here automatically
+        self.auto_enforce = bool(auto_enforce)
+        self.extra = MappingProxyType(dict(extra or {}))
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        return cls(
+            screening=data.pop("screening", False),
+            action=data.pop("do", "log"),
+            logs_channel=data.pop("logs_channel", None),
+            whitelist=data.pop("whitelist", ()),
+            invite=data.pop("invite", None),
+            auto_enforce=data.pop("auto_enforce", False),
+            extra=data,
+        )
+
+    def to_dict(self):
+        data = {
+            "screening": self.screening,
+            "do": self.action,
+            "logs_channel": self.logs_channel,
+            "whitelist": list(self.whitelist),
+        }
+        if self.invite is not None:
+            data["invite"] = self.invite
+        if self.auto_enforce:
+            data["auto_enforce"] = True
+        data.update(self.extra)
+        return data
+
+    def replace(self, **changes):
+        """Return a copy with some fields changed"""
+        fields = {name: getattr(self, name) for name in self.__slots__}
+        fields.update(changes)
+        return GuildConfig(**fields)
+
+    def get(self, key, default=None):
+        """dict-style access by on-disk key, for code written against servers.json"""
+        return self.to_dict().get(key, default)
+
+
+DEFAULT_CONFIG = GuildConfig()
+
+
+class GuildSettingsService:
+    """
+    The single owner of servers.json. Settings, AutoScreener and the DM
+    verification flow all read from memory here and write through it.
+
+    Reads never block: the guild -> GuildConfig dict is copy-on-write, so
+    `snapshot()` hands out a stable read-only view. Writes take an asyncio lock,
+    swap in a new dict and schedule a debounced flush, so a burst of changes is
+    written once.
+    """
+
+    def __init__(self, flush_delay=2.0):
+        self.flush_delay = flush_delay
+        self._configs = None
+        self._lock = None
+        self._flush_handle = None
+        self._dirty = False
+
+    # --- Reads ---
+
+    def _loaded(self):
+        if self._configs is None:
+            self.reload()
+        return self._configs
+
+    def reload(self):
+        """(Re)load every guild's settings from the storage backend"""
+        raw = get_storage().load_guild_settings()
+        self._configs = {str(guild_id): GuildConfig.from_dict(data) for guild_id, data in raw.items()}
+        logger.info(f"Loaded settings for {len(self._configs)} guilds")
+        return self._configs
+
+    def get(self, guild_id, default=None):
+        return self._loaded().get(str(guild_id), default)
+
+    def get_or_default(self, guild_id):
+        return self._loaded().get(str(guild_id), DEFAULT_CONFIG)
+
+    def __contains__(self, guild_id):
+        return str(guild_id) in self._loaded()
+
+    def __len__(self):
+        return len(self._loaded())
+
+    def snapshot(self):
+        """Read-only view that later writes won't change"""
+        return MappingProxyType(self._loaded())
+
+    # --- Writes ---
+
+    @property
+    def lock(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _commit(self, configs):
+        self._configs = configs
+        self._dirty = True
+        self._schedule_flush()
+
+    async def update(self, guild_id, **changes):
+        """Change some fields for a guild, creating it with defaults if needed"""
+        guild_id = str(guild_id)
+        async with self.lock:
+            configs = dict(self._loaded())
+            config = configs.get(guild_id, DEFAULT_CONFIG).replace(**changes)
+            configs[guild_id] = config
+            self._commit(configs)
+            return config
+
+    async def ensure(self, guild_id, **defaults):
+        """Create a guild's entry if it doesn't exist. Returns (config, created)."""
+        guild_id = str(guild_id)
+        async with self.lock:
+            config = self._loaded().get(guild_id)
+            if config is not None:
+                return config, False
+            configs = dict(self._configs)
+            config = configs[guild_id] = DEFAULT_CONFIG.replace(**defaults)
+            self._commit(configs)
+            return config, True
+
+    async def delete(self, guild_id):
+        guild_id = str(guild_id)
+        async with self.lock:
+            if guild_id not in self._loaded():
+                return False
+            configs = dict(self._configs)
+            del configs[guild_id]
+            self._commit(configs)
+            return True
+
+    async def add_to_whitelist(self, guild_id, user_id):
+        """Returns False if the user was already whitelisted"""
+        async with self.lock:
+            config = self.get_or_default(guild_id)
+            if user_id in config.whitelist:
+                return False
+            configs = dict(self._configs)
+            configs[str(guild_id)] = config.replace(whitelist=config.whitelist + (user_id,))
+            self._commit(configs)
+            return True
+
+    async def remove_from_whitelist(self, guild_id, user_id):
+        """Returns False if the user wasn't whitelisted"""
+        async with self.lock:
+            config = self.get(guild_id)
+            if config is None or user_id not in config.whitelist:
+                return False
+            configs = dict(self._configs)
+            configs[str(guild_id)] = config.replace(
+                whitelist=tuple(u for u in config.whitelist if u != user_id)
+            )
+            self._commit(configs)
+            return True
+
+    # --- Persistence ---
+
+    def _schedule_flush(self):
+        if self._flush_handle is not None:
+            return  # a flush is already pending; this change rides along with it
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush_now()
+            return
+        self._flush_handle = loop.call_later(self.flush_delay, self.flush_now)
+
+    def flush_now(self):
+        """Hand the current snapshot to the storage backend (which writes off the loop)"""
+        self._flush_handle = None
+        if not self._dirty:
+            return
+        self._dirty = False
+        configs = self._configs
+        get_storage().save_guild_settings({guild_id: config.to_dict() for guild_id, config in configs.items()})
+        logger.debug(f"Flushed settings for {len(configs)} guilds")
+
+
+# Shared by v.py, the settings and autoscreener cogs, auto-enforce and ban plans
+guild_settings = GuildSettingsService()
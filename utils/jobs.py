@@ -0,0 +1,350 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+import discord
+
+from utils.aio import run_io, submit_io
+from utils.banexec import BULK_BAN_LIMIT, MAX_BAN_CONCURRENCY, ban_users
+from utils.bansnapshot import ban_snapshots
+from utils.banstore import ban_store
+from utils.journal import atomic_write_json
+from utils.progress import DEFAULT_INTERVAL, ProgressReporter, format_eta
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = Path("data/jobs")
+
+RUNNING = "running"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+DONE = "done"
+
+
+class BanJob:
+    """
+    One mass-ban run (massban or synclocal) in one guild. The ban targets are
+    frozen when the job is created (reasons stored once, referenced by index)
+    and worked through in order; `cursor` is the number of targets already
+    handled, checkpointed to disk after every batch.
+    """
+
+    __slots__ = ("guild_id", "kind", "state", "channel_id", "message_id", "started_by", "created_at",
+                 "reasons", "targets", "cursor", "banned", "failed", "already_banned", "total",
+                 "seconds", "requests", "throttled", "error")
+
+    def __init__(self, guild_id, kind, targets, channel_id=None, message_id=None, started_by=None,
+                 already_banned=0, total=None, failed=None):
+        self.guild_id = int(guild_id)
+        self.kind = kind
+        self.state = RUNNING
+        self.channel_id = channel_id
+        self.message_id = message_id
+        self.started_by = started_by
+        self.created_at = time.time()
+        # targets: [(user_id, reason)] -> reasons table + [[user_id, reason index]]
+        self.reasons = []
+        self.targets = []
+        index = {}
+        for user_id, reason in targets:
+            if reason not in index:
+                index[reason] = len(self.reasons)
+                self.reasons.append(reason)
+            self.targets.append([int(user_id), index[reason]])
+        self.cursor = 0
+        self.banned = 0
+        self.failed = dict(failed or {})  # str(user_id) -> short error
+        self.already_banned = already_banned
+        self.total = len(self.targets) if total is None else total
+        self.seconds = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.error = None
+
+    @property
+    def done(self):
+        return self.total - len(self.targets) + self.cursor
+
+    @property
+    def remaining(self):
+        return len(self.targets) - self.cursor
+
+    def throughput(self):
+        handled = self.banned + len(self.failed)
+        rate = handled / self.seconds if self.seconds > 0 else 0.0
+        return (f"{handled} users in {self.seconds:.1f}s ({rate:.1f} users/s) using {self.requests} requests; "
+                f"throttled {self.throttled}x")
+
+    def describe(self):
+        line = (f"{self.kind} in guild {self.guild_id}: **{self.state}**, "
+                f"{self.cursor}/{len(self.targets)} targets handled (Banned: {self.banned}, Failed: {len(self.failed)})")
+        if self.error:
+            line += f" - last error: {self.error}"
+        return line
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data["guild_id"], data["kind"], ())
+        for key in cls.__slots__:
+            if key in data and key != "guild_id":
+                setattr(job, key, data[key])
+        return job
+
+    def to_dict(self):
+        data = {key: getattr(self, key) for key in self.__slots__}
+        data["failed"] = dict(self.failed)
+        return data
+
+
+class BanJobManager:
+    """
+    Runs BanJobs in the background, at most one per guild, and persists each
+    job to `directory` so a restart picks it up where the last checkpoint left
+    off. Targets are banned `batch_size` at a time (the checkpoint unit: a
+    restart mid-batch repeats at most that batch, and re-banning is harmless).
+    Pausing and cancelling take effect at the next batch boundary.
+    """
+
+    def __init__(self, directory=JOBS_DIR, batch_size=BULK_BAN_LIMIT * MAX_BAN_CONCURRENCY,
+                 progress_interval=DEFAULT_INTERVAL):
+        self.directory = Path(directory)
+        self.batch_size = batch_size
+        self.progress_interval = progress_interval
+        self.bot = None
+        self._jobs = {}
+        self._tasks = {}
+
+    def _path(self, guild_id):
+        return self.directory / f"{guild_id}.json"
+
+    def _save(self, job):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        submit_io(atomic_write_json, self._path(job.guild_id), job.to_dict(), None)
+
+    def _discard(self, job):
+        def remove(path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        submit_io(remove, self._path(job.guild_id))
+        self._jobs.pop(job.guild_id, None)
+
+    def _read_all(self):
+        jobs = []
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return jobs
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(self.directory / name, "r") as f:
+                    jobs.append(BanJob.from_dict(json.load(f)))
+            except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable ban job {name}: {e}")
+        return jobs
+
+    # --- Queries ---
+
+    def get(self, guild_id):
+        return self._jobs.get(int(guild_id))
+
+    def jobs(self):
+        return list(self._jobs.values())
+
+    def is_running(self, guild_id):
+        task = self._tasks.get(int(guild_id))
+        return task is not None and not task.done()
+
+    # --- Control ---
+
+    async def resume_all(self, bot, progress_interval=None):
+        """Load persisted jobs and restart the ones that were running (safe to call on every on_ready)"""
+        self.bot = bot
+        if progress_interval is not None:
+            self.progress_interval = progress_interval
+        for job in await run_io(self._read_all):
+            if job.guild_id in self._jobs:
+                continue
+            if job.state in (CANCELLED, DONE):
+                # Cancelled (or finished) just before a restart; nothing left to do
+                self._discard(job)
+                continue
+            self._jobs[job.guild_id] = job
+            if job.state == RUNNING:
+                logger.info(f"Resuming {job.kind} job in guild {job.guild_id} at {job.cursor}/{len(job.targets)}")
+                self._spawn(job)
+
+    def start(self, bot, job):
+        """Register and start `job`. Returns False if the guild already has a job (running or paused)."""
+        self.bot = bot
+        if job.guild_id in self._jobs:
+            return False
+        self._jobs[job.guild_id] = job
+        self._save(job)
+        self._spawn(job)
+        return True
+
+    def pause(self, guild_id):
+        job = self.get(guild_id)
+        if job is None or job.state != RUNNING:
+            return None
+        job.state = PAUSED
+        self._save(job)
+        return job
+
+    def resume(self, guild_id):
+        job = self.get(guild_id)
+        if job is None or job.state != PAUSED:
+            return None
+        job.state = RUNNING
+        job.error = None
+        self._save(job)
+        if not self.is_running(guild_id):
+            self._spawn(job)
+        return job
+
+    def cancel(self, guild_id):
+        job = self.get(guild_id)
+        if job is None:
+            return None
+        was_running = self.is_running(guild_id)
+        job.state = CANCELLED
+        if was_running:
+            # Persist now: the runner only notices between batches, and a restart before then must not resume it
+            self._save(job)
+        else:
+            self._discard(job)
+        return job
+
+    def _spawn(self, job):
+        self._tasks[job.guild_id] = asyncio.get_running_loop().create_task(self._run(job))
+
+    # --- Running ---
+
+    def _channel(self, job):
+        return self.bot.get_channel(job.channel_id) if job.channel_id else None
+
+    def _reporter(self, job):
+        """Throttled editor for the job's progress message (None if the channel is gone)"""
+        channel = self._channel(job)
+        if channel is None or job.message_id is None:
+            return None
+
+        def render(reporter):
+            banned = reporter.counters.get("banned", job.banned)
+            failed = reporter.counters.get("failed", len(job.failed))
+            if job.kind == "synclocal":
+                text = f"Sync Progress: {reporter.done}/{job.total} (Success: {banned}, Failed: {failed})"
+            else:
+                text = (f"Progress: {reporter.done}/{job.total} "
+                        f"(Success: {banned}, Failed: {failed}, Already Banned: {job.already_banned})")
+            if reporter.done < job.total:
+                text += f" · {reporter.rate:.1f} bans/s · ETA {format_eta(reporter.eta)}"
+            return text
+
+        return ProgressReporter(channel.get_partial_message(job.message_id), job.total, render=render,
+                                interval=self.progress_interval, done=job.done)
+
+    async def _announce(self, job, message):
+        channel = self._channel(job)
+        if channel is None:
+            return
+        try:
+            await channel.send(message)
+        except discord.HTTPException as e:
+            logger.warning(f"Could not post {job.kind} job result in {job.channel_id}: {e}")
+
+    def _final_message(self, job):
+        failed = len(job.failed)
+        if job.state == CANCELLED:
+            return (f"🛑 {'Local ban sync' if job.kind == 'synclocal' else 'Mass ban'} cancelled after "
+                    f"{job.cursor}/{len(job.targets)} targets.\n"
+                    f"Banned: **{job.banned}**\nFailed: **{failed}**")
+        if job.kind == "synclocal":
+            message = (f"✅ Local ban sync complete.\n"
+                       f"Newly Banned: **{job.banned}**\n"
+                       f"Failed: **{failed}** (Check role hierarchy/permissions?)\n"
+                       f"Total Needed: **{job.total}**\n")
+        else:
+            message = (f"✅ Mass ban complete.\n"
+                       f"Banned: **{job.banned}**\n"
+                       f"Already Banned: **{job.already_banned}**\n"
+                       f"Failed: **{failed}** (Check role hierarchy/permissions?)\n"
+                       f"Total Processed: **{job.total}**\n")
+        message += (f"Duration: {time.time() - job.created_at:.2f} seconds.\n"
+                    f"Throughput: {job.throughput()}")
+        if failed > 0:
+            message += ("\n\n⚠️ **Failures detected.** This often happens if the bot's role is not high enough "
+                        "or if trying to ban users with higher roles.")
+        return message
+
+    async def _run(self, job):
+        guild = self.bot.get_guild(job.guild_id)
+        if guild is None:
+            logger.warning(f"Dropping {job.kind} job for guild {job.guild_id}: the bot is no longer in it.")
+            self._discard(job)
+            return
+        log_prefix = "SyncLocal" if job.kind == "synclocal" else "Massban"
+        reporter = self._reporter(job)
+
+        async def report_progress(outcome):
+            if reporter is not None:
+                reporter.update(job.done + outcome.done, banned=job.banned + len(outcome.banned),
+                                failed=len(job.failed) + len(outcome.failed))
+
+        try:
+            while job.state == RUNNING and job.cursor < len(job.targets):
+                batch = job.targets[job.cursor:job.cursor + self.batch_size]
+                reasons = {user_id: job.reasons[index] for user_id, index in batch}
+
+                outcome = await ban_users(guild, list(reasons), reasons.__getitem__, report_progress,
+                                          log_prefix=log_prefix)
+                for user_id in outcome.banned:
+                    entry = ban_store.get(user_id)
+                    ban_snapshots.note_ban(guild.id, user_id, entry.get("name") if entry else None, reasons[user_id])
+                job.failed.update((str(user_id), error) for user_id, error in outcome.failed.items())
+                job.banned += len(outcome.banned)
+                job.seconds += outcome.seconds
+                job.requests += outcome.requests
+                job.throttled += sum(stats.throttled for stats in outcome.stats)
+                job.cursor += len(batch)
+                if job.state != CANCELLED:
+                    self._save(job)
+                if reporter is not None:
+                    reporter.update(job.done, banned=job.banned, failed=len(job.failed))
+        except Exception as e:
+            # Keep the checkpoint and wait for v!resumejob instead of losing the work
+            logger.exception(f"{log_prefix} job in {guild.id} stopped: {e}")
+            if reporter is not None:
+                await reporter.close()
+            if job.state == CANCELLED:
+                self._discard(job)
+                return
+            job.state = PAUSED
+            job.error = str(e)[:200]
+            self._save(job)
+            await self._announce(job, f"⚠️ {log_prefix} job paused after an error: `{job.error}`. "
+                                      f"Use `v!resumejob` to continue.")
+            return
+
+        if reporter is not None:
+            await reporter.close()
+        if job.state == PAUSED:
+            await self._announce(job, f"⏸️ {log_prefix} job paused at {job.cursor}/{len(job.targets)}. "
+                                      f"Use `v!resumejob` to continue or `v!canceljob` to drop it.")
+            return
+        if job.state != CANCELLED:
+            job.state = DONE
+        self._discard(job)
+        logger.info(f"{log_prefix} job in {guild.id} {job.state}: {job.throughput()}")
+        await self._announce(job, self._final_message(job))
+
+
+# Shared by v.py's massban/synclocal and the job control commands
+ban_jobs = BanJobManager()
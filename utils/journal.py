@@ -0,0 +1,251 @@
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from utils.aio import CoalescingWriter
+
+logger = logging.getLogger(__name__)
+
+
+def atomic_write_json(path, data, indent=4, default=None):
+    """Write JSON to a temp file and rename it over `path`, so readers never see a half-written file"""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=indent, default=default)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class JournaledFile:
+    """
+    A JSON data file with an append-only journal next to it.
+
+    Mutations are applied to the in-memory copy right away and appended to
+    `<file>.journal` as one small JSON record per line by the IO executor;
+    records queued while a write is pending go out in the same append. Once
+    enough records pile up, the state is folded back into the snapshot (temp
+    file + atomic rename) on that same executor and the journal is truncated. Loading is snapshot + journal replay;
+    a torn last line from a crash mid-append is ignored.
+
+    Dict datasets use `set`/`delete`, list datasets use `add`/`discard`, and
+    `replace` swaps the whole value. `root_key` wraps the value on disk, e.g.
+    {"bans": {...}} for the global ban list. `decode`/`encode` convert dict
+    values to and from a richer in-memory type (see utils/records.py).
+    """
+
+    def __init__(self, path, default=dict, root_key=None, indent=4, compact_every=500, check_interval=1.0,
+                 decode=None, encode=None):
+        self.path = Path(path)
+        self.journal_path = self.path.with_name(self.path.name + ".journal")
+        self.default = default
+        self.root_key = root_key
+        self.indent = indent
+        self.compact_every = compact_every
+        self.check_interval = check_interval
+        self.decode = decode
+        self.encode = encode
+        self.version = 0
+        self._lock = threading.RLock()
+        self._pending = 0
+        self._buffer = []
+        self._writer = CoalescingWriter(self._flush, name=f"journal-{self.path.name}")
+        self._checked_at = 0.0
+        self._own_stamp = None
+        self.data = None
+        self.load()
+
+    # --- Loading ---
+
+    def _read_snapshot(self):
+        if not self.path.exists():
+            return self.default()
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if self.root_key is not None:
+                data = data.get(self.root_key, self.default())
+            if not isinstance(data, type(self.default())):
+                logger.warning(f"{self.path} has an unexpected layout. Starting from an empty value.")
+                self._set_aside()
+                return self.default()
+            return self._decode_all(data)
+        except (json.JSONDecodeError, AttributeError) as e:
+            logger.error(f"Error loading {self.path}: {e}. Starting from an empty value.")
+            self._set_aside()
+            return self.default()
+
+    def _set_aside(self):
+        """Move an unreadable snapshot out of the way so compaction can't overwrite it before it's inspected"""
+        aside = self.path.with_name(f"{self.path.name}.corrupt-{int(time.time())}")
+        try:
+            os.replace(self.path, aside)
+            logger.error(f"Moved the unreadable {self.path} to {aside}")
+        except OSError as e:
+            logger.error(f"Could not move {self.path} aside: {e}. Not compacting over it.")
+            self._keep_snapshot = True
+
+    def load(self):
+        """(Re)load the snapshot and replay any journal records on top of it"""
+        with self._lock:
+            self._keep_snapshot = False
+            data = self._read_snapshot()
+            replayed = 0
+            torn = False
+            if self.journal_path.exists():
+                with open(self.journal_path, "r") as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            logger.warning(f"Ignoring torn record at the end of {self.journal_path}")
+                            torn = True
+                            break
+                        data = self._apply(data, self._decode_record(record))
+                        replayed += 1
+            self.data = data
+            self._pending = replayed
+            self.version += 1
+            self._own_stamp = (_stamp(self.path), _stamp(self.journal_path))
+            if (replayed or torn) and not self._keep_snapshot:
+                logger.info(f"Replayed {replayed} journal records for {self.path}")
+                self.compact()
+            return self.data
+
+    def current_version(self):
+        """
+        Version token for change detection. Reloads first if either file was
+        modified outside this process (e.g. someone hand-edited the snapshot).
+        The disk check is throttled and skipped while our own writes are in flight.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self.version
+        self._checked_at = now
+        if self._buffer or self._writer.busy or not self._lock.acquire(blocking=False):
+            return self.version
+        try:
+            if (_stamp(self.path), _stamp(self.journal_path)) != self._own_stamp:
+                logger.info(f"{self.path} changed on disk, reloading")
+                self.load()
+        finally:
+            self._lock.release()
+        return self.version
+
+    def _decode_all(self, data):
+        if self.decode is not None and isinstance(data, dict):
+            return {key: self.decode(value) for key, value in data.items()}
+        return data
+
+    def _decode_record(self, record):
+        if self.decode is None:
+            return record
+        if record.get("op") == "set":
+            record["value"] = self.decode(record["value"])
+        elif record.get("op") == "replace":
+            record["value"] = self._decode_all(record["value"])
+        return record
+
+    # --- Mutations ---
+
+    @staticmethod
+    def _apply(data, record):
+        op = record.get("op")
+        if op == "set":
+            data[record["key"]] = record["value"]
+        elif op == "del":
+            data.pop(record["key"], None)
+        elif op == "add":
+            if record["value"] not in data:
+                data.append(record["value"])
+        elif op == "discard":
+            if record["value"] in data:
+                data.remove(record["value"])
+        elif op == "replace":
+            data = record["value"]
+        return data
+
+    def _append(self, records):
+        with self._lock:
+            for record in records:
+                self.data = self._apply(self.data, record)
+            self._buffer.extend(records)
+            self.version += 1
+        self._writer.request()
+
+    def _flush(self):
+        """Runs on the IO executor: write out buffered records, compact when due"""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+        if records:
+            try:
+                with open(self.journal_path, "a") as f:
+                    f.write("".join(json.dumps(r, separators=(",", ":"), default=self.encode) + "\n" for r in records))
+            except IOError as e:
+                logger.error(f"Could not append to {self.journal_path}: {e}")
+            with self._lock:
+                self._pending += len(records)
+                self._own_stamp = (_stamp(self.path), _stamp(self.journal_path))
+        if self._pending >= self.compact_every:
+            self.compact()
+
+    def set(self, key, value):
+        self._append([{"op": "set", "key": key, "value": value}])
+
+    def delete(self, key):
+        self._append([{"op": "del", "key": key}])
+
+    def add(self, value):
+        self._append([{"op": "add", "value": value}])
+
+    def discard(self, value):
+        self._append([{"op": "discard", "value": value}])
+
+    def replace(self, value):
+        self._append([{"op": "replace", "value": value}])
+
+    def update(self, changed, removed=()):
+        """Journal several dict changes as one append"""
+        records = [{"op": "set", "key": k, "value": v} for k, v in changed.items()]
+        records.extend({"op": "del", "key": k} for k in removed)
+        if records:
+            self._append(records)
+
+    # --- Compaction ---
+
+    def compact(self):
+        """Fold the journal into a fresh snapshot and drop the records it now covers"""
+        try:
+            with self._lock:
+                data = self.data.copy()
+                offset = _stamp(self.journal_path)[1] if self.journal_path.exists() else 0
+            # Serialize outside the lock so the event loop can keep mutating meanwhile
+            atomic_write_json(self.path, {self.root_key: data} if self.root_key is not None else data,
+                              indent=self.indent, default=self.encode)
+            with self._lock:
+                # Keep anything appended while the snapshot was being written
+                tail = b""
+                if self.journal_path.exists():
+                    with open(self.journal_path, "rb") as f:
+                        f.seek(offset)
+                        tail = f.read()
+                tmp_path = self.journal_path.with_name(self.journal_path.name + ".tmp")
+                with open(tmp_path, "wb") as f:
+                    f.write(tail)
+                os.replace(tmp_path, self.journal_path)
+                self._pending = tail.count(b"\n")
+                self._own_stamp = (_stamp(self.path), _stamp(self.journal_path))
+        except IOError as e:
+            logger.error(f"Could not compact {self.path}: {e}")
@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 5.0
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60}s"
+    return f"{seconds}s"
+
+
+class ProgressReporter:
+    """
+    Keeps a progress message current without competing with the work it
+    reports on. `update()` only folds the latest counters in memory; the
+    message is edited at most once per `interval` seconds, never while an
+    edit is still in flight, and not at all if the text didn't change.
+    `close()` writes the final state.
+
+    `render(reporter)` builds the message text from `done`, `total`,
+    `counters`, `rate` and `eta`; the default is "label: done/total (...)".
+    """
+
+    def __init__(self, message, total, label="Progress", render=None, interval=DEFAULT_INTERVAL, done=0):
+        self.message = message
+        self.total = total
+        self.label = label
+        self.render = render or ProgressReporter.default_render
+        self.interval = interval
+        self.done = done
+        self.counters = {}
+        self.edits = 0
+        self._start_done = done
+        self._started = time.monotonic()
+        self._last_edit = 0.0
+        self._last_text = None
+        self._timer = None
+        self._task = None
+        self._closed = False
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self._started
+
+    @property
+    def rate(self):
+        """Items per second since this reporter was created"""
+        elapsed = self.elapsed
+        return (self.done - self._start_done) / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        """Seconds left at the current rate, or None before there's a rate"""
+        rate = self.rate
+        if rate <= 0 or self.total is None:
+            return None
+        return max(0.0, (self.total - self.done) / rate)
+
+    @staticmethod
+    def default_render(reporter):
+        counters = ", ".join(f"{name}: {value}" for name, value in reporter.counters.items())
+        text = f"{reporter.label}: {reporter.done}/{reporter.total}"
+        if counters:
+            text += f" ({counters})"
+        if reporter.done < reporter.total:
+            text += f" · {reporter.rate:.1f}/s · ETA {format_eta(reporter.eta)}"
+        return text
+
+    def update(self, done=None, **counters):
+        """Record progress; the message catches up within `interval` seconds"""
+        if self._closed:
+            return
+        if done is not None:
+            self.done = done
+        self.counters.update(counters)
+        if self._timer is not None or (self._task is not None and not self._task.done()):
+            return  # An edit is already scheduled or running; it'll pick these values up
+        delay = self._last_edit + self.interval - time.monotonic()
+        loop = asyncio.get_running_loop()
+        if delay <= 0:
+            self._task = loop.create_task(self._edit())
+        else:
+            self._timer = loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        self._task = asyncio.get_running_loop().create_task(self._edit())
+
+    async def _edit(self):
+        text = self.render(self)
+        self._last_edit = time.monotonic()
+        if text == self._last_text:
+            return
+        try:
+            await self.message.edit(content=text)
+            self._last_text = text
+            self.edits += 1
+        except discord.HTTPException as e:
+            logger.debug(f"Progress edit failed: {e}")  # e.g. message deleted; keep going
+
+    async def close(self):
+        """Cancel any pending edit and write the final state"""
+        self._closed = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._task is not None and not self._task.done():
+            await self._task
+        await self._edit()
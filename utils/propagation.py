@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+
+import discord
+
+from utils.banexec import ban_users
+from utils.banplan import audit_reason
+from utils.bansnapshot import ban_snapshots
+from utils.banstore import ban_store
+from utils.guildsettings import guild_settings
+
+logger = logging.getLogger(__name__)
+
+# Failures that retrying won't fix
+PERMANENT_FAILURES = {"user not found", "missing permissions", "rejected by bulk ban"}
+
+
+class BanPropagator:
+    """
+    Bans new global list entries in every guild that opted in with
+    `v!settings autoenforce on`, seconds after they're added instead of at
+    the next manual v!synclocal.
+
+    Additions are queued per guild and drained by one worker per guild that
+    waits `settle_delay` first, so a burst (a sync adding hundreds of entries)
+    becomes a few bulk bans per guild. At most `global_concurrency` guilds are
+    banning at once, and within a guild ban_users' scheduler keeps at most
+    `guild_concurrency` requests in flight. Users whose ban failed for a
+    transient reason are retried with exponential backoff, up to
+    `max_attempts` times. The queue lives in memory; anything lost to a
+    restart is picked up by the guild's next v!synclocal.
+    """
+
+    def __init__(self, global_concurrency=4, guild_concurrency=2, settle_delay=2.0, max_attempts=5, retry_delay=30.0):
+        self.global_concurrency = global_concurrency
+        self.guild_concurrency = guild_concurrency
+        self.settle_delay = settle_delay
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.bot = None
+        self._pending = {}  # guild_id -> {user_id: (queued_at, attempt, ready_at)}
+        self._workers = {}  # guild_id -> Task
+        self._semaphore = None
+
+    def start(self, bot, global_concurrency=None, guild_concurrency=None):
+        self.bot = bot
+        if global_concurrency is not None:
+            self.global_concurrency = global_concurrency
+        if guild_concurrency is not None:
+            self.guild_concurrency = guild_concurrency
+        self._semaphore = asyncio.Semaphore(max(1, self.global_concurrency))
+
+    def subscribers(self):
+        """Guilds the bot is in that have auto-enforce on"""
+        if self.bot is None:
+            return []
+        guilds = []
+        for guild_id, config in guild_settings.snapshot().items():
+            if config.auto_enforce:
+                guild = self.bot.get_guild(int(guild_id))
+                if guild is not None:
+                    guilds.append(guild)
+        return guilds
+
+    @property
+    def pending(self):
+        return sum(len(queue) for queue in self._pending.values())
+
+    def enqueue(self, user_ids, source_guild_id=None):
+        """
+        Queue new global list entries for every subscribed guild except the
+        one the ban came from. Returns the number of guilds they were queued for.
+        """
+        user_ids = [int(user_id) for user_id in user_ids]
+        if not user_ids or self._semaphore is None:
+            return 0
+        now = time.monotonic()
+        guilds = [guild for guild in self.subscribers() if guild.id != source_guild_id]
+        for guild in guilds:
+            queue = self._pending.setdefault(guild.id, {})
+            for user_id in user_ids:
+                queue.setdefault(user_id, (now, 0, now))
+            self._wake(guild)
+        if guilds:
+            logger.info(f"Propagating {len(user_ids)} new global bans to {len(guilds)} guilds")
+        return len(guilds)
+
+    def _wake(self, guild):
+        worker = self._workers.get(guild.id)
+        if worker is None or worker.done():
+            self._workers[guild.id] = asyncio.get_running_loop().create_task(self._drain(guild))
+
+    def _targets(self, guild, user_ids):
+        """Drop users that mustn't or needn't be banned here any more"""
+        config = guild_settings.get_or_default(guild.id)
+        if not config.auto_enforce:
+            return []  # Opted out while queued
+        snapshot = ban_snapshots.cached(guild.id)
+        whitelist = set(config.whitelist)
+        return [user_id for user_id in user_ids
+                if user_id in ban_store  # Still on the global list
+                and user_id not in whitelist
+                and user_id not in (self.bot.user.id, guild.owner_id)
+                and (snapshot is None or user_id not in snapshot)]
+
+    async def _drain(self, guild):
+        await asyncio.sleep(self.settle_delay)
+        queue = self._pending.get(guild.id)
+        while queue:
+            now = time.monotonic()
+            ready = {user_id: item for user_id, item in queue.items() if item[2] <= now}
+            if not ready:
+                await asyncio.sleep(min(item[2] for item in queue.values()) - now)
+                continue
+            for user_id in ready:
+                del queue[user_id]
+            try:
+                await self._enforce(guild, ready)
+            except Exception as e:
+                logger.exception(f"Propagation to {guild.name} ({guild.id}) failed: {e}")
+                self._retry(guild, ready, {user_id: type(e).__name__ for user_id in ready})
+        self._pending.pop(guild.id, None)
+        self._workers.pop(guild.id, None)
+
+    def _retry(self, guild, items, failed):
+        queue = self._pending.setdefault(guild.id, {})
+        now = time.monotonic()
+        dropped = 0
+        for user_id, error in failed.items():
+            queued_at, attempt, _ = items[user_id]
+            if error in PERMANENT_FAILURES or attempt + 1 >= self.max_attempts:
+                dropped += 1
+                continue
+            queue[user_id] = (queued_at, attempt + 1, now + self.retry_delay * 2 ** attempt)
+        if dropped:
+            logger.warning(f"Propagation: gave up on {dropped} bans in {guild.name} ({guild.id})")
+
+    async def _enforce(self, guild, items):
+        targets = self._targets(guild, list(items))
+        if not targets:
+            return
+
+        async with self._semaphore:
+            outcome = await ban_users(guild, targets, audit_reason, log_prefix="Propagate",
+                                      max_concurrency=self.guild_concurrency)
+
+        for user_id in outcome.banned:
+            entry = ban_store.get(user_id)
+            ban_snapshots.note_ban(guild.id, user_id, entry.get("name") if entry else None, audit_reason(user_id))
+        # Every target must end up banned or failed; anything unaccounted for is retried, not dropped
+        banned = set(outcome.banned)
+        unaccounted = [user_id for user_id in targets if user_id not in banned and user_id not in outcome.failed]
+        if unaccounted:
+            logger.error(f"Propagation: {len(unaccounted)} bans in {guild.name} ({guild.id}) ended with no outcome")
+            outcome.failed.update((user_id, "no outcome") for user_id in unaccounted)
+        if outcome.failed:
+            self._retry(guild, items, outcome.failed)
+
+        if outcome.banned:
+            now = time.monotonic()
+            slowest = max(now - items[user_id][0] for user_id in outcome.banned)
+            logger.info(f"Propagation: banned {len(outcome.banned)} in {guild.name} ({guild.id}), "
+                        f"time to enforce at most {slowest:.1f}s; {outcome.throughput()}")
+            await self._log(guild, f"🛡️ **Auto-enforce:** banned {len(outcome.banned)} user(s) newly added to the global ban list"
+                                   f"{f' ({len(outcome.failed)} failed)' if outcome.failed else ''}.")
+
+    async def _log(self, guild, message):
+        logs_channel = guild_settings.get_or_default(guild.id).logs_channel
+        channel = guild.get_channel(logs_channel) if logs_channel else None
+        if channel is None:
+            return
+        try:
+            await channel.send(message)
+        except discord.HTTPException as e:
+            logger.warning(f"Could not post to the logs channel of {guild.id}: {e}")
+
+
+# Fed by the global sync, ban events and v!banadd
+ban_propagator = BanPropagator()
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from pathlib import Path
+
+from utils.aio import submit_io
+from utils.journal import JournaledFile, atomic_write_json
+
+logger = logging.getLogger(__name__)
+
+
+class SlidingWindowLimiter:
+    """
+    Per-user sliding window limiter kept entirely in memory.
+
+    Each user gets a deque holding at most `limit` timestamps, so a check only
+    drops expired entries from the left and reads the length: O(1) amortized,
+    no disk I/O. A background task sweeps users whose window has emptied and
+    snapshots the state to disk (same {"<id>": {"requests": [...]}} layout as
+    before) so limits survive a restart.
+    """
+
+    def __init__(self, limit, window=3600, path=None, sweep_interval=300):
+        self.limit = limit
+        self.window = window
+        self.path = Path(path) if path else None
+        self.sweep_interval = sweep_interval
+        self._hits = {}
+        self._dirty = False
+        self._task = None
+        if self.path is not None:
+            self.load()
+
+    def _recent(self, user_id, now):
+        hits = self._hits.get(user_id)
+        if hits is None:
+            return None
+        cutoff = now - self.window
+        while hits and hits[0] <= cutoff:
+            hits.popleft()
+        if not hits:
+            del self._hits[user_id]
+            return None
+        return hits
+
+    def check(self, user_id, now=None):
+        """Return (limited, request_count) for the current window"""
+        hits = self._recent(int(user_id), time.time() if now is None else now)
+        count = len(hits) if hits else 0
+        return count >= self.limit, count
+
+    def hit(self, user_id, now=None):
+        """Record one request"""
+        user_id = int(user_id)
+        now = time.time() if now is None else now
+        hits = self._recent(user_id, now)
+        if hits is None:
+            hits = self._hits[user_id] = deque(maxlen=self.limit)
+        hits.append(now)
+        self._dirty = True
+
+    def reset(self, user_id=None):
+        """Forget one user (returns False if they had no entry) or everyone"""
+        if user_id is None:
+            self._hits.clear()
+            self._dirty = True
+            return True
+        if self._hits.pop(int(user_id), None) is None:
+            return False
+        self._dirty = True
+        return True
+
+    def __contains__(self, user_id):
+        return int(user_id) in self._hits
+
+    def __len__(self):
+        return len(self._hits)
+
+    def sweep(self, now=None):
+        """Drop users with no requests left in the window. Returns how many were removed."""
+        now = time.time() if now is None else now
+        cutoff = now - self.window
+        expired = [user_id for user_id, hits in self._hits.items() if not hits or hits[-1] <= cutoff]
+        for user_id in expired:
+            del self._hits[user_id]
+        if expired:
+            self._dirty = True
+        return len(expired)
+
+    # --- Persistence ---
+
+    def load(self):
+        # Going through JournaledFile folds in a journal left by older versions
+        data = JournaledFile(self.path).data
+        now = time.time()
+        self._hits = {}
+        for user_id, entry in data.items():
+            recent = sorted(t for t in entry.get("requests", []) if now - t < self.window)
+            if recent:
+                self._hits[int(user_id)] = deque(recent[-self.limit:], maxlen=self.limit)
+        logger.info(f"Loaded rate limits for {len(self._hits)} users from {self.path}")
+
+    def snapshot(self):
+        """Queue a write of the current state if anything changed since the last one"""
+        if self.path is None or not self._dirty:
+            return None
+        self._dirty = False
+        data = {str(user_id): {"requests": list(hits)} for user_id, hits in self._hits.items()}
+        return submit_io(atomic_write_json, self.path, data)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+        self.snapshot()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self.sweep()
+            if removed:
+                logger.debug(f"Swept {removed} expired rate limit entries")
+            self.snapshot()
@@ -0,0 +1,166 @@
+import re
+import sys
+from collections.abc import Mapping
+
+# Prefixes other bots stack onto synced reasons ("Global Ban Sync: Global Ban Sync: ...")
+_SYNC_PREFIXES = {"global ban sync", "global ban"}
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_reason(reason):
+    """Collapse whitespace and repeated sync prefixes so equal reasons share one string"""
+    if reason is None:
+        return None
+    parts = _WHITESPACE.sub(" ", reason).strip().split(": ")
+    kept = []
+    for part in parts[:-1]:
+        if kept and part.lower() in _SYNC_PREFIXES and part.lower() == kept[-1].lower():
+            continue
+        kept.append(part)
+    kept.append(parts[-1])
+    return ": ".join(kept)
+
+
+class ServerTable:
+    """Maps server ID strings to bit positions so an entry's servers fit in one int"""
+
+    def __init__(self):
+        self._bits = {}
+        self._ids = []
+
+    def bit(self, server_id):
+        server_id = sys.intern(str(server_id))
+        bit = self._bits.get(server_id)
+        if bit is None:
+            bit = self._bits[server_id] = len(self._ids)
+            self._ids.append(server_id)
+        return bit
+
+    def mask(self, server_ids):
+        mask = 0
+        for server_id in server_ids:
+            mask |= 1 << self.bit(server_id)
+        return mask
+
+    def ids(self, mask):
+        ids = []
+        bit = 0
+        while mask:
+            if mask & 1:
+                ids.append(self._ids[bit])
+            mask >>= 1
+            bit += 1
+        return ids
+
+    def has(self, mask, server_id):
+        bit = self._bits.get(str(server_id))
+        return bit is not None and bool(mask >> bit & 1)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+class ReasonTable:
+    """Interned, normalized ban reasons; identical reasons are stored once"""
+
+    def __init__(self):
+        self._reasons = {}
+
+    def intern(self, reason):
+        if reason is None:
+            return None
+        cached = self._reasons.get(reason)
+        if cached is None:
+            normalized = normalize_reason(reason)
+            cached = self._reasons.setdefault(normalized, normalized)
+            self._reasons[reason] = cached
+        return cached
+
+    def __len__(self):
+        return len(set(self._reasons.values()))
+
+
+server_table = ServerTable()
+reason_table = ReasonTable()
+
+
+class BanEntry(Mapping):
+    """
+    One global ban list entry. Behaves like the old {"name", "reason", "servers"}
+    dict for readers (`entry.get("reason")`, `entry["servers"]`), but stores the
+    servers as a bitmask into `server_table` and the reason interned. Treat
+    entries as immutable: build a new one (see `replace`) to change it.
+    """
+
+    __slots__ = ("name", "reason", "servers_mask")
+
+    _KEYS = ("name", "reason", "servers")
+
+    def __init__(self, name=None, reason=None, servers_mask=0):
+        self.name = name
+        self.reason = reason_table.intern(reason)
+        self.servers_mask = servers_mask
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, BanEntry):
+            return data
+        return cls(data.get("name"), data.get("reason"), server_table.mask(data.get("servers", ())))
+
+    def to_dict(self):
+        """The on-disk JSON layout"""
+        data = {"name": self.name, "reason": self.reason, "servers": self.servers}
+        if self.name is None:
+            del data["name"]
+        return data
+
+    @property
+    def servers(self):
+        return server_table.ids(self.servers_mask)
+
+    def in_server(self, server_id):
+        return server_table.has(self.servers_mask, server_id)
+
+    def replace(self, name=None, reason=None, add_server=None, remove_server=None):
+        """Return a copy with some fields changed"""
+        mask = self.servers_mask
+        if add_server is not None:
+            mask |= 1 << server_table.bit(add_server)
+        if remove_server is not None and server_table.has(mask, remove_server):
+            mask &= ~(1 << server_table.bit(remove_server))
+        return BanEntry(self.name if name is None else name, self.reason if reason is None else reason, mask)
+
+    # --- Mapping interface for code written against the dict layout ---
+
+    def __getitem__(self, key):
+        if key == "servers":
+            return self.servers
+        if key in ("name", "reason"):
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key in self._KEYS if key == "servers" or getattr(self, key) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, BanEntry):
+            return (self.name == other.name and self.reason == other.reason
+                    and self.servers_mask == other.servers_mask)
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"BanEntry(name={self.name!r}, reason={self.reason!r}, servers={self.servers!r})"
+
+
+def to_json(entry):
+    """`json.dump(default=...)` hook for BanEntry values"""
+    if isinstance(entry, BanEntry):
+        return entry.to_dict()
+    raise TypeError(f"Object of type {type(entry).__name__} is not JSON serializable")
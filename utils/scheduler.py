@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+# Raised by discord.py (2.3+) instead of sleeping when a 429's retry_after is
+# longer than Client(max_ratelimit_timeout=...); absent on older versions
+_RATE_LIMITED = getattr(discord, "RateLimited", ())
+
+
+class Backoff(Exception):
+    """Raised by a job to have the scheduler pause everything and retry it after `retry_after` seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"retry after {retry_after:.2f}s")
+        self.retry_after = retry_after
+
+
+def backoff_from(error):
+    """
+    The server-provided retry delay for a rate limit error, or None if `error`
+    isn't one. discord.py normally absorbs 429s itself; these are the ones it
+    gives up on or hands back to us.
+    """
+    if isinstance(error, Backoff):
+        return error.retry_after
+    if _RATE_LIMITED and isinstance(error, _RATE_LIMITED):
+        return error.retry_after
+    if isinstance(error, discord.HTTPException) and error.status == 429:
+        headers = getattr(error.response, "headers", None) or {}
+        try:
+            return float(headers.get("Retry-After", 1.0))
+        except (TypeError, ValueError):
+            return 1.0
+    return None
+
+
+class SchedulerStats:
+    __slots__ = ("requests", "completed", "throttled", "retries", "peak_concurrency", "started", "finished")
+
+    def __init__(self):
+        self.requests = 0
+        self.completed = 0
+        self.throttled = 0
+        self.retries = 0
+        self.peak_concurrency = 0
+        self.started = time.perf_counter()
+        self.finished = None
+
+    @property
+    def seconds(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self):
+        return self.requests / self.seconds if self.seconds > 0 else 0.0
+
+    def describe(self):
+        return (f"{self.requests} requests in {self.seconds:.1f}s ({self.rate:.2f}/s), "
+                f"throttled {self.throttled}x, concurrency peaked at {self.peak_concurrency}")
+
+
+class AdaptiveScheduler:
+    """
+    Runs request jobs as fast as Discord lets us, with bounded concurrency.
+
+    discord.py keeps the per-route buckets (remaining / reset-after headers)
+    to itself and simply waits when one is empty, so the scheduler reads the
+    bucket state from what it can see: a request that comes back much slower
+    than usual was held for a bucket reset, and a 429 that surfaces carries the
+    server's retry delay. Concurrency grows by one after every
+    `increase_every` fast requests and halves on either signal (AIMD); a 429
+    also pauses every worker until the retry delay has passed.
+
+    The latency signal only makes sense for requests that are normally
+    quick. Pass `slow_after=None` for inherently slow ones (a 200-user bulk
+    ban routinely takes seconds); only 429s throttle those.
+    """
+
+    def __init__(self, max_concurrency=4, min_concurrency=1, increase_every=10, slow_after=1.0, max_retries=5):
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.concurrency = self.min_concurrency
+        self.increase_every = increase_every
+        self.slow_after = slow_after
+        self.max_retries = max_retries
+        self.stats = SchedulerStats()
+        self._fast_streak = 0
+        self._baseline = None
+        self._resume_at = 0.0
+        self._cond = None
+
+    def _note_latency(self, seconds):
+        if self._baseline is None:
+            self._baseline = seconds
+        else:
+            self._baseline = 0.9 * self._baseline + 0.1 * min(seconds, self._baseline * 2)
+        if self.slow_after is not None and seconds > max(self.slow_after, self._baseline * 4):
+            self._throttle(f"slow request ({seconds:.2f}s)")
+        else:
+            self._fast_streak += 1
+            if self._fast_streak >= self.increase_every and self.concurrency < self.max_concurrency:
+                self._fast_streak = 0
+                self.concurrency += 1
+                self.stats.peak_concurrency = max(self.stats.peak_concurrency, self.concurrency)
+                self._cond.notify_all()
+
+    def _throttle(self, why, retry_after=0.0):
+        self.stats.throttled += 1
+        self._fast_streak = 0
+        self.concurrency = max(self.min_concurrency, self.concurrency // 2)
+        if retry_after:
+            self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+        logger.debug(f"Scheduler throttled: {why}; concurrency now {self.concurrency}")
+
+    async def run(self, items, job, on_give_up=None, on_error=None):
+        """
+        Await `job(item)` for every item. A job signals a rate limit by raising
+        (Backoff, discord.RateLimited or a 429 HTTPException); the item is then
+        retried up to `max_retries` times before `on_give_up(item, error)`.
+        Any other exception is logged and handed to `on_error(item, error)`,
+        so the caller can account for the item instead of losing it.
+        """
+        self._cond = asyncio.Condition()
+        self.stats.peak_concurrency = max(self.stats.peak_concurrency, self.concurrency)
+        queue = deque((item, 0) for item in items)
+        in_flight = 0
+
+        def ready(index):
+            # Nobody leaves while an item is in flight: it may come back for a retry
+            # after concurrency has dropped, and worker 0 is always allowed to take it
+            if queue:
+                return index < self.concurrency
+            return in_flight == 0
+
+        async def worker(index):
+            nonlocal in_flight
+            while True:
+                async with self._cond:
+                    await self._cond.wait_for(lambda: ready(index))
+                    if not queue:
+                        return
+                    item, attempt = queue.popleft()
+                    in_flight += 1
+
+                delay = self._resume_at - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                started = time.perf_counter()
+                self.stats.requests += 1
+                retry_after = None
+                try:
+                    await job(item)
+                except Exception as e:
+                    retry_after = backoff_from(e)
+                    if retry_after is None:
+                        logger.error(f"Scheduled job failed for {item!r:.120}: {e}")
+                        if on_error is not None:
+                            on_error(item, e)
+                    elif attempt + 1 > self.max_retries:
+                        logger.error(f"Giving up on {item!r:.120} after {attempt + 1} rate limited attempts")
+                        if on_give_up is not None:
+                            on_give_up(item, e)
+                        retry_after = None
+                    else:
+                        self.stats.retries += 1
+
+                async with self._cond:
+                    in_flight -= 1
+                    if retry_after is not None:
+                        self._throttle(f"rate limited, retry after {retry_after:.2f}s", retry_after)
+                        queue.appendleft((item, attempt + 1))
+                    else:
+                        self.stats.completed += 1
+                        self._note_latency(time.perf_counter() - started)
+                    self._cond.notify_all()
+
+        await asyncio.gather(*(worker(i) for i in range(self.max_concurrency)))
+        self.stats.finished = time.perf_counter()
+        return self.stats
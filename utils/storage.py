@@ -0,0 +1,388 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from utils.aio import CoalescingWriter, submit_io
+from utils.journal import JournaledFile, atomic_write_json
+from utils.records import BanEntry, server_table, to_json
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path("data")
+GLOBAL_BAN_LIST_FILE = DATA_DIR / "global_ban_list.json"
+VERIFIED_SERVERS_FILE = DATA_DIR / "verified_servers.json"
+SERVERS_FILE = DATA_DIR / "servers.json"
+SQLITE_FILE = DATA_DIR / "vtracker.db"
+
+
+class JSONStorage:
+    """
+    The original one-JSON-file-per-dataset layout. The ban list and guild
+    settings are journaled (see utils/journal.py), so a mutation appends a small
+    record instead of rewriting the whole file.
+    """
+
+    name = "json"
+
+    def __init__(self, data_dir=DATA_DIR):
+        data_dir = Path(data_dir)
+        self.bans_file = data_dir / GLOBAL_BAN_LIST_FILE.name
+        self.verified_file = data_dir / VERIFIED_SERVERS_FILE.name
+        self.servers_file = data_dir / SERVERS_FILE.name
+        self._bans_journal = None
+        self._servers_journal = None
+        self._guild_cache = None
+        self._verified = None
+        self._verified_stamp = None
+        self._verified_writer = CoalescingWriter(self._write_verified, name="verified-servers")
+
+    def _write(self, path, data, indent=4):
+        try:
+            atomic_write_json(path, data, indent=indent)
+        except IOError as e:
+            logger.error(f"Could not write to {path}: {e}")
+
+    @property
+    def bans_journal(self):
+        if self._bans_journal is None:
+            self._bans_journal = JournaledFile(self.bans_file, root_key="bans",
+                                               decode=BanEntry.from_dict, encode=to_json)
+        return self._bans_journal
+
+    @property
+    def servers_journal(self):
+        if self._servers_journal is None:
+            self._servers_journal = JournaledFile(self.servers_file)
+        return self._servers_journal
+
+    # --- Global ban list ---
+
+    def bans_version(self):
+        """Cheap token that changes whenever the ban list changes"""
+        return self.bans_journal.current_version()
+
+    def load_bans(self):
+        return self.bans_journal.data
+
+    def save_bans(self, bans, upserts=None, deletes=None):
+        """
+        Persist changes to the ban list. `upserts`/`deletes` name the user IDs that
+        changed; without them the whole list is journaled as a replacement.
+        """
+        if upserts is None and deletes is None:
+            self.bans_journal.replace(dict(bans))
+        else:
+            self.bans_journal.update({u: bans[u] for u in upserts or ()}, deletes or ())
+
+    # --- Verified servers ---
+
+    def _verified_file_stamp(self):
+        try:
+            st = os.stat(self.verified_file)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_verified_servers(self):
+        try:
+            if not self.verified_file.exists():
+                self._write_verified([])
+                return []
+            with open(self.verified_file, "r") as f:
+                data = json.load(f)
+            servers = data.get("servers", [])
+            if not isinstance(servers, list):
+                logger.warning(f"{self.verified_file} 'servers' key is not a list. Resetting.")
+                self._write_verified([])
+                return []
+            return servers
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error(f"Error loading verified servers from {self.verified_file}: {e}. Returning empty list.")
+            self._write_verified([])
+            return []
+
+    def load_verified_servers(self):
+        """Cached copy, re-read only if the file was changed by someone else"""
+        if self._verified is None or (
+            not self._verified_writer.busy and self._verified_file_stamp() != self._verified_stamp
+        ):
+            self._verified = self._read_verified_servers()
+            self._verified_stamp = self._verified_file_stamp()
+        return list(self._verified)
+
+    def _write_verified(self, servers):
+        self._write(self.verified_file, {"servers": servers})
+        self._verified_stamp = self._verified_file_stamp()
+
+    def save_verified_servers(self, servers):
+        self._verified = list(servers)
+        self._verified_writer.request(list(servers))
+
+    # --- Per-guild settings (servers.json) ---
+
+    def load_guild_settings(self):
+        data = self.servers_journal.data
+        self._guild_cache = {guild_id: json.dumps(settings) for guild_id, settings in data.items()}
+        return {guild_id: json.loads(raw) for guild_id, raw in self._guild_cache.items()}
+
+    def save_guild_settings(self, servers):
+        """Only guilds whose settings differ from the last save are journaled"""
+        if self._guild_cache is None:
+            self.load_guild_settings()
+        encoded = {guild_id: json.dumps(data) for guild_id, data in servers.items()}
+        changed = {g: json.loads(raw) for g, raw in encoded.items() if self._guild_cache.get(g) != raw}
+        removed = [g for g in self._guild_cache if g not in encoded]
+        self.servers_journal.update(changed, removed)
+        self._guild_cache = encoded
+
+
+class SQLiteStorage:
+    """
+    SQLite-backed storage. Every save only touches the rows that changed,
+    and single-row reads are indexed lookups instead of whole-file parses.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS meta (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS bans (
+        user_id INTEGER PRIMARY KEY,
+        name TEXT,
+        reason TEXT
+    );
+    CREATE TABLE IF NOT EXISTS ban_servers (
+        user_id INTEGER NOT NULL REFERENCES bans(user_id) ON DELETE CASCADE,
+        server_id INTEGER NOT NULL,
+        PRIMARY KEY (user_id, server_id)
+    );
+    CREATE INDEX IF NOT EXISTS idx_ban_servers_server ON ban_servers(server_id);
+    CREATE TABLE IF NOT EXISTS verified_servers (
+        server_id TEXT PRIMARY KEY,
+        position INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS guild_settings (
+        guild_id TEXT PRIMARY KEY,
+        settings TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path=SQLITE_FILE, data_dir=DATA_DIR):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # The connection is shared with the IO executor thread, guarded by _lock
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(self.SCHEMA)
+        self._guild_cache = None
+        self._verified = None
+        self._data_version = None
+        if not self._get_meta("migrated"):
+            self.migrate_from_json(data_dir)
+
+    def _get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def migrate_from_json(self, data_dir=DATA_DIR):
+        """One-shot import of the existing data/*.json files into the database"""
+        source = JSONStorage(data_dir)
+        with self._lock, self.conn:
+            if source.bans_file.exists():
+                bans = source.load_bans()
+                self._write_bans(bans, bans.keys(), ())
+                logger.info(f"Migrated {len(bans)} global bans from {source.bans_file}")
+            if source.verified_file.exists():
+                servers = source.load_verified_servers()
+                self._write_verified_servers(servers)
+                logger.info(f"Migrated {len(servers)} verified servers from {source.verified_file}")
+            if source.servers_file.exists():
+                settings = source.load_guild_settings()
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO guild_settings (guild_id, settings) VALUES (?, ?)",
+                    [(guild_id, json.dumps(data)) for guild_id, data in settings.items()]
+                )
+                logger.info(f"Migrated settings for {len(settings)} guilds from {source.servers_file}")
+            self._set_meta("migrated", "1")
+
+    # --- Global ban list ---
+
+    def bans_version(self):
+        # data_version changes whenever another connection commits to the database.
+        # Don't wait on the IO executor if it's mid-transaction; nothing external changed then.
+        if not self._lock.acquire(blocking=False):
+            return self._data_version
+        try:
+            self._data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            return self._data_version
+        finally:
+            self._lock.release()
+
+    def load_bans(self):
+        with self._lock:
+            bans = {}
+            servers = {}
+            for user_id, server_id in self.conn.execute("SELECT user_id, server_id FROM ban_servers ORDER BY rowid"):
+                servers.setdefault(user_id, []).append(server_id)
+            for user_id, name, reason in self.conn.execute("SELECT user_id, name, reason FROM bans"):
+                mask = server_table.mask(servers.get(user_id, ()))
+                bans[str(user_id)] = BanEntry(name, reason, mask)
+            return bans
+
+    def get_ban(self, user_id):
+        """Targeted single-entry lookup"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT name, reason FROM bans WHERE user_id = ?", (int(user_id),)
+            ).fetchone()
+            if row is None:
+                return None
+            servers = [str(s) for (s,) in self.conn.execute(
+                "SELECT server_id FROM ban_servers WHERE user_id = ? ORDER BY rowid", (int(user_id),)
+            )]
+            return {"name": row[0], "reason": row[1], "servers": servers}
+
+    def bans_in_server(self, server_id):
+        """IDs of global entries that came from a given server"""
+        with self._lock:
+            return [str(u) for (u,) in self.conn.execute(
+                "SELECT user_id FROM ban_servers WHERE server_id = ?", (int(server_id),)
+            )]
+
+    def _write_bans(self, bans, upserts, deletes):
+        deletes = [(int(user_id),) for user_id in deletes]
+        if deletes:
+            self.conn.executemany("DELETE FROM bans WHERE user_id = ?", deletes)
+        rows = []
+        memberships = []
+        for user_id in upserts:
+            entry = bans[user_id]
+            user_id = int(user_id)
+            rows.append((user_id, entry.get("name"), entry.get("reason")))
+            memberships.extend((user_id, int(s)) for s in entry.get("servers", []))
+        if rows:
+            self.conn.executemany(
+                "INSERT INTO bans (user_id, name, reason) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET name = excluded.name, reason = excluded.reason",
+                rows
+            )
+            self.conn.executemany("DELETE FROM ban_servers WHERE user_id = ?", [(r[0],) for r in rows])
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO ban_servers (user_id, server_id) VALUES (?, ?)", memberships
+            )
+
+    def save_bans(self, bans, upserts=None, deletes=None):
+        """
+        Persist changes to the ban list. `upserts`/`deletes` name the user IDs that
+        changed; without them every row is rewritten.
+        """
+        with self._lock, self.conn:
+            if upserts is None and deletes is None:
+                self.conn.execute("DELETE FROM bans")
+                upserts = bans.keys()
+            self._write_bans(bans, upserts or (), deletes or ())
+
+    # --- Verified servers ---
+
+    def load_verified_servers(self):
+        if self._verified is None:
+            with self._lock:
+                self._verified = [s for (s,) in self.conn.execute(
+                    "SELECT server_id FROM verified_servers ORDER BY position"
+                )]
+        return list(self._verified)
+
+    def _write_verified_servers(self, servers):
+        current = dict(self.conn.execute("SELECT server_id, position FROM verified_servers"))
+        wanted = set(servers)
+        self.conn.executemany(
+            "DELETE FROM verified_servers WHERE server_id = ?", [(s,) for s in current.keys() - wanted]
+        )
+        # Every row's position follows the list, so removals don't leave duplicate positions behind
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO verified_servers (server_id, position) VALUES (?, ?)",
+            [(s, i) for i, s in enumerate(servers) if current.get(s) != i]
+        )
+
+    def save_verified_servers(self, servers):
+        self._verified = list(servers)
+        submit_io(self._commit_verified_servers, list(servers))
+
+    def _commit_verified_servers(self, servers):
+        with self._lock, self.conn:
+            self._write_verified_servers(servers)
+
+    # --- Per-guild settings ---
+
+    def load_guild_settings(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT guild_id, settings FROM guild_settings").fetchall()
+        self._guild_cache = {guild_id: raw for guild_id, raw in rows}
+        return {guild_id: json.loads(raw) for guild_id, raw in rows}
+
+    def save_guild_settings(self, servers):
+        """Only rows whose serialized settings differ from the last save are written"""
+        if self._guild_cache is None:
+            self.load_guild_settings()
+        encoded = {guild_id: json.dumps(data) for guild_id, data in servers.items()}
+        changed = [(g, raw) for g, raw in encoded.items() if self._guild_cache.get(g) != raw]
+        removed = [(g,) for g in self._guild_cache if g not in encoded]
+        self._guild_cache = encoded
+        if changed or removed:
+            submit_io(self._commit_guild_settings, changed, removed)
+
+    def _commit_guild_settings(self, changed, removed):
+        with self._lock, self.conn:
+            self.conn.executemany("DELETE FROM guild_settings WHERE guild_id = ?", removed)
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO guild_settings (guild_id, settings) VALUES (?, ?)", changed
+            )
+
+
+BACKENDS = {
+    JSONStorage.name: JSONStorage,
+    SQLiteStorage.name: SQLiteStorage,
+}
+
+_storage = None
+
+
+def configure_storage(name="json", **kwargs):
+    """Select the storage backend. Call once at startup, before cogs are loaded."""
+    global _storage
+    if name not in BACKENDS:
+        logger.error(f"Unknown storage backend '{name}'. Falling back to json.")
+        name = "json"
+    _storage = BACKENDS[name](**kwargs)
+    logger.info(f"Using {name} storage backend")
+    return _storage
+
+
+def get_storage():
+    """Return the active storage backend (JSON unless configured otherwise)"""
+    global _storage
+    if _storage is None:
+        _storage = JSONStorage()
+    return _storage
+
+
+if __name__ == "__main__":
+    # python -m utils.storage -> one-shot migration of data/*.json into data/vtracker.db
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    fresh = not SQLITE_FILE.exists()
+    db = SQLiteStorage()  # a brand new database migrates itself on open
+    if not fresh:
+        db.migrate_from_json()
+    logger.info(f"Migration to {db.path} complete.")
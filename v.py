@@ -1,5 +1,4 @@
 import json
-import re
 import logging
 from colorama import init, Fore, Style
 from pathlib import Path
@@ -10,6 +9,18 @@ import asyncio
 from datetime import datetime
 from discord.ext import commands
 from difflib import SequenceMatcher
+from utils.aio import loop_lag, run_io
+from utils.banplan import plan_bans, plan_previews
+from utils.banstore import ban_store
+from utils.bansnapshot import ban_snapshots
+from utils.blocklist import BlockList
+from utils.coverage import coverage_index
+from utils.globalsync import DEFAULT_CONCURRENCY, is_global_ban_reason, sync_scheduler
+from utils.guildsettings import guild_settings
+from utils.jobs import BanJob, ban_jobs
+from utils.propagation import ban_propagator
+from utils.ratelimit import SlidingWindowLimiter
+from utils.storage import configure_storage, get_storage
 
 # Initialize colorama
 init(autoreset=True)
@@ -33,17 +44,47 @@ async def on_ready():
     # Ensure cog directory exists
     Path("./cog").mkdir(parents=True, exist_ok=True)
     await load_cogs(bot)
+    # Ban events missed while disconnected can't be replayed; relearn coverage from fresh fetches
+    coverage_index.reset()
+    sync_scheduler.note_new_session()
+    loop_lag.start()
+    verification_limiter.start()
+    # Pick up mass-ban jobs interrupted by a restart
+    await ban_jobs.resume_all(bot, progress_interval=config_data.get('progress_interval', 5.0))
+    # Bans new global entries in guilds with auto-enforce on
+    ban_propagator.start(
+        bot,
+        global_concurrency=config_data.get('propagation_concurrency', 4),
+        guild_concurrency=config_data.get('propagation_guild_concurrency', 2),
+    )
+    # Background global sync; v!syncglobal only queues a run
+    sync_scheduler.start(
+        bot,
+        concurrency=config_data.get('sync_concurrency', DEFAULT_CONCURRENCY),
+        audit_channel_id=config_data.get('audit_channel_id', AUDIT_CHANNEL_ID),
+        interval=config_data.get('sync_interval_hours', 6) * 3600,
+        jitter=config_data.get('sync_jitter', 0.1),
+        progress_interval=config_data.get('progress_interval', 5.0),
+    )
     logger.info(f"{Fore.CYAN}Bot is ready and cogs are loaded.{Style.RESET_ALL}")
 
 # File paths
 CONFIG_FILE = Path("data/config.json")
-VERIFIED_SERVERS_FILE = Path("data/verified_servers.json")
-GLOBAL_BAN_LIST_FILE = Path("data/global_ban_list.json")
 BLOCKED_USERS_FILE = Path("data/blocked_users.json")
 RATE_LIMIT_FILE = Path("data/rate_limits.json")
+AUDIT_CHANNEL_ID = 1365903180730335315
+
+# Loaded once; changes are journaled (see utils/blocklist.py)
+blocked_users = BlockList(BLOCKED_USERS_FILE)
+# Blocked users already told they're blocked, so a spam wave doesn't cost a reply per DM.
+# Kept a subset of blocked_users: unblock drops the ID, and anyone unblocked some
+# other way (file edit, reload) is pruned once it outgrows the blocklist
+notified_blocked_users = set()
 
 # Anti-raid settings
 MAX_REQUESTS_PER_HOUR = 3  # Maximum verification requests per user per hour
+# Kept in memory; swept and snapshotted to RATE_LIMIT_FILE in the background
+verification_limiter = SlidingWindowLimiter(MAX_REQUESTS_PER_HOUR, window=3600, path=RATE_LIMIT_FILE)
 BLOCKED_SERVER_KEYWORDS = [
     "racc", "raid", "spam", "@everyone", "http://", "https://", 
     "discord.gg", "porn", "sex", "xxx", "motherless", "onlyfans"
@@ -64,10 +105,16 @@ def load_config():
         logger.error(f"Error decoding {CONFIG_FILE}. Please check its format.")
         return {"vtoken": None, "auditors": []} # Return default structure on error
 
+def save_config(config):
+    with open(CONFIG_FILE, "w") as f:
+        json.dump(config, f, indent=4)
+
 # Global tracking variables
 config_data = load_config()
 vtoken = config_data.get('vtoken')
 auditors = config_data.get('auditors', []) # Load auditors from config
+# "json" (default) or "sqlite" - see utils/storage.py
+configure_storage(config_data.get('storage', 'json'))
 
 def is_auditor():
     """Decorator to check if the user is an auditor."""
@@ -79,65 +126,20 @@ active_paginators = {}  # {user_id: message_id}
 original_ban_data = {}  # {message_id: {'user_ids': [], 'ban_list': [], 'timestamp': datetime}}
 
 def load_verified_servers():
-    try:
-        if not VERIFIED_SERVERS_FILE.exists():
-            save_verified_servers([]) # Create file if it doesn't exist
-            return []
-        with open(VERIFIED_SERVERS_FILE, "r") as f:
-            data = json.load(f)
-            # Ensure the key exists and it's a list
-            servers = data.get("servers", [])
-            if not isinstance(servers, list):
-                 logger.warning(f"{VERIFIED_SERVERS_FILE} 'servers' key is not a list. Resetting.")
-                 save_verified_servers([])
-                 return []
-            return servers
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logger.error(f"Error loading verified servers from {VERIFIED_SERVERS_FILE}: {e}. Returning empty list.")
-        # Attempt to create/reset the file on error
-        save_verified_servers([])
-        return []
+    return get_storage().load_verified_servers()
 
 
 def save_verified_servers(servers):
-    try:
-        with open(VERIFIED_SERVERS_FILE, "w") as f:
-            json.dump({"servers": servers}, f, indent=4)
-    except IOError as e:
-        logger.error(f"Could not write to {VERIFIED_SERVERS_FILE}: {e}")
+    get_storage().save_verified_servers(servers)
 
 
 def load_global_ban_list():
-    try:
-        if not GLOBAL_BAN_LIST_FILE.exists():
-            save_global_ban_list({}) # Create file if it doesn't exist
-            return {}
-        with open(GLOBAL_BAN_LIST_FILE, "r") as f:
-            data = json.load(f)
-            # Ensure the key exists and it's a dictionary
-            bans = data.get("bans", {})
-            if not isinstance(bans, dict):
-                 logger.warning(f"{GLOBAL_BAN_LIST_FILE} 'bans' key is not a dictionary. Resetting.")
-                 save_global_ban_list({})
-                 return {}
-            return bans
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        logger.error(f"Error loading global ban list from {GLOBAL_BAN_LIST_FILE}: {e}. Returning empty dictionary.")
-        # Attempt to create/reset the file on error
-        save_global_ban_list({})
-        return {}
+    """Return the shared in-memory global ban list (re-read only when the file changes)"""
+    return ban_store.bans()
 
 
 def save_global_ban_list(ban_list):
-     try:
-        with open(GLOBAL_BAN_LIST_FILE, "w") as f:
-            # Ensure the top-level structure is correct
-            if not isinstance(ban_list, dict):
-                 logger.error(f"Attempted to save non-dictionary data to global ban list. Aborting save.")
-                 return # Prevent saving incorrect data type
-            json.dump({"bans": ban_list}, f, indent=4)
-     except IOError as e:
-        logger.error(f"Could not write to {GLOBAL_BAN_LIST_FILE}: {e}")
+    ban_store.replace(ban_list)
 
 
 async def load_cogs(bot):
@@ -166,78 +168,6 @@ async def load_cogs(bot):
     logger.info(f"Finished loading cogs. Total loaded: {loaded_cogs}")
 
 
-# --- Syncing Logic ---
-
-async def update_global_ban_list():
-    """
-    Rebuild the global ban list from scratch based on current bans
-    in all verified servers matching the specific reason criteria.
-    This ensures users unbanned everywhere are removed.
-    """
-    logger.info("Starting global ban list update...")
-    verified_servers = load_verified_servers()
-    new_global_ban_list = {} # Build a fresh list
-
-    if not verified_servers:
-        logger.warning("No verified servers found. Global ban list will be empty.")
-        save_global_ban_list({}) # Save empty list if no servers are verified
-        return {}
-
-    processed_servers = 0
-    total_bans_added = 0
-
-    for server_id_str in verified_servers:
-        try:
-            server_id = int(server_id_str)
-            guild = bot.get_guild(server_id)
-            if guild:
-                logger.debug(f"Processing bans for server: {guild.name} ({server_id})")
-                ban_count_for_server = 0
-                # Use the async iterator correctly
-                async for ban_entry in guild.bans(limit=None):
-                    # Check if reason exists and matches the pattern
-                    if ban_entry.reason and re.search(r'\b(vorth|racc)\b', ban_entry.reason, re.IGNORECASE):
-                        user_id = str(ban_entry.user.id)
-                        user_name = str(ban_entry.user) # Get current username if available
-
-                        if user_id not in new_global_ban_list:
-                            # Add new entry
-                            new_global_ban_list[user_id] = {
-                                "name": user_name,
-                                "reason": ban_entry.reason,
-                                "servers": [server_id_str] # Store as string
-                            }
-                            ban_count_for_server += 1
-                        elif server_id_str not in new_global_ban_list[user_id]["servers"]:
-                            # Add server ID to existing entry if not already present
-                            new_global_ban_list[user_id]["servers"].append(server_id_str)
-                            # Optionally update name/reason if desired (e.g., keep newest)
-                            new_global_ban_list[user_id]["name"] = user_name # Update name
-                            new_global_ban_list[user_id]["reason"] = ban_entry.reason # Update reason
-                            ban_count_for_server += 1
-
-                if ban_count_for_server > 0:
-                    logger.info(f"Added/updated {ban_count_for_server} relevant bans from {guild.name}")
-                    total_bans_added += ban_count_for_server
-                processed_servers += 1
-
-            else:
-                logger.warning(f"Could not find guild with ID: {server_id}. Skipping.")
-
-        except discord.Forbidden:
-             logger.error(f"Bot lacks permissions (View Audit Log or Ban Members) in server {server_id_str}. Skipping.")
-        except discord.HTTPException as e:
-             logger.error(f"HTTP error fetching bans for server {server_id_str}: {e}. Skipping.")
-        except ValueError:
-             logger.error(f"Invalid server ID format in verified list: '{server_id_str}'. Skipping.")
-        except Exception as e:
-             logger.error(f"Unexpected error processing bans for server {server_id_str}: {e}")
-
-    logger.info(f"Global ban list update complete. Processed {processed_servers}/{len(verified_servers)} verified servers.")
-    logger.info(f"Final global ban list contains {len(new_global_ban_list)} entries.")
-    save_global_ban_list(new_global_ban_list)
-    return new_global_ban_list
-
 # --- Bot Events ---
 
 @bot.event
@@ -250,20 +180,25 @@ async def on_message(message):
     await bot.process_commands(message)
 
     if "1365751555810263070" in message.content and message.author.id in auditors:
-        await message.reply(f"Watching a current list of `{len(load_global_ban_list())}`\n-# `{round(bot.latency * 1000, 2)}ms`")
+        lag_avg, lag_p95, lag_max, _ = loop_lag.stats()
+        await message.reply(f"Watching a current list of `{len(ban_store)}`\n-# `{round(bot.latency * 1000, 2)}ms` · "
+                            f"loop lag avg `{lag_avg:.1f}ms` p95 `{lag_p95:.1f}ms` max `{lag_max:.1f}ms`")
     elif "1365751555810263070" in message.content:
         await message.reply(f"Hi! Use v!help for more information about what I do.")
 
     # --- DM Verification Logic ---
     if isinstance(message.channel, discord.DMChannel) and not message.content.startswith(bot.command_prefix):
-        logger.info(f"Received DM from {message.author} ({message.author.id}): '{message.content}'")
-        
-        # Check if user is blocked
-        blocked_users = load_blocked_users()
+        # Check if user is blocked before looking at the message at all
         if message.author.id in blocked_users:
-            logger.warning(f"Blocked user {message.author.id} attempted verification request")
-            await message.channel.send("❌ You have been blocked from making verification requests.")
+            if message.author.id not in notified_blocked_users:
+                notified_blocked_users.add(message.author.id)
+                if len(notified_blocked_users) > len(blocked_users):
+                    notified_blocked_users.intersection_update(blocked_users)
+                logger.warning(f"Blocked user {message.author.id} attempted verification request")
+                await message.channel.send("❌ You have been blocked from making verification requests.")
             return
+
+        logger.info(f"Received DM from {message.author} ({message.author.id}): '{message.content}'")
         
         # Check rate limiting
         is_limited, request_count = is_user_rate_limited(message.author.id)
@@ -296,8 +231,7 @@ async def on_message(message):
             if is_server_name_suspicious(guild.name):
                 logger.warning(f"Suspicious server name detected: '{guild.name}' ({guild.id}) by user {message.author.id}")
                 # Block the user immediately
-                blocked_users.append(message.author.id)
-                save_blocked_users(blocked_users)
+                blocked_users.add(message.author.id)
                 
                 # Notify auditors about the suspicious activity
                 audit_channel_id = 1365903180730335315
@@ -368,26 +302,8 @@ async def on_message(message):
                     if target_channel and target_channel.permissions_for(guild.me).create_instant_invite:
                          invite = await target_channel.create_invite(max_age=0, max_uses=0, reason="Auditor Verification Request")
                          
-                         # Handle servers.json file properly
-                         try:
-                             with open("data/servers.json", "r") as f:
-                                 data = json.load(f)
-                         except (FileNotFoundError, json.JSONDecodeError):
-                             data = {}
-                         
-                         if str(guild.id) in data:
-                             data[str(guild.id)]["invite"] = invite.url
-                         else:
-                             data[str(guild.id)] = {
-                                "screening": False,
-                                "do": "log",
-                                "logs_channel": None,
-                                "whitelist": [],
-                                "invite": invite.url
-                             }
-                         
-                         with open("data/servers.json", "w") as f:
-                             json.dump(data, f, indent=4)
+                         # Record the invite in the per-guild settings
+                         await guild_settings.update(guild.id, invite=invite.url)
                          
                          invite_link = invite.url
                          logger.info(f"Created temporary invite for {guild.name}: {invite_link}")
@@ -448,8 +364,8 @@ async def on_message(message):
 # --- Categorization mapping ---
 CATEGORIES = {
     "Configuration": ["settings", "vsettings", "reloadservers"],
-    "Ban Management": ["reloadbans", "banlist", "banlist_all", "globalbanlist", "add_to_banlist", "remove_from_banlist", "suggest_remove_from_banlist"],
-    "Global Ban Actions": ["massban", "synclocal", "syncglobal"],
+    "Ban Management": ["reloadbans", "banlist", "banlist_all", "globalbanlist", "add_to_banlist", "remove_from_banlist", "suggest_remove_from_banlist", "globaldiff"],
+    "Global Ban Actions": ["massban", "synclocal", "pending", "syncglobal", "jobs", "pausejob", "resumejob", "canceljob"],
     "Verification Management": ["verify", "unverify", "reject"],
     "Auditor Management": ["auditor", "strip", "listauditors", "update"],
     "Anti-Raid Management": ["block", "unblock", "blocklist", "resetlimits", "addkeyword", "removekeyword", "keywords"],
@@ -524,21 +440,25 @@ async def help_command(ctx, *, arg: str = None):
 @commands.cooldown(1, 300, commands.BucketType.guild) # Cooldown: 1 use per 5 mins per guild
 async def sync_global_ban_list(ctx):
     """(Admin) Updates the central global ban list with bans from all verified servers."""
-    await ctx.send("<a:loading:1371165596632219689> Updating global ban list... This can take a few minutes depending on the number of verified servers.") # Use a loading emoji if you have one
-
-    start_time = datetime.now()
-    try:
-        global_ban_list = await update_global_ban_list()
-        count = len(global_ban_list)
-        duration = datetime.now() - start_time
-        await ctx.send(f"✅ Global ban list updated successfully! It now contains **{count}** entries.\n"
-                       f"*Sync took {duration.total_seconds():.2f} seconds.*")
-        logger.info(f"Global ban list updated via command by {ctx.author} in {ctx.guild.id}. New count: {count}")
-
-    except Exception as e:
-        logger.exception(f"Error during triggered global sync in {ctx.guild.id}: {e}") # Log full traceback
-        await ctx.send(f"❌ An error occurred during the global sync: `{e}`. Please check the bot logs or contact support.")
-        ctx.command.reset_cooldown(ctx) # Reset cooldown on error
+    # The rebuild runs in the background scheduler; at most one is ever in flight
+    if sync_scheduler.request(reply_channel=ctx.channel):
+        await ctx.send("<a:loading:1371165596632219689> Global ban list update queued. I'll post the result here when it's done.")
+    else:
+        await ctx.send("ℹ️ A global ban list update is already queued or running. I'll post the result here when it's done.")
+    logger.info(f"Global sync requested by {ctx.author} in {ctx.guild.id}")
+
+
+async def start_ban_job(ctx, kind, plan, progress_msg):
+    """Run a confirmed plan as a background job that survives restarts (see utils/jobs.py)"""
+    already_banned = len(plan.already_banned) if kind == "massban" else 0
+    total = plan.total if kind == "massban" else len(plan.to_ban)
+    job = BanJob(ctx.guild.id, kind, plan.targets(), channel_id=ctx.channel.id, message_id=progress_msg.id,
+                 started_by=ctx.author.id, already_banned=already_banned, total=total)
+    if not ban_jobs.start(bot, job):
+        await ctx.send(f"⚠️ A ban job is already active in this server. See `{ctx.prefix}jobs`.")
+        return
+    logger.info(f"{kind} job started in {ctx.guild.id} by {ctx.author}: {len(plan.to_ban)} targets, "
+                f"{len(plan.skipped)} skipped.")
 
 
 @bot.command(name="massban", aliases=['setup', 'banall']) # Added banall alias
@@ -546,112 +466,52 @@ async def sync_global_ban_list(ctx):
 @commands.cooldown(1, 60, commands.BucketType.guild) # Cooldown: 1 use per 60 seconds per guild
 async def mass_ban(ctx, confirm: str = None):
     """(Ban Perms) Bans all users from the global ban list in this server."""
-    global_ban_list = load_global_ban_list()
-
-    if not global_ban_list:
+    if len(ban_store) == 0:
         await ctx.send("⚠️ The global ban list is currently empty. Nothing to ban.")
         ctx.command.reset_cooldown(ctx)
         return
 
-    if confirm != "confirm":
-        await ctx.send(f"🚨 **Warning!** This command will attempt to ban **{len(global_ban_list)}** users listed in the global ban list.\n"
-                       f"This action **cannot be undone** easily.\n\n"
-                       f"Type `{ctx.prefix}{ctx.invoked_with} confirm` to proceed.")
-        ctx.command.reset_cooldown(ctx) # Reset cooldown if not confirming
-        return
-
-    await ctx.send(f"🛡️ Starting mass ban of **{len(global_ban_list)}** users from the global list. This may take time...")
-
-    success = 0
-    failed = 0
-    already_banned = 0
-    total = len(global_ban_list)
-    progress_msg = await ctx.send(f"Progress: 0/{total} (Success: 0, Failed: 0, Already Banned: 0)")
-
-    start_time = datetime.now()
-
-    # Fetch current bans once to check if already banned efficiently
-    current_bans = set()
-    try:
-        async for ban_entry in ctx.guild.bans(limit=None):
-            current_bans.add(ban_entry.user.id)
-        logger.info(f"Fetched {len(current_bans)} existing bans for server {ctx.guild.id}")
-    except discord.Forbidden:
-        await ctx.send("❌ **Error:** Bot lacks permission to fetch the ban list. Cannot check for existing bans.")
-        logger.error(f"Massban failed: Bot lacks fetch bans permission in {ctx.guild.id}")
+    if ban_jobs.get(ctx.guild.id) is not None:
+        await ctx.send(f"⚠️ A ban job is already active in this server. See `{ctx.prefix}jobs`.")
         ctx.command.reset_cooldown(ctx)
         return
-    except Exception as e:
-        await ctx.send(f"❌ **Error:** Could not fetch existing bans: `{e}`. Proceeding without checks.")
-        logger.error(f"Massban warning: Could not fetch existing bans in {ctx.guild.id}: {e}")
-        current_bans = None # Indicate failure
 
-    for i, (user_id_str, ban_data) in enumerate(global_ban_list.items(), 1):
-        try:
-            user_id = int(user_id_str)
-
-            # Check if already banned (if fetch was successful)
-            if current_bans is not None and user_id in current_bans:
-                already_banned += 1
-                logger.debug(f"Massban: User {user_id} already banned in {ctx.guild.id}.")
-                continue # Skip to next user
-
-            reason = f"{ban_data.get('reason', 'Reason not specified in global list.')}"[:512] # Max reason length is 512
-
-            # Check if the user is the bot itself or the server owner - IMPORTANT SAFETY CHECK
-            if user_id == bot.user.id:
-                logger.warning(f"Massban: Skipped banning the bot itself ({user_id}).")
-                continue
-            if user_id == ctx.guild.owner_id:
-                logger.warning(f"Massban: Skipped banning the server owner ({user_id}).")
-                failed += 1 # Count as failure as it cannot be done
-                continue
-
-            await ctx.guild.ban(
-                discord.Object(id=user_id), # Use discord.Object for users not in the server
-                reason=reason,
-                delete_message_seconds=0
-           
-            )
-            success += 1
-            logger.info(f"Massban: Successfully banned {user_id} in {ctx.guild.id}. Reason: {reason}")
-
-        except discord.NotFound:
-            failed += 1
-            logger.warning(f"Massban: Failed to ban {user_id} in {ctx.guild.id} - User not found.")
-        except discord.Forbidden:
-            failed += 1
-            logger.error(f"Massban: Failed to ban {user_id} in {ctx.guild.id} - Bot lacks permissions (likely role hierarchy).")
-        except discord.HTTPException as e:
-            failed += 1
-            logger.error(f"Massban: Failed to ban {user_id} in {ctx.guild.id} - HTTP Error {e.status}: {e.text}")
-        except ValueError:
-             failed += 1
-             logger.error(f"Massban: Invalid user ID format in global list: '{user_id_str}'. Skipping.")
-        except Exception as e:
-             failed += 1
-             logger.error(f"Massban: Unexpected error banning {user_id} in {ctx.guild.id}: {e}")
-
-        # Update progress message periodically
-        if i % 10 == 0 or i == total: # Update every 10 bans or at the end
+    # `confirm` executes exactly the plan that was previewed, if there's a fresh one
+    plan = plan_previews.take(ctx.guild.id, "massban") if confirm == "confirm" else None
+    if plan is None:
+        # Existing bans come from the coverage index (kept current by ban events) when this
+        # session has seen them; otherwise from the shared snapshot (fetched or resumed only if stale)
+        current_bans = coverage_index.local_ids(ctx.guild.id)
+        if current_bans is None:
             try:
-                 await progress_msg.edit(content=f"Progress: {i}/{total} "
-                                                  f"(Success: {success}, Failed: {failed}, Already Banned: {already_banned})")
-            except discord.HTTPException:
-                 pass # Ignore if editing fails (e.g., message deleted)
-            await asyncio.sleep(1) # Short sleep to avoid hitting rate limits aggressively
+                current_bans = (await ban_snapshots.get(ctx.guild)).ids()
+                logger.info(f"Fetched {len(current_bans)} existing bans for server {ctx.guild.id}")
+            except discord.Forbidden:
+                await ctx.send("❌ **Error:** Bot lacks permission to fetch the ban list. Cannot check for existing bans.")
+                logger.error(f"Massban failed: Bot lacks fetch bans permission in {ctx.guild.id}")
+                ctx.command.reset_cooldown(ctx)
+                return
+            except Exception as e:
+                await ctx.send(f"❌ **Error:** Could not fetch existing bans: `{e}`. Proceeding without checks.")
+                logger.error(f"Massban warning: Could not fetch existing bans in {ctx.guild.id}: {e}")
+                current_bans = None # Indicate failure
 
-    duration = datetime.now() - start_time
-    final_message = (f"✅ Mass ban complete.\n"
-                     f"Banned: **{success}**\n"
-                     f"Already Banned: **{already_banned}**\n"
-                     f"Failed: **{failed}** (Check role hierarchy/permissions?)\n"
-                     f"Total Processed: **{total}**\n"
-                     f"Duration: {duration.total_seconds():.2f} seconds.")
-    if failed > 0:
-         final_message += "\n\n⚠️ **Failures detected.** This often happens if the bot's role is not high enough or if trying to ban users with higher roles."
+        # Global minus local minus bot/owner/whitelist, in one pass (see utils/banplan.py)
+        plan = plan_bans(ctx.guild, bot.user.id, current_bans)
+        logger.debug(f"Massban: planned {len(plan.to_ban)} bans in {ctx.guild.id} in {plan.seconds * 1000:.1f}ms.")
+
+    if confirm != "confirm":
+        await ctx.send(f"🚨 **Warning!** This command will attempt to ban users listed in the global ban list.\n"
+                       f"{plan.summary()}\n"
+                       f"This action **cannot be undone** easily. The attached file lists every user.\n\n"
+                       f"Type `{ctx.prefix}{ctx.invoked_with} confirm` to proceed.", file=plan.as_file())
+        plan_previews.store(ctx.guild.id, "massban", plan)
+        ctx.command.reset_cooldown(ctx) # Reset cooldown if not confirming
+        return
 
-    await ctx.send(final_message)
+    await ctx.send(f"🛡️ Starting mass ban of **{len(plan.to_ban)}** users from the global list. This may take time...")
+    progress_msg = await ctx.send(f"Progress: 0/{plan.total} (Success: 0, Failed: 0, Already Banned: 0)")
+    await start_ban_job(ctx, "massban", plan, progress_msg)
 
 
 @bot.command(name="synclocal")
@@ -659,114 +519,130 @@ async def mass_ban(ctx, confirm: str = None):
 @commands.cooldown(1, 60, commands.BucketType.guild) # Cooldown: 1 use per 60 seconds per guild
 async def sync_local(ctx, confirm: str = None):
     """(Ban Perms) Bans users from the global list who aren't already banned locally."""
-    global_ban_list = load_global_ban_list()
-
-    if not global_ban_list:
+    if len(ban_store) == 0:
         await ctx.send("⚠️ The global ban list is currently empty. Nothing to sync.")
         ctx.command.reset_cooldown(ctx)
         return
 
-    # --- Fetch current bans ---
-    await ctx.send("<a:loading:1371165596632219689> Checking local bans against the global list...")
-    current_bans = set()
-    try:
-        async for ban_entry in ctx.guild.bans(limit=None):
-            current_bans.add(ban_entry.user.id)
-        logger.info(f"SyncLocal: Fetched {len(current_bans)} existing bans for server {ctx.guild.id}")
-    except discord.Forbidden:
-        await ctx.send("❌ **Error:** Bot lacks permission to fetch the ban list. Cannot perform sync.")
-        logger.error(f"SyncLocal failed: Bot lacks fetch bans permission in {ctx.guild.id}")
-        ctx.command.reset_cooldown(ctx)
-        return
-    except Exception as e:
-        await ctx.send(f"❌ **Error:** Could not fetch existing bans: `{e}`. Aborting sync.")
-        logger.error(f"SyncLocal failed: Could not fetch existing bans in {ctx.guild.id}: {e}")
+    if ban_jobs.get(ctx.guild.id) is not None:
+        await ctx.send(f"⚠️ A ban job is already active in this server. See `{ctx.prefix}jobs`.")
         ctx.command.reset_cooldown(ctx)
         return
 
-    # --- Identify users to ban ---
-    users_to_ban = {}
-    for user_id_str, ban_data in global_ban_list.items():
-        try:
-            user_id = int(user_id_str)
-            if user_id not in current_bans:
-                 # Safety checks
-                 if user_id == bot.user.id or user_id == ctx.guild.owner_id:
-                      logger.warning(f"SyncLocal: Skipped adding bot/owner ({user_id}) to ban list.")
-                      continue
-                 users_to_ban[user_id_str] = ban_data # Store original string ID and data
-        except ValueError:
-            logger.error(f"SyncLocal: Invalid user ID format in global list: '{user_id_str}'. Skipping.")
-            continue
+    # `confirm` executes exactly the plan that was previewed, if there's a fresh one
+    plan = plan_previews.take(ctx.guild.id, "synclocal") if confirm == "confirm" else None
+    if plan is None:
+        # --- Fetch current bans (unless the coverage index already knows them) ---
+        current_bans = coverage_index.local_ids(ctx.guild.id)
+        if current_bans is None:
+            await ctx.send("<a:loading:1371165596632219689> Checking local bans against the global list...")
+            try:
+                current_bans = (await ban_snapshots.get(ctx.guild)).ids()
+                logger.info(f"SyncLocal: Fetched {len(current_bans)} existing bans for server {ctx.guild.id}")
+            except discord.Forbidden:
+                await ctx.send("❌ **Error:** Bot lacks permission to fetch the ban list. Cannot perform sync.")
+                logger.error(f"SyncLocal failed: Bot lacks fetch bans permission in {ctx.guild.id}")
+                ctx.command.reset_cooldown(ctx)
+                return
+            except Exception as e:
+                await ctx.send(f"❌ **Error:** Could not fetch existing bans: `{e}`. Aborting sync.")
+                logger.error(f"SyncLocal failed: Could not fetch existing bans in {ctx.guild.id}: {e}")
+                ctx.command.reset_cooldown(ctx)
+                return
 
+        # --- Identify users to ban (see utils/banplan.py) ---
+        plan = plan_bans(ctx.guild, bot.user.id, current_bans)
+        logger.debug(f"SyncLocal: planned {len(plan.to_ban)} bans in {ctx.guild.id} in {plan.seconds * 1000:.1f}ms.")
 
-    if not users_to_ban:
+    if not plan.to_ban:
         await ctx.send("✅ Your server's ban list is already up-to-date with the global list. No new bans needed.")
         ctx.command.reset_cooldown(ctx)
         return
 
     # --- Confirmation ---
     if confirm != "confirm":
-        await ctx.send(f"ℹ️ This command will attempt to ban **{len(users_to_ban)}** users found in the global list but not currently banned in this server.\n\n"
-                       f"Type `{ctx.prefix}{ctx.invoked_with} confirm` to proceed.")
+        await ctx.send(f"ℹ️ This command will attempt to ban users found in the global list but not currently banned in this server.\n"
+                       f"{plan.summary()}\n"
+                       f"The attached file lists every user.\n\n"
+                       f"Type `{ctx.prefix}{ctx.invoked_with} confirm` to proceed.", file=plan.as_file())
+        plan_previews.store(ctx.guild.id, "synclocal", plan)
         ctx.command.reset_cooldown(ctx) # Reset cooldown if not confirming
         return
 
     # --- Execute Bans ---
-    await ctx.send(f"🛡️ Syncing local bans... Attempting to ban **{len(users_to_ban)}** users.")
+    await ctx.send(f"🛡️ Syncing local bans... Attempting to ban **{len(plan.to_ban)}** users.")
+    progress_msg = await ctx.send(f"Sync Progress: 0/{len(plan.to_ban)} (Success: 0, Failed: 0)")
+    await start_ban_job(ctx, "synclocal", plan, progress_msg)
 
-    success = 0
-    failed = 0
-    total_to_ban = len(users_to_ban)
-    progress_msg = await ctx.send(f"Sync Progress: 0/{total_to_ban} (Success: 0, Failed: 0)")
-    start_time = datetime.now()
 
-    for i, (user_id_str, ban_data) in enumerate(users_to_ban.items(), 1):
+@bot.command(name="pending", aliases=["coverage"])
+@commands.has_permissions(ban_members=True)
+async def pending_bans(ctx):
+    """(Ban Perms) Shows how many global list entries aren't banned in this server yet."""
+    pending = coverage_index.pending_count(ctx.guild.id)
+    if pending is None:
+        # Not seen this session; one fetch teaches the coverage index (and events keep it current)
         try:
-            user_id = int(user_id_str) # Already validated, but good practice
-            reason = f"{ban_data.get('reason', 'Reason not specified in global list.')}"[:512]
-
-            await ctx.guild.ban(
-                discord.Object(id=user_id),
-                reason=reason,
-                delete_message_seconds=0
-            )
-            success += 1
-            logger.info(f"SyncLocal: Successfully banned {user_id} in {ctx.guild.id}. Reason: {reason}")
-
-        # Specific error handling is similar to massban
-        except discord.NotFound:
-            failed += 1
-            logger.warning(f"SyncLocal: Failed to ban {user_id} in {ctx.guild.id} - User not found.")
+            snapshot = await ban_snapshots.get(ctx.guild)
         except discord.Forbidden:
-            failed += 1
-            logger.error(f"SyncLocal: Failed to ban {user_id} in {ctx.guild.id} - Bot lacks permissions (likely role hierarchy).")
+            await ctx.send("❌ **Error:** Bot lacks permission to fetch the ban list.")
+            return
         except discord.HTTPException as e:
-            failed += 1
-            logger.error(f"SyncLocal: Failed to ban {user_id} in {ctx.guild.id} - HTTP Error {e.status}: {e.text}")
-        except Exception as e:
-             failed += 1
-             logger.error(f"SyncLocal: Unexpected error banning {user_id} in {ctx.guild.id}: {e}")
+            await ctx.send(f"❌ **Error:** Could not fetch existing bans: `{e}`")
+            return
+        if not coverage_index.known(ctx.guild.id):
+            coverage_index.observe(ctx.guild.id, snapshot.ids()) # Fresh enough snapshot served from cache
+        pending = coverage_index.pending_count(ctx.guild.id)
+    covered = len(ban_store) - pending
+    await ctx.send(f"📊 **{covered}/{len(ban_store)}** global ban list entries are banned here; "
+                   f"**{pending}** pending. Use `{ctx.prefix}synclocal` to ban them.")
 
-        # Update progress message periodically
-        if i % 10 == 0 or i == total_to_ban:
-            try:
-                 await progress_msg.edit(content=f"Sync Progress: {i}/{total_to_ban} "
-                                                  f"(Success: {success}, Failed: {failed})")
-            except discord.HTTPException:
-                 pass
-            await asyncio.sleep(1) # Rate limiting
 
-    duration = datetime.now() - start_time
-    final_message = (f"✅ Local ban sync complete.\n"
-                     f"Newly Banned: **{success}**\n"
-                     f"Failed: **{failed}** (Check role hierarchy/permissions?)\n"
-                     f"Total Needed: **{total_to_ban}**\n"
-                     f"Duration: {duration.total_seconds():.2f} seconds.")
-    if failed > 0:
-         final_message += "\n\n⚠️ **Failures detected.** This often happens if the bot's role is not high enough or if trying to ban users with higher roles."
+@bot.command(name="jobs", aliases=["banjobs"])
+@commands.has_permissions(ban_members=True)
+async def list_jobs(ctx):
+    """(Ban Perms) Shows this server's mass-ban job. Auditors see every job."""
+    jobs = ban_jobs.jobs() if ctx.author.id in auditors else [job for job in ban_jobs.jobs() if job.guild_id == ctx.guild.id]
+    if not jobs:
+        await ctx.send("ℹ️ No ban jobs are active.")
+        return
+    await ctx.send("📋 **Ban jobs:**\n" + "\n".join(f"- {job.describe()}" for job in jobs))
+
+
+@bot.command(name="pausejob")
+@commands.has_permissions(ban_members=True)
+async def pause_job(ctx):
+    """(Ban Perms) Pauses this server's running mass-ban job after the current batch."""
+    job = ban_jobs.pause(ctx.guild.id)
+    if job is None:
+        await ctx.send("ℹ️ There is no running ban job in this server.")
+        return
+    await ctx.send(f"⏸️ Pausing the {job.kind} job after the current batch. Use `{ctx.prefix}resumejob` to continue.")
+    logger.info(f"{job.kind} job in {ctx.guild.id} paused by {ctx.author}")
+
 
-    await ctx.send(final_message)
+@bot.command(name="resumejob")
+@commands.has_permissions(ban_members=True)
+async def resume_job(ctx):
+    """(Ban Perms) Resumes this server's paused mass-ban job from its last checkpoint."""
+    job = ban_jobs.resume(ctx.guild.id)
+    if job is None:
+        await ctx.send("ℹ️ There is no paused ban job in this server.")
+        return
+    await ctx.send(f"▶️ Resuming the {job.kind} job at {job.cursor}/{len(job.targets)}.")
+    logger.info(f"{job.kind} job in {ctx.guild.id} resumed by {ctx.author}")
+
+
+@bot.command(name="canceljob")
+@commands.has_permissions(ban_members=True)
+async def cancel_job(ctx):
+    """(Ban Perms) Cancels this server's mass-ban job. Bans already made are kept."""
+    job = ban_jobs.cancel(ctx.guild.id)
+    if job is None:
+        await ctx.send("ℹ️ There is no ban job in this server.")
+        return
+    await ctx.send(f"🛑 Cancelling the {job.kind} job ({job.banned} banned so far).")
+    logger.info(f"{job.kind} job in {ctx.guild.id} cancelled by {ctx.author}")
 
 
 # --- Verification Commands (Auditor Only) ---
@@ -1067,21 +943,22 @@ async def display_ban_list(ctx, fetch_all=False, global_list=False):
             # Determine if the current server is verified for the star indicator
             verified_servers = load_verified_servers()
             is_current_server_verified = str(ctx.guild.id) in verified_servers
+            # Global entries banned here, if this session has seen the server's bans (utils/coverage.py)
+            covered = coverage_index.covered(ctx.guild.id) if is_current_server_verified else None
 
             for user_id, ban_data in bans_data.items():
                  # Basic check for expected structure
-                 if not isinstance(ban_data, dict) or 'name' not in ban_data or 'reason' not in ban_data:
+                 if 'name' not in ban_data or 'reason' not in ban_data:
                       logger.warning(f"Skipping malformed entry in global ban list for user ID {user_id}")
                       continue
 
                  # Only include bans matching the reason criteria IF we are enforcing it globally
-                 # Current code adds based on reason during `update_global_ban_list`,
+                 # Current code adds based on reason during the global sync (utils/globalsync.py),
                  # so all bans in the file should already match.
-                 # If you wanted to store ALL bans globally but filter here, add the re.search check:
+                 # If you wanted to store ALL bans globally but filter here, check it with is_global_ban_reason:
                  # reason = ban_data.get("reason", "")
-                 # if reason and re.search(r'\b(vorth|racc)\b', reason, re.IGNORECASE):
+                 # if is_global_ban_reason(reason):
                  user_ids.append(user_id) # Store the string ID
-                 servers = ban_data.get("servers", []) # List of server IDs where banned
                  reason = ban_data.get('reason', 'No reason provided')
                  name = ban_data.get('name', 'Unknown User')
 
@@ -1097,7 +974,10 @@ async def display_ban_list(ctx, fetch_all=False, global_list=False):
 
                  # Indicator: :star: if ban *not* from the current server (if verified)
                  indicator = ""
-                 if is_current_server_verified and str(ctx.guild.id) not in servers:
+                 if covered is not None:
+                     if int(user_id) not in covered:
+                         indicator = ":star: " # Indicates it's on global list but not banned in this server
+                 elif is_current_server_verified and not ban_data.in_server(ctx.guild.id):
                      indicator = ":star: " # Indicates it's on global list but not from this server
 
                  entry = f"{indicator}**{name}** (`{user_id}`) - Reason: {reason}"
@@ -1106,17 +986,17 @@ async def display_ban_list(ctx, fetch_all=False, global_list=False):
         else: # Local server bans
             title = "Server Ban List (All Bans)" if fetch_all else "Server Ban List ('vorth'/'racc' Bans)"
             ban_count = 0
-            limit = None # Fetch all bans by default
+            snapshot = await ban_snapshots.get(ctx.guild)
 
-            async for ban_entry in ctx.guild.bans(limit=limit):
+            for user_id, (name, ban_reason) in snapshot.bans.items():
                 ban_count += 1
-                user_id_str = str(ban_entry.user.id)
-                reason = ban_entry.reason or "No reason provided"
-                name = str(ban_entry.user)
+                user_id_str = str(user_id)
+                reason = ban_reason or "No reason provided"
+                name = name or "Unknown User"
 
                 # Filter by reason if not fetching all
                 if not fetch_all:
-                    if not ban_entry.reason or not re.search(r'\b(vorth|racc)\b', ban_entry.reason, re.IGNORECASE):
+                    if not is_global_ban_reason(ban_reason):
                         continue # Skip if reason doesn't match and we're filtering
 
                 user_ids.append(user_id_str)
@@ -1200,7 +1080,7 @@ async def globalbanlist(ctx):
 async def add_auditor(ctx, member: discord.Member):
     """(Owner Only) Adds a user to the auditor list."""
     global auditors # Allow modification of the global list
-    config = load_config() # Load current config
+    config = await run_io(load_config) # Load current config
     auditors = config.get('auditors', []) # Get current list or default to empty
 
     if member.id in auditors:
@@ -1210,8 +1090,7 @@ async def add_auditor(ctx, member: discord.Member):
     config['auditors'] = auditors # Update the list in the config dictionary
     # Save the updated config back to the file
     try:
-         with open(CONFIG_FILE, "w") as f:
-              json.dump(config, f, indent=4)
+         await run_io(save_config, config)
          await ctx.reply(f"✅ Successfully added {member.mention} as an auditor.")
          logger.info(f"Owner {ctx.author} added auditor: {member} ({member.id})")
     except IOError as e:
@@ -1226,7 +1105,7 @@ async def add_auditor(ctx, member: discord.Member):
 async def remove_auditor(ctx, member: discord.Member):
     """(Owner Only) Removes a user from the auditor list."""
     global auditors
-    config = load_config()
+    config = await run_io(load_config)
     auditors = config.get('auditors', [])
 
     if member.id not in auditors:
@@ -1236,8 +1115,7 @@ async def remove_auditor(ctx, member: discord.Member):
     config['auditors'] = auditors
     # Save updated config
     try:
-        with open(CONFIG_FILE, "w") as f:
-             json.dump(config, f, indent=4)
+        await run_io(save_config, config)
         await ctx.reply(f"✅ Successfully removed {member.mention} from the auditor list.")
         logger.info(f"Owner {ctx.author} removed auditor: {member} ({member.id})")
     except IOError as e:
@@ -1251,7 +1129,7 @@ async def remove_auditor(ctx, member: discord.Member):
 async def list_auditors(ctx):
     """(Owner Only) Lists current auditors."""
     # Load directly from config to ensure it's up-to-date
-    auditor_ids = load_config().get('auditors', [])
+    auditor_ids = (await run_io(load_config)).get('auditors', [])
     if not auditor_ids:
          return await ctx.send("There are currently no auditors registered.")
 
@@ -1270,75 +1148,13 @@ async def list_auditors(ctx):
 
     await ctx.send(message)
 
-def load_blocked_users():
-    """Load blocked users from file"""
-    if not BLOCKED_USERS_FILE.exists():
-        return []
-    try:
-        with open(BLOCKED_USERS_FILE, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        logger.error("Failed to load blocked users file")
-        return []
-
-def save_blocked_users(blocked_users):
-    """Save blocked users to file"""
-    try:
-        with open(BLOCKED_USERS_FILE, "w") as f:
-            json.dump(blocked_users, f, indent=4)
-    except Exception as e:
-        logger.error(f"Failed to save blocked users: {e}")
-
-def load_rate_limits():
-    """Load rate limit data from file"""
-    if not RATE_LIMIT_FILE.exists():
-        return {}
-    try:
-        with open(RATE_LIMIT_FILE, "r") as f:
-            return json.load(f)
-    except (json.JSONDecodeError, FileNotFoundError):
-        logger.error("Failed to load rate limits file")
-        return {}
-
-def save_rate_limits(rate_limits):
-    """Save rate limit data to file"""
-    try:
-        with open(RATE_LIMIT_FILE, "w") as f:
-            json.dump(rate_limits, f, indent=4)
-    except Exception as e:
-        logger.error(f"Failed to save rate limits: {e}")
-
 def is_user_rate_limited(user_id):
     """Check if user is rate limited"""
-    rate_limits = load_rate_limits()
-    user_id_str = str(user_id)
-    current_time = datetime.now().timestamp()
-    
-    if user_id_str not in rate_limits:
-        return False, 0
-    
-    user_data = rate_limits[user_id_str]
-    
-    # Clean old requests (older than 1 hour)
-    user_data["requests"] = [req_time for req_time in user_data["requests"] 
-                           if current_time - req_time < 3600]
-    
-    if len(user_data["requests"]) >= MAX_REQUESTS_PER_HOUR:
-        return True, len(user_data["requests"])
-    
-    return False, len(user_data["requests"])
+    return verification_limiter.check(user_id)
 
 def add_rate_limit_request(user_id):
     """Add a new request to user's rate limit tracker"""
-    rate_limits = load_rate_limits()
-    user_id_str = str(user_id)
-    current_time = datetime.now().timestamp()
-    
-    if user_id_str not in rate_limits:
-        rate_limits[user_id_str] = {"requests": []}
-    
-    rate_limits[user_id_str]["requests"].append(current_time)
-    save_rate_limits(rate_limits)
+    verification_limiter.hit(user_id)
 
 def is_server_name_suspicious(server_name):
     """Check if server name contains suspicious keywords"""
@@ -1356,29 +1172,11 @@ def is_auditor():
         return ctx.author.id in auditors  # Check if the user ID is in the auditors list
     return commands.check(predicate)
 
-# --- Bot Execution ---
-if __name__ == "__main__":
-    TOKEN = config_data.get('TOKEN') 
-    if not TOKEN or TOKEN == "YOUR_BOT_TOKEN_HERE":
-        logger.critical(f"Bot token is missing or placeholder in {CONFIG_FILE}. Please add a valid token.")
-    else:
-        try:
-            bot.run(TOKEN)
-        except discord.LoginFailure:
-             logger.critical("Failed to log in: Improper token provided.")
-        except discord.PrivilegedIntentsRequired:
-             logger.critical("Failed to log in: Privileged Intents (Server Members or Message Content or Guild Bans) are not enabled for the bot in the Developer Portal.")
-        except Exception as e:
-             logger.critical(f"An unexpected error occurred during bot startup: {e}")
-
 @bot.command(name="block", aliases=["blockuser"])
 @is_auditor()
 async def block_user(ctx, user_id: int):
     """Block a user from making verification requests"""
-    blocked_users = load_blocked_users()
-    if user_id not in blocked_users:
-        blocked_users.append(user_id)
-        save_blocked_users(blocked_users)
+    if blocked_users.add(user_id):
         await ctx.send(f"✅ User `{user_id}` has been blocked from making verification requests.")
         logger.info(f"User {user_id} blocked by auditor {ctx.author.id}")
     else:
@@ -1388,10 +1186,8 @@ async def block_user(ctx, user_id: int):
 @is_auditor()
 async def unblock_user(ctx, user_id: int):
     """Unblock a user from making verification requests"""
-    blocked_users = load_blocked_users()
-    if user_id in blocked_users:
-        blocked_users.remove(user_id)
-        save_blocked_users(blocked_users)
+    if blocked_users.discard(user_id):
+        notified_blocked_users.discard(user_id)
         await ctx.send(f"✅ User `{user_id}` has been unblocked.")
         logger.info(f"User {user_id} unblocked by auditor {ctx.author.id}")
     else:
@@ -1401,7 +1197,6 @@ async def unblock_user(ctx, user_id: int):
 @is_auditor()
 async def list_blocked_users(ctx):
     """List all blocked users"""
-    blocked_users = load_blocked_users()
     if not blocked_users:
         await ctx.send("📋 No users are currently blocked.")
         return
@@ -1419,17 +1214,13 @@ async def list_blocked_users(ctx):
 async def reset_rate_limits(ctx, user_id: int = None):
     """Reset rate limits for a user or all users"""
     if user_id:
-        rate_limits = load_rate_limits()
-        user_id_str = str(user_id)
-        if user_id_str in rate_limits:
-            del rate_limits[user_id_str]
-            save_rate_limits(rate_limits)
+        if verification_limiter.reset(user_id):
             await ctx.send(f"✅ Rate limits reset for user `{user_id}`.")
         else:
             await ctx.send(f"❌ No rate limit data found for user `{user_id}`.")
     else:
         # Reset all rate limits
-        save_rate_limits({})
+        verification_limiter.reset()
         await ctx.send("✅ All rate limits have been reset.")
 
 @bot.command(name="addkeyword", aliases=["blockkeyword"])
@@ -1470,3 +1261,18 @@ async def list_blocked_keywords(ctx):
         color=discord.Color.red()
     )
     await ctx.send(embed=embed)
+
+# --- Bot Execution ---
+if __name__ == "__main__":
+    TOKEN = config_data.get('TOKEN') 
+    if not TOKEN or TOKEN == "YOUR_BOT_TOKEN_HERE":
+        logger.critical(f"Bot token is missing or placeholder in {CONFIG_FILE}. Please add a valid token.")
+    else:
+        try:
+            bot.run(TOKEN)
+        except discord.LoginFailure:
+             logger.critical("Failed to log in: Improper token provided.")
+        except discord.PrivilegedIntentsRequired:
+             logger.critical("Failed to log in: Privileged Intents (Server Members or Message Content or Guild Bans) are not enabled for the bot in the Developer Portal.")
+        except Exception as e:
+             logger.critical(f"An unexpected error occurred during bot startup: {e}")